@@ -1,7 +1,11 @@
 import os
 import json
+import uuid
 import random
-from typing import Optional, Dict, Any, Tuple, List
+import datetime
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, List, Callable
 
 from generators.text_generator import TextGenerator
 from generators.audio_generator import AudioGenerator
@@ -9,6 +13,15 @@ from generators.prompt_generator import PromptGenerator
 from generators.image_generator import ImageGenerator
 from generators.subtitle_generator import SubtitleGenerator
 from generators.video_generator import VideoGenerator
+from generators.story_prompt_generator import StoryPromptGenerator
+from story_pool import StoryPool
+from memory_arbiter import MemoryArbiter
+from utils import descargar_modelo_ollama
+from render_profiles import obtener_perfil
+from job_context import JobContext
+from llm_cache import LLMCache
+from duration_estimator import DurationEstimator
+from stage_profiler import StageProfiler
 
 
 class ResourceManager:
@@ -24,6 +37,10 @@ class ResourceManager:
             "resources/imagenes",
             "resources/subtitulos",
             "resources/video",
+            "resources/pool",
+            "resources/cola",
+            "resources/cache",
+            "resources/borradores",
         ]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
@@ -49,34 +66,42 @@ class ConfigManager:
         except Exception:
             return {"nichos": []}
 
-    def select_random_config(self) -> Tuple[str, str, str, str, Optional[int]]:
+    def select_random_config(
+        self, seed: Optional[int] = None
+    ) -> Tuple[str, str, str, str, Optional[int]]:
         """
         Selecciona aleatoriamente un nicho y sus parámetros.
 
+        Args:
+            seed: Con semilla la selección es reproducible
+
         Returns:
             Tuple con (nicho, era, ubicación, tono, semilla)
         """
         config = self.load_config()
 
         if not config["nichos"]:
-            return "Ancient Technology", "", "", "engaging", None
+            return "Ancient Technology", "", "", "engaging", seed
+
+        if seed is None:
+            seed = random.randint(1, 1000000)  # Semilla aleatoria
+        aleatorio = random.Random(seed)
 
         # Seleccionar un nicho aleatorio
-        nicho_config = random.choice(config["nichos"])
+        nicho_config = aleatorio.choice(config["nichos"])
 
         nicho = nicho_config["name"]
-        era = random.choice(nicho_config["eras"]) if nicho_config.get("eras") else ""
+        era = aleatorio.choice(nicho_config["eras"]) if nicho_config.get("eras") else ""
         location = (
-            random.choice(nicho_config["locations"])
+            aleatorio.choice(nicho_config["locations"])
             if nicho_config.get("locations")
             else ""
         )
         tone = (
-            random.choice(nicho_config["tones"])
+            aleatorio.choice(nicho_config["tones"])
             if nicho_config.get("tones")
             else "engaging"
         )
-        seed = random.randint(1, 1000000)  # Semilla aleatoria
 
         return nicho, era, location, tone, seed
 
@@ -98,17 +123,122 @@ class ConfigManager:
 
         return None
 
+    def get_section_config(self, section: str) -> Dict[str, Any]:
+        """
+        Obtiene una sección opcional de la configuración.
+
+        Args:
+            section: Clave de la sección en el archivo de configuración
+
+        Returns:
+            Diccionario con la sección o vacío si no existe
+        """
+        return self.load_config().get(section, {})
+
 
 class VideoGenerationPipeline:
     """Clase que maneja el pipeline completo de generación de videos."""
 
-    def __init__(self):
-        self.text_generator = TextGenerator()
-        self.audio_generator = AudioGenerator()
-        self.prompt_generator = PromptGenerator()
-        self.image_generator = ImageGenerator()
+    # Tamaños aproximados en MB de los modelos pesados cuando están cargados
+    TAMANOS_MODELOS = {
+        TextGenerator.MODELO: 9500,
+        PromptGenerator.MODELO: 9500,
+        ImageGenerator.MODEL_ID: 7000,
+    }
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Inicializa el pipeline.
+
+        Args:
+            config: Configuración completa (se usan las secciones `memoria`, `imagenes`,
+                `audio`, `video`, `llm`, `duracion_narracion`, `perfilado` y
+                `persistencia`)
+        """
+        config = config or {}
+        self.config = config
+        memoria_config = config.get("memoria", {})
+        imagenes_config = config.get("imagenes", {})
+
+        # Respuestas del LLM compartidas por todas las etapas (ver llm.cache)
+        self.llm_cache = LLMCache.desde_config(config)
+
+        # La liberación de memoria la decide el árbitro, no cada generador
+        self.text_generator = TextGenerator(detener_ollama=False, cache=self.llm_cache)
+        self.audio_generator = AudioGenerator(**config.get("audio", {}))
+        self.prompt_generator = PromptGenerator(detener_ollama=False, cache=self.llm_cache)
+        self.image_generator = ImageGenerator(
+            mantener_modelo=True,
+            dispositivo=imagenes_config.get("dispositivo", "auto"),
+            cpu_config=imagenes_config.get("cpu"),
+            trabajadores=imagenes_config.get("trabajadores"),
+            reutilizacion=imagenes_config.get("reutilizacion"),
+            fuerza_img2img=imagenes_config.get("reutilizacion", {}).get(
+                "fuerza_img2img", 0.6
+            ),
+            escritura=imagenes_config.get("escritura"),
+            escalado=imagenes_config.get("escalado"),
+        )
         self.subtitle_generator = SubtitleGenerator()
-        self.video_generator = VideoGenerator()
+        self.video_generator = VideoGenerator(config.get("video", {}).get("versiones"))
+        self.story_prompt_generator = StoryPromptGenerator(
+            self.text_generator,
+            self.prompt_generator,
+            detener_ollama=False,
+            cache=self.llm_cache,
+        )
+
+        tamanos = {**self.TAMANOS_MODELOS, **memoria_config.get("modelos", {})}
+        self.memory_arbiter = MemoryArbiter.desde_config(memoria_config)
+        for modelo in (TextGenerator.MODELO, PromptGenerator.MODELO):
+            # La descarga va al mismo servidor que las llamadas (`llm.cliente.host`)
+            self.memory_arbiter.registrar(
+                modelo,
+                tamanos[modelo],
+                lambda m=modelo: descargar_modelo_ollama(m, self.llm_cache.cliente),
+            )
+        self.memory_arbiter.registrar(
+            ImageGenerator.MODEL_ID,
+            tamanos[ImageGenerator.MODEL_ID],
+            self.image_generator.liberar_modelo,
+        )
+        # Un modelo solo cuenta como cargado cuando se usa de verdad: los aciertos
+        # de caché y las imágenes reutilizadas no lo cargan (ni hay que descargarlo)
+        self.llm_cache.al_llamar_modelo = self.memory_arbiter.marcar_residente
+        self.image_generator.al_cargar_modelo = lambda: self.memory_arbiter.marcar_residente(
+            ImageGenerator.MODEL_ID
+        )
+        self.duration_estimator = DurationEstimator.desde_config(config)
+
+        # Los CSV de texto y prompts solo se escriben como registro (write-behind)
+        self.persistir_csv = config.get("persistencia", {}).get("csv", True)
+        self.metricas: Dict[str, Any] = {}
+        self.ultimo_trabajo: Dict[str, Any] = {}
+        self.ultimo_contexto: Optional[JobContext] = None
+
+    PERFILADO_DIR = "resources/perfilado"
+
+    def guardar_perfilado(self, perfilador: StageProfiler, ctx: JobContext) -> None:
+        """Escribe los perfiles junto al video (o en PERFILADO_DIR si el trabajo falló)."""
+        if ctx.video_path:
+            directorio = f"{os.path.splitext(ctx.video_path)[0]}_perfilado"
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            directorio = os.path.join(self.PERFILADO_DIR, f"{ctx.nicho}_{timestamp}")
+        try:
+            ctx.metricas["perfilado"] = perfilador.guardar(directorio)
+        except Exception as e:
+            print(f"Error al guardar el perfilado: {e}")
+
+    def metricas_cache(self, inicio: Dict[str, Any]) -> Dict[str, Any]:
+        """Aciertos y fallos de la caché del LLM durante el trabajo actual."""
+        fin = self.llm_cache.estadisticas()
+        metricas = {
+            clave: fin[clave] - inicio[clave] for clave in ("aciertos", "fallos", "omitidas")
+        }
+        consultas = metricas["aciertos"] + metricas["fallos"]
+        metricas["tasa_aciertos"] = metricas["aciertos"] / consultas if consultas else None
+        return metricas
 
     def generate(
         self,
@@ -117,6 +247,13 @@ class VideoGenerationPipeline:
         location: str = "",
         tone: str = "engaging",
         seed: Optional[int] = None,
+        idea: Optional[str] = None,
+        modo_llm: str = "separado",
+        num_prompts: Optional[int] = None,
+        perfil: Optional[Dict[str, Any]] = None,
+        prompts: Optional[List[str]] = None,
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        perfilar: bool = False,
     ) -> str:
         """
         Ejecuta el pipeline completo de generación de video.
@@ -127,20 +264,165 @@ class VideoGenerationPipeline:
             location: Ubicación geográfica
             tone: Tono emocional de la narrativa
             seed: Semilla para generación de imágenes
+            idea: Historia pregenerada (opcional). Si se indica no se llama al LLM
+            modo_llm: "separado" (una llamada para la historia y otra para los
+                prompts) o "combinado" (una única llamada con salida JSON)
+            num_prompts: Número de prompts a pedir en modo combinado
+            perfil: Ajustes de render (ver render_profiles). Por defecto, producción
+            prompts: Prompts de imagen ya fijados (opcional). Si se indican no se
+                llama al LLM para generarlos
+            al_progreso: Recibe en vivo las muestras de progreso del encode de FFmpeg
+            perfilar: Perfila cada etapa y guarda los perfiles junto al video
+                (ver StageProfiler y la sección `perfilado`)
 
         Returns:
             str: Ruta al video generado
         """
-        nicho_procesado = nicho.replace(" ", "_")
+        ctx = JobContext(
+            nicho=nicho.replace(" ", "_"),
+            era=era,
+            location=location,
+            tone=tone,
+            seed=seed,
+            perfil=perfil or obtener_perfil("produccion"),
+            texto=idea,
+            prompts=list(prompts or []),
+            persistir_csv=self.persistir_csv,
+        )
+        self.ultimo_contexto = ctx
+        self.metricas = ctx.metricas
+
+        def generar_historia_y_prompts():
+            if not self.story_prompt_generator.generate(ctx, num_prompts):
+                raise RuntimeError("No se pudo generar la historia y los prompts")
+
+        def generar_texto():
+            # Sin historia no hay narración: se corta aquí con un error claro en
+            # lugar de fallar después en el estimador o en gTTS
+            if not self.text_generator.generate(ctx) or not ctx.texto:
+                raise RuntimeError("No se pudo generar la historia")
+
+        def completar_prompts():
+            # Solo hace falta si el modo combinado recurrió al modo separado
+            if not ctx.prompts:
+                self.prompt_generator.generate(ctx)
+
+        def generar_audio():
+            self.audio_generator.generate(
+                ctx, usar_cache=ctx.perfil.get("tts_cache", False)
+            )
 
-        self.text_generator.generate(nicho_procesado, era, location, tone)
-        self.audio_generator.generate(nicho_procesado)
-        self.prompt_generator.generate(nicho_procesado)
-        self.image_generator.generate(nicho_procesado, seed)
-        subtitles_path = self.subtitle_generator.generate(nicho_procesado)
-        video_path = self.video_generator.generate(nicho_procesado, subtitles_path)
+        # Con estimador de duración, la narración se sintetiza en segundo plano
+        # mientras se generan prompts e imágenes; subtítulos y video usan la
+        # duración real, así que los tiempos de cada imagen se ajustan solos
+        segundo_plano = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
+            if self.duration_estimator
+            else None
+        )
+        audio_pendiente = []
+
+        def lanzar_audio():
+            if segundo_plano is None:
+                generar_audio()
+                return
+            voz = self.audio_generator.voz
+            if not self.duration_estimator.calibrado(voz):
+                # Sin muestras suficientes la estimación no es fiable: la duración
+                # real decide el número de prompts y sirve para calibrar la voz
+                generar_audio()
+                self.duration_estimator.registrar(ctx.texto, voz, ctx.duracion_audio)
+                return
+            ctx.duracion_estimada = self.duration_estimator.estimar(ctx.texto, voz)
+            audio_pendiente.append(segundo_plano.submit(generar_audio))
+
+        def esperar_audio():
+            for futuro in audio_pendiente:
+                futuro.result()
+            if ctx.duracion_estimada is None or not ctx.duracion_audio:
+                return
+            self.duration_estimator.registrar(
+                ctx.texto, self.audio_generator.voz, ctx.duracion_audio
+            )
+            ctx.metricas["duracion_narracion"] = {
+                "estimada": ctx.duracion_estimada,
+                "real": ctx.duracion_audio,
+                "error_relativo": (ctx.duracion_estimada - ctx.duracion_audio)
+                / ctx.duracion_audio,
+            }
 
-        return video_path
+        def generar_prompts():
+            if prompts is None:
+                self.prompt_generator.generate(ctx)
+                return
+            prompts_path = os.path.join(
+                self.prompt_generator.OUTPUT_FOLDER, f"prompts_{ctx.prefijo_archivos}.csv"
+            )
+            ctx.persistir(self.prompt_generator.guardar_prompts_csv, list(ctx.prompts), prompts_path)
+
+        # Cada etapa declara los modelos pesados que necesita
+        etapas = []
+        if modo_llm == "combinado" and idea is None and prompts is None:
+            etapas.append(
+                ("historia", [StoryPromptGenerator.MODELO], generar_historia_y_prompts)
+            )
+            etapas.append(("audio", [], lanzar_audio))
+            etapas.append(("prompts", [PromptGenerator.MODELO], completar_prompts))
+        else:
+            etapas.append(
+                (
+                    "texto",
+                    [] if idea else [TextGenerator.MODELO],
+                    generar_texto,
+                )
+            )
+            etapas.append(("audio", [], lanzar_audio))
+            etapas.append(
+                (
+                    "prompts",
+                    [] if prompts else [PromptGenerator.MODELO],
+                    generar_prompts,
+                )
+            )
+        etapas.append(
+            ("imagenes", [ImageGenerator.MODEL_ID], lambda: self.image_generator.generate(ctx))
+        )
+        etapas.append(("esperar_audio", [], esperar_audio))
+        etapas.append(("subtitulos", [], lambda: self.subtitle_generator.generate(ctx)))
+        etapas.append(("video", [], lambda: self.video_generator.generate(ctx, al_progreso)))
+
+        # Sin perfilado cada etapa solo paga un nullcontext
+        perfilador = StageProfiler.desde_config(self.config) if perfilar else None
+
+        cache_inicio = self.llm_cache.estadisticas()
+        try:
+            for i, (nombre, modelos, ejecutar) in enumerate(etapas):
+                proximas = [modelos_etapa for _, modelos_etapa, _ in etapas[i + 1 :]]
+                self.memory_arbiter.preparar(modelos, proximas)
+                with (
+                    perfilador.etapa(nombre, torch=nombre == "imagenes")
+                    if perfilador
+                    else nullcontext()
+                ):
+                    ejecutar()
+
+            # Historia y prompts usados, para poder repetir el render con los mismos datos
+            self.ultimo_trabajo = {"idea": ctx.texto, "prompts": list(ctx.prompts)}
+        finally:
+            # El proceso del trabajo termina aquí: se libera todo lo que quede cargado
+            self.memory_arbiter.liberar_todo()
+            if segundo_plano:
+                segundo_plano.shutdown(wait=True)
+            try:
+                ctx.esperar_persistencia()
+            except Exception as e:
+                # Los CSV son solo un registro: su error no debe sustituir al del pipeline
+                print(f"Error al guardar los registros del trabajo: {e}")
+            ctx.metricas["llm_cache"] = self.metricas_cache(cache_inicio)
+            if perfilador:
+                self.guardar_perfilado(perfilador, ctx)
+
+        return ctx.video_path
 
 
 class VideoAutomation:
@@ -158,22 +440,53 @@ class VideoAutomation:
         """
         self.resource_manager = ResourceManager()
         self.config_manager = ConfigManager(config_path)
-        self.pipeline = VideoGenerationPipeline()
+        self.pipeline = VideoGenerationPipeline(self.config_manager.load_config())
+        self.story_pool = StoryPool.desde_config(self.config_manager.load_config())
 
         # Asegurar que las carpetas necesarias existan
         self.resource_manager.ensure_directories()
 
-    def generate_video(self, nicho: Optional[str] = None) -> Dict[str, Any]:
+    BORRADORES_DIR = "resources/borradores"
+
+    def generate_video(
+        self,
+        nicho: Optional[str] = None,
+        perfil: str = "produccion",
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        perfilar: Optional[bool] = None,
+        seed: Optional[int] = None,
+        reserva: bool = True,
+    ) -> Dict[str, Any]:
         """
         Genera un video basado en el nicho especificado o aleatorio.
 
         Args:
             nicho: Nombre del nicho específico (opcional)
+            perfil: "produccion" o "borrador" (render rápido de baja calidad que
+                se puede aprobar después con aprobar_borrador)
+            al_progreso: Recibe en vivo las muestras de progreso del encode de FFmpeg
+            perfilar: Perfila cada etapa del trabajo. Por defecto, `perfilado.activo`
+            seed: Semilla del trabajo. Con la misma semilla se elige la misma
+                combinación y las llamadas al LLM pueden servirse desde la caché
+            reserva: Usa una historia pregenerada si hay alguna. Una historia de
+                la reserva no se puede repetir: los reintentos pasan False
 
         Returns:
             Dict con información del video generado, incluyendo video_path
         """
-        if nicho:
+        if seed is None:
+            seed = random.randint(1, 1000000)
+        aleatorio = random.Random(seed)
+
+        # Si hay una historia pregenerada lista, se usa su combinación directamente
+        idea = None
+        tomada = (
+            self.story_pool.tomar_cualquiera(nicho) if self.story_pool and reserva else None
+        )
+
+        if tomada:
+            (nicho, era, location, tone), idea = tomada
+        elif nicho:
             # Usar el nicho específico
             nicho_config = self.config_manager.get_nicho_config(nicho)
             if not nicho_config:
@@ -184,31 +497,148 @@ class VideoAutomation:
 
             # Seleccionar parámetros aleatorios del nicho específico
             era = (
-                random.choice(nicho_config.get("eras", [""]))
+                aleatorio.choice(nicho_config.get("eras", [""]))
                 if nicho_config.get("eras")
                 else ""
             )
             location = (
-                random.choice(nicho_config.get("locations", [""]))
+                aleatorio.choice(nicho_config.get("locations", [""]))
                 if nicho_config.get("locations")
                 else ""
             )
             tone = (
-                random.choice(nicho_config.get("tones", ["engaging"]))
+                aleatorio.choice(nicho_config.get("tones", ["engaging"]))
                 if nicho_config.get("tones")
                 else "engaging"
             )
-            seed = random.randint(1, 1000000)
         else:
             # Seleccionar nicho y parámetros aleatorios
             nicho, era, location, tone, seed = (
-                self.config_manager.select_random_config()
+                self.config_manager.select_random_config(seed)
             )
 
+        resultado = self._ejecutar_pipeline(
+            nicho,
+            era,
+            location,
+            tone,
+            seed,
+            idea=idea,
+            idea_pregenerada=tomada is not None,
+            perfil=perfil,
+            al_progreso=al_progreso,
+            perfilar=perfilar,
+        )
+        if perfil == "borrador" and resultado.get("video_path"):
+            resultado["borrador_id"] = self._guardar_borrador(resultado)
+        return resultado
+
+    def aprobar_borrador(
+        self,
+        borrador_id: str,
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        perfilar: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """
+        Vuelve a renderizar un borrador con calidad de producción.
+
+        Se reutilizan la historia, los prompts y la semilla del borrador, así que
+        no se llama al LLM y las imágenes corresponden a las del borrador.
+
+        Args:
+            borrador_id: Identificador devuelto por generate_video en modo borrador
+            al_progreso: Recibe en vivo las muestras de progreso del encode de FFmpeg
+            perfilar: Perfila cada etapa del trabajo. Por defecto, `perfilado.activo`
+
+        Returns:
+            Dict con información del video generado, incluyendo video_path
+        """
+        manifiesto_path = os.path.join(self.BORRADORES_DIR, f"{borrador_id}.json")
+        try:
+            with open(manifiesto_path, "r", encoding="utf-8") as f:
+                borrador = json.load(f)
+        except Exception:
+            return {"error": f"No se encontró el borrador: {borrador_id}", "video_path": None}
+
+        resultado = self._ejecutar_pipeline(
+            borrador["nicho"],
+            borrador["era"],
+            borrador["location"],
+            borrador["tone"],
+            borrador["seed"],
+            idea=borrador["idea"],
+            prompts=borrador["prompts"],
+            al_progreso=al_progreso,
+            perfilar=perfilar,
+            # El borrador dejó su narración en la caché de TTS: mismo texto, misma pista
+            ajustes_perfil={"tts_cache": True},
+        )
+        resultado["borrador_id"] = borrador_id
+        return resultado
+
+    def _guardar_borrador(self, resultado: Dict[str, Any]) -> str:
+        """Guarda los datos necesarios para repetir el borrador en producción."""
+        # Sufijo aleatorio: dos borradores pueden terminar en el mismo segundo
+        borrador_id = (
+            f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        )
+        manifiesto = {
+            key: resultado[key]
+            for key in ("nicho", "era", "location", "tone", "seed", "video_path")
+        }
+        manifiesto.update(self.pipeline.ultimo_trabajo)
+
+        with open(
+            os.path.join(self.BORRADORES_DIR, f"{borrador_id}.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        return borrador_id
+
+    def _ejecutar_pipeline(
+        self,
+        nicho: str,
+        era: str,
+        location: str,
+        tone: str,
+        seed: Optional[int],
+        idea: Optional[str] = None,
+        idea_pregenerada: bool = False,
+        prompts: Optional[List[str]] = None,
+        perfil: str = "produccion",
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        perfilar: Optional[bool] = None,
+        ajustes_perfil: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta el pipeline y resume el resultado.
+
+        Args:
+            idea: Historia ya escrita (de la reserva o de un borrador); sin ella se genera
+            idea_pregenerada: La idea se tomó de la reserva de historias en este trabajo
+        """
+        config = self.config_manager.load_config()
+        if perfilar is None:
+            perfilar = config.get("perfilado", {}).get("activo", False)
+        llm_config = config.get("llm", {})
+        # La semilla siempre queda registrada para poder repetir el render
+        if seed is None:
+            seed = random.randint(1, 1000000)
+
         # Generar el video
         try:
             video_path = self.pipeline.generate(
-                nicho=nicho, era=era, location=location, tone=tone, seed=seed
+                nicho=nicho,
+                era=era,
+                location=location,
+                tone=tone,
+                seed=seed,
+                idea=idea,
+                modo_llm=llm_config.get("modo", "separado"),
+                num_prompts=llm_config.get("num_prompts"),
+                perfil={**obtener_perfil(perfil, config), **(ajustes_perfil or {})},
+                prompts=prompts,
+                al_progreso=al_progreso,
+                perfilar=perfilar,
             )
 
             return {
@@ -218,6 +648,10 @@ class VideoAutomation:
                 "location": location,
                 "tone": tone,
                 "seed": seed,
+                "perfil": perfil,
+                "idea_pregenerada": idea_pregenerada,
+                "versiones": dict(self.pipeline.ultimo_contexto.versiones),
+                "metricas": self.pipeline.metricas,
             }
         except Exception as e:
             return {"error": str(e), "video_path": None}
@@ -0,0 +1,134 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+from utils import bloqueo_archivo
+
+
+class DurationEstimator:
+    """
+    Predice la duración de la narración a partir del texto, antes de sintetizarla.
+
+    Para cada voz (motor, idioma y tempo) se ajusta por mínimos cuadrados
+    duración = base + segundos_por_caracter * caracteres con los trabajos
+    anteriores. Mientras no hay muestras suficientes se usa una estimación
+    aproximada de gTTS en inglés; el pipeline no se fía de ella (ver `calibrado`).
+
+    Las muestras se comparten entre procesos: `registrar` escribe bajo un lock de archivo.
+    """
+
+    DEFAULT_PATH = "resources/cache/duraciones.json"
+    MIN_MUESTRAS = 5
+    # Aproximación inicial: unos 14 caracteres por segundo y medio segundo de margen
+    BASE_INICIAL = 0.5
+    SEGUNDOS_POR_CARACTER_INICIAL = 1 / 14
+    LOCK_TIMEOUT = 30.0
+
+    def __init__(self, path: str = DEFAULT_PATH, max_muestras: int = 200):
+        """
+        Args:
+            path: Archivo JSON con las muestras de cada voz
+            max_muestras: Muestras recientes que se conservan por voz
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_muestras = max_muestras
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> Optional["DurationEstimator"]:
+        """Crea el estimador a partir de `duracion_narracion` o None si está desactivado."""
+        ajustes = config.get("duracion_narracion", {})
+        if not ajustes.get("activo", False):
+            return None
+        return cls(
+            path=ajustes.get("path", cls.DEFAULT_PATH),
+            max_muestras=ajustes.get("max_muestras", 200),
+        )
+
+    @contextmanager
+    def _bloqueo(self):
+        """Bloqueo entre hilos y entre procesos mediante un archivo de lock."""
+        with self._lock, bloqueo_archivo(self.lock_path, self.LOCK_TIMEOUT):
+            yield
+
+    def _leer(self) -> Dict[str, List[List[float]]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir(self, datos: Dict[str, List[List[float]]]) -> None:
+        temporal = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(temporal, self.path)
+
+    @staticmethod
+    def caracteres(texto: str) -> int:
+        return len(" ".join(texto.split()))
+
+    def coeficientes(self, voz: str) -> Dict[str, float]:
+        """Devuelve base y segundos_por_caracter ajustados para la voz."""
+        muestras = self._leer().get(voz, [])
+        if len(muestras) >= self.MIN_MUESTRAS:
+            n = len(muestras)
+            media_x = sum(x for x, _ in muestras) / n
+            media_y = sum(y for _, y in muestras) / n
+            varianza = sum((x - media_x) ** 2 for x, _ in muestras)
+            if varianza > 0:
+                pendiente = (
+                    sum((x - media_x) * (y - media_y) for x, y in muestras) / varianza
+                )
+                if pendiente > 0:
+                    return {
+                        "base": media_y - pendiente * media_x,
+                        "segundos_por_caracter": pendiente,
+                        "muestras": n,
+                    }
+            # Textos de longitud casi idéntica: solo se puede estimar una tasa media
+            return {
+                "base": 0.0,
+                "segundos_por_caracter": media_y / media_x if media_x else 0.0,
+                "muestras": n,
+            }
+        return {
+            "base": self.BASE_INICIAL,
+            "segundos_por_caracter": self.SEGUNDOS_POR_CARACTER_INICIAL,
+            "muestras": len(muestras),
+        }
+
+    def calibrado(self, voz: str) -> bool:
+        """True si la voz tiene muestras suficientes para no usar la aproximación inicial."""
+        return len(self._leer().get(voz, [])) >= self.MIN_MUESTRAS
+
+    def estimar(self, texto: str, voz: str) -> float:
+        """
+        Args:
+            texto: Texto que se va a narrar
+            voz: Identificador de la voz (ver AudioGenerator.voz)
+
+        Returns:
+            float: Duración prevista en segundos
+        """
+        coeficientes = self.coeficientes(voz)
+        estimada = (
+            coeficientes["base"]
+            + coeficientes["segundos_por_caracter"] * self.caracteres(texto)
+        )
+        return max(1.0, estimada)
+
+    def registrar(self, texto: str, voz: str, duracion: float) -> None:
+        """Añade la duración real de una narración para recalibrar la voz."""
+        if not texto or not duracion or duracion <= 0:
+            return
+        with self._bloqueo():
+            datos = self._leer()
+            muestras = datos.setdefault(voz, [])
+            muestras.append([self.caracteres(texto), duracion])
+            datos[voz] = muestras[-self.max_muestras :]
+            self._escribir(datos)
@@ -1,28 +1,166 @@
 import os
-import csv
+import shutil
+import hashlib
+import subprocess
 import gtts
-from typing import Optional
+from typing import List, Optional
+from job_context import JobContext
 
 
 class AudioGenerator:
     """Clase encargada de generar archivos de audio a partir de texto."""
 
     OUTPUT_DIR = "resources/audio"
-    TEXT_DIR = "resources/texto"
+    CACHE_DIR = "resources/cache/audio"
+    # Objetivo de sonoridad habitual en plataformas de video corto
+    LOUDNORM = "loudnorm=I=-14:TP=-1.5:LRA=11"
+    SAMPLE_RATE = 44100
+    MOTOR = "gtts"
+    IDIOMA = "en"
 
-    def __init__(self):
+    def __init__(
+        self,
+        normalizar_volumen: bool = False,
+        tempo: float = 1.0,
+        bitrate: str = "128k",
+        cache_max_mb: float = 200.0,
+    ):
+        """
+        Args:
+            normalizar_volumen: Aplica normalización de sonoridad (EBU R128), opcional
+            tempo: Factor de velocidad de la narración sin cambiar el tono
+            bitrate: Bitrate AAC de la pista final
+            cache_max_mb: Tamaño máximo de la caché de narraciones (se descartan
+                las menos usadas recientemente)
+        """
+        self.normalizar_volumen = normalizar_volumen
+        self.tempo = tempo
+        self.bitrate = bitrate
+        self.cache_max_bytes = int(cache_max_mb * 1024 * 1024)
         os.makedirs(self.OUTPUT_DIR, exist_ok=True)
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
 
-    def generate(self, nicho: str) -> Optional[str]:
-        """Genera un archivo de audio a partir de un archivo CSV."""
-        csv_filename = os.path.join(self.TEXT_DIR, f"idea_{nicho}.csv")
+    @property
+    def voz(self) -> str:
+        """Identifica la voz para calibrar la estimación de duración."""
+        return f"{self.MOTOR}:{self.IDIOMA}:{self.tempo}"
 
-        with open(csv_filename, mode="r", newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            row = next(reader)
+    @property
+    def variante(self) -> str:
+        return f"{self.normalizar_volumen}|{self.tempo}|{self.bitrate}"
 
-            mp3_output_path = os.path.join(self.OUTPUT_DIR, f"audio_{nicho}.mp3")
-            tts = gtts.gTTS(text=row["Idea"], slow=False)
-            tts.save(mp3_output_path)
+    def ruta_cache(self, texto: str) -> str:
+        # La caché guarda la pista ya procesada: incluye los ajustes en la huella
+        huella = hashlib.sha1(f"{texto}|{self.variante}".encode("utf-8")).hexdigest()
+        return os.path.join(self.CACHE_DIR, f"{huella}.m4a")
 
-            return mp3_output_path
+    def recortar_cache(self) -> None:
+        """Borra las narraciones menos usadas hasta quedar por debajo del límite."""
+        archivos = []
+        for nombre in os.listdir(self.CACHE_DIR):
+            ruta = os.path.join(self.CACHE_DIR, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            total -= tamano
+
+    def filtros(self) -> List[str]:
+        filtros = []
+        if self.tempo and self.tempo != 1.0:
+            # atempo solo admite factores entre 0.5 y 2.0: se encadenan si hace falta
+            tempo = self.tempo
+            while tempo > 2.0:
+                filtros.append("atempo=2.0")
+                tempo /= 2.0
+            while tempo < 0.5:
+                filtros.append("atempo=0.5")
+                tempo /= 0.5
+            filtros.append(f"atempo={tempo:.4f}")
+        if self.normalizar_volumen:
+            filtros.append(self.LOUDNORM)
+        return filtros
+
+    def procesar_audio(self, entrada: str, salida: str) -> str:
+        """
+        Convierte la narración en la pista final AAC/M4A en una sola pasada de FFmpeg.
+
+        El video la multiplexa tal cual (-c:a copy), sin volver a decodificarla.
+        """
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", entrada]
+        filtros = self.filtros()
+        if filtros:
+            cmd += ["-af", ",".join(filtros)]
+        cmd += [
+            "-ar",
+            str(self.SAMPLE_RATE),
+            "-c:a",
+            "aac",
+            "-b:a",
+            self.bitrate,
+            "-movflags",
+            "+faststart",
+            salida,
+        ]
+        subprocess.run(cmd, check=True)
+        return salida
+
+    def obtener_duracion_audio(self, audio_path: str) -> float:
+        comando = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            audio_path,
+        ]
+        return float(subprocess.check_output(comando).decode().strip())
+
+    def generate(self, ctx: JobContext, usar_cache: bool = False) -> Optional[str]:
+        """
+        Genera la narración de ctx.texto y completa ctx.audio_path y ctx.duracion_audio.
+
+        Con usar_cache se reutiliza la narración de un texto idéntico ya sintetizado
+        y las narraciones nuevas se guardan en la caché; sin él no se lee ni se
+        escribe la caché.
+        """
+        audio_output_path = os.path.join(self.OUTPUT_DIR, f"audio_{ctx.prefijo_archivos}.m4a")
+        ruta_cache = self.ruta_cache(ctx.texto)
+        reutilizada = False
+        if usar_cache:
+            try:
+                shutil.copyfile(ruta_cache, audio_output_path)
+                # Se marca como usada recientemente para el recorte de la caché
+                os.utime(ruta_cache)
+                reutilizada = True
+            except FileNotFoundError:
+                pass
+
+        if not reutilizada:
+            mp3_path = os.path.join(self.OUTPUT_DIR, f"audio_{ctx.prefijo_archivos}.mp3")
+            tts = gtts.gTTS(text=ctx.texto, lang=self.IDIOMA, slow=False)
+            tts.save(mp3_path)
+            try:
+                self.procesar_audio(mp3_path, audio_output_path)
+            finally:
+                os.remove(mp3_path)
+            if usar_cache:
+                shutil.copyfile(audio_output_path, ruta_cache)
+                self.recortar_cache()
+
+        # La duración se mide una sola vez, sobre la pista final (ya con el tempo aplicado)
+        ctx.audio_path = audio_output_path
+        ctx.duracion_audio = self.obtener_duracion_audio(audio_output_path)
+        return audio_output_path
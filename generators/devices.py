@@ -0,0 +1,131 @@
+import os
+import gc
+import logging
+import torch
+from typing import Optional, Dict, Any
+
+
+class DeviceBackend:
+    """Ajustes de ejecución de Stable Diffusion para un tipo de dispositivo."""
+
+    soporta_cuantizacion = False
+
+    def __init__(self, dispositivo: str):
+        self.dispositivo = dispositivo
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.float32
+
+    def configurar(self):
+        """Ajustes globales de torch antes de cargar el modelo."""
+
+    def preparar_pipeline(self, pipe):
+        return pipe.to(self.dispositivo)
+
+    def generador(self, seed: int) -> torch.Generator:
+        # El generador vive en el mismo dispositivo que el ruido inicial para que
+        # una misma semilla produzca siempre la misma imagen en ese dispositivo
+        return torch.Generator(device=self.dispositivo).manual_seed(seed)
+
+    def liberar_memoria(self):
+        gc.collect()
+
+
+class CudaBackend(DeviceBackend):
+    """GPU NVIDIA: float16, cuantización NF4 y offload a CPU."""
+
+    soporta_cuantizacion = True
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.float16
+
+    def configurar(self):
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+        torch.backends.cudnn.benchmark = True
+
+    def preparar_pipeline(self, pipe):
+        pipe.enable_model_cpu_offload(device=self.dispositivo)
+        pipe.enable_attention_slicing()
+        return pipe
+
+    def liberar_memoria(self):
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.ipc_collect()
+
+
+class CpuBackend(DeviceBackend):
+    """CPU: dtype configurable (float32 por defecto), hilos ajustados y compilación opcional."""
+
+    DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16}
+
+    def __init__(
+        self,
+        dispositivo: str = "cpu",
+        hilos: Optional[int] = None,
+        dtype: str = "float32",
+        compilar: bool = False,
+        channels_last: bool = True,
+    ):
+        """
+        Args:
+            dispositivo: Siempre "cpu"
+            hilos: Hilos intra-op de torch (por defecto, todos los núcleos)
+            dtype: "float32" o "bfloat16" (solo si la CPU tiene instrucciones BF16)
+            compilar: Compila el transformer con torch.compile
+            channels_last: Usa formato channels_last en el VAE convolucional
+        """
+        super().__init__(dispositivo)
+        self.hilos = hilos
+        self._dtype = self.DTYPES[dtype]
+        self.compilar = compilar
+        self.channels_last = channels_last
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._dtype
+
+    def configurar(self):
+        torch.set_num_threads(self.hilos or os.cpu_count() or 1)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Solo se puede fijar antes del primer trabajo en paralelo del proceso
+            pass
+
+    def preparar_pipeline(self, pipe):
+        pipe = pipe.to(self.dispositivo)
+        if self.channels_last:
+            pipe.vae.to(memory_format=torch.channels_last)
+        if self.compilar:
+            pipe.transformer = torch.compile(pipe.transformer)
+        return pipe
+
+
+def seleccionar_backend(
+    dispositivo: str = "auto", cpu_config: Optional[Dict[str, Any]] = None
+) -> DeviceBackend:
+    """
+    Elige el backend de ejecución.
+
+    Args:
+        dispositivo: "auto", "cpu", "cuda" o "cuda:N"
+        cpu_config: Opciones de CpuBackend (hilos, dtype, compilar, channels_last)
+
+    Returns:
+        DeviceBackend para el dispositivo elegido
+    """
+    if dispositivo == "auto":
+        dispositivo = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if dispositivo.startswith("cuda"):
+        if not torch.cuda.is_available():
+            logging.warning(f"{dispositivo} no disponible, se usa la CPU")
+            return CpuBackend(**(cpu_config or {}))
+        return CudaBackend(dispositivo)
+
+    return CpuBackend(dispositivo, **(cpu_config or {}))
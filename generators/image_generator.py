@@ -1,121 +1,453 @@
 import os
-import csv
 import time
+import shutil
+import logging
 import torch
 import nltk
-from typing import List, Optional
+from PIL import Image
+from typing import List, Optional, Dict, Any, Tuple, Callable
 from nltk.corpus import stopwords
 from diffusers import (
     BitsAndBytesConfig,
     SD3Transformer2DModel,
+    StableDiffusion3Img2ImgPipeline,
     StableDiffusion3Pipeline,
 )
+from generators.devices import seleccionar_backend
+from generators.prompt_index import PromptIndex
+from generators.image_writer import ImageWriterPool
+from generators.upscaler import ImageUpscaler
+from job_context import JobContext
 
 
 class ImageGenerator:
     """Clase encargada de generar imágenes a partir de prompts."""
 
-    PROMPTS_DIR = "resources/prompts"
     IMAGE_DIR = "resources/imagenes"
     MODEL_ID = "stabilityai/stable-diffusion-3.5-medium"
     IMAGE_WIDTH = 576
     IMAGE_HEIGHT = 1024
-    IMAGEN_QUALITY = 90
+    NUM_PASOS = 50
+    # Las dimensiones de SD3 deben ser múltiplos de 16 (VAE x8 y parches de 2)
+    MULTIPLO_DIMENSION = 16
 
-    def __init__(self):
+    def __init__(
+        self,
+        mantener_modelo: bool = False,
+        dispositivo: str = "auto",
+        cpu_config: Optional[Dict[str, Any]] = None,
+        trabajadores: Optional[List[str]] = None,
+        reutilizacion: Optional[Dict[str, Any]] = None,
+        fuerza_img2img: float = 0.6,
+        escritura: Optional[Dict[str, Any]] = None,
+        escalado: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Args:
+            escalado: Sección `imagenes.escalado`. Con `activo`, se difunde a
+                `factor` veces la resolución final y se escala en CPU al guardar
+        """
+        # Con árbitro de memoria el pipeline sigue cargado hasta que el árbitro lo expulse
+        self.mantener_modelo = mantener_modelo
+        self.cpu_config = cpu_config
+        self.backend = seleccionar_backend(dispositivo, cpu_config)
+        self.pipe: Optional[StableDiffusion3Pipeline] = None
+        # Dispositivos de los procesos trabajadores ("cuda:0", "cuda:1", "cpu", ...)
+        self.trabajadores = trabajadores or []
+        self.worker_pool = None
+        # Se llama antes de cargar el modelo (en este proceso o en los trabajadores)
+        self.al_cargar_modelo: Optional[Callable[[], Any]] = None
+        self.pipe_img2img = None
+        self.fuerza_img2img = fuerza_img2img
+        self.estadisticas: Dict[str, Any] = {}
+        self.pasos = self.NUM_PASOS
+        self.ancho = self.IMAGE_WIDTH
+        self.alto = self.IMAGE_HEIGHT
+        self.escalado = escalado or {}
+        self.factor_config = (
+            self.escalado.get("factor", 1.0) if self.escalado.get("activo") else 1.0
+        )
+        self.factor = self.factor_config
+        # La codificación, el escalado y la escritura a disco se solapan con la difusión
+        self.escritura = escritura
+        self.escritor = ImageWriterPool.desde_config(
+            escritura,
+            ImageUpscaler.desde_config(self.escalado) if self.escalado.get("activo") else None,
+        )
         os.makedirs(self.IMAGE_DIR, exist_ok=True)
 
         # Asegurarse de que NLTK tenga los stopwords
         if not hasattr(nltk, "data") or not stopwords.fileids():
             nltk.download("stopwords")
 
+        # Índice de prompts casi duplicados (usa los stopwords de NLTK)
+        self.prompt_index = PromptIndex.desde_config(reutilizacion or {})
+
     def configurar_modelo(self):
-        torch.backends.cuda.matmul.allow_tf32 = True
-        torch.backends.cudnn.allow_tf32 = True
-        torch.backends.cudnn.benchmark = True
-
-        # Configuración de cuantización
-        nf4_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_use_double_quant=True,
-        )
+        self.backend.configurar()
+        dtype = self.backend.dtype
+
+        # La cuantización NF4 de bitsandbytes solo está disponible en CUDA
+        quantization_config = None
+        if self.backend.soporta_cuantizacion:
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_use_double_quant=True,
+            )
 
-        model_nf4 = SD3Transformer2DModel.from_pretrained(
+        transformer = SD3Transformer2DModel.from_pretrained(
             self.MODEL_ID,
             subfolder="transformer",
-            quantization_config=nf4_config,
-            torch_dtype=torch.float16,
+            quantization_config=quantization_config,
+            torch_dtype=dtype,
             use_safetensors=True,
         )
 
         pipe = StableDiffusion3Pipeline.from_pretrained(
             self.MODEL_ID,
-            transformer=model_nf4,
-            torch_dtype=torch.float16,
+            transformer=transformer,
+            torch_dtype=dtype,
             use_safetensors=True,
         )
-        pipe.enable_model_cpu_offload()
-        pipe.enable_attention_slicing()
 
-        return pipe
+        return self.backend.preparar_pipeline(pipe)
 
-    def generar_imagenes_desde_prompts(
-        self,
-        nicho: str,
-        pipe: StableDiffusion3Pipeline,
-        base_seed: Optional[int] = None,
-    ) -> List[str]:
-        imagenes_ruta = []
-        prompts_file = os.path.join(self.PROMPTS_DIR, f"prompts_{nicho}.csv")
+    def aplicar_perfil(self, perfil: Optional[Dict[str, Any]] = None):
+        """Ajusta pasos y resolución según el perfil de render (por defecto, producción)."""
+        perfil = perfil or {}
+        self.pasos = perfil.get("pasos", self.NUM_PASOS)
+        self.ancho = perfil.get("ancho", self.IMAGE_WIDTH)
+        self.alto = perfil.get("alto", self.IMAGE_HEIGHT)
+        self.factor = perfil.get("factor_difusion", self.factor_config)
+
+    def _dimension_difusion(self, valor: int) -> int:
+        multiplo = self.MULTIPLO_DIMENSION
+        return max(multiplo, round(valor * self.factor / multiplo) * multiplo)
+
+    @property
+    def ancho_difusion(self) -> int:
+        return self._dimension_difusion(self.ancho) if self.factor != 1.0 else self.ancho
+
+    @property
+    def alto_difusion(self) -> int:
+        return self._dimension_difusion(self.alto) if self.factor != 1.0 else self.alto
+
+    @property
+    def escala(self) -> Optional[Tuple[int, int]]:
+        """Tamaño final si la difusión se hace a menor resolución, None si no hay que escalar."""
+        if (self.ancho_difusion, self.alto_difusion) == (self.ancho, self.alto):
+            return None
+        return (self.ancho, self.alto)
+
+    @property
+    def variante(self) -> str:
+        # Las imágenes solo se reutilizan entre renders con los mismos ajustes
+        variante = f"{self.ancho}x{self.alto}@{self.pasos}"
+        if self.escala:
+            variante += f"~{self.ancho_difusion}x{self.alto_difusion}"
+        return variante
 
+    def planificar_tareas(
+        self, prompts: List[str], base_seed: Optional[int] = None
+    ) -> List[Tuple[int, str, int]]:
+        """Devuelve las tareas (idx, prompt, seed) de un trabajo, con un seed derivado por imagen."""
         # Si no se proporciona seed, generamos uno aleatorio
         if base_seed is None:
             base_seed = torch.randint(0, 2**32 - 1, (1,)).item()
 
-        # Leer prompts del CSV
-        with open(prompts_file, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            prompts = [row["Prompt"] for row in reader]
+        return [
+            (idx, prompt, base_seed + idx)
+            for idx, prompt in enumerate(prompts)
+        ]
 
-        for idx, prompt in enumerate(prompts):
-            # Usamos un seed derivado para cada imagen
-            current_seed = base_seed + idx
-            generator = torch.Generator(device="cuda").manual_seed(current_seed)
+    def ruta_imagen(self, prefijo: str, idx: int) -> str:
+        return os.path.join(
+            self.IMAGE_DIR, f"imagen_{idx + 1:03d}_{prefijo}{self.escritor.extension}"
+        )
+
+    def renderizar(
+        self,
+        pipe: StableDiffusion3Pipeline,
+        prefijo: str,
+        idx: int,
+        prompt: str,
+        seed: int,
+        imagen_inicial: Optional[str] = None,
+        al_guardar: Optional[Callable[[float, Optional[Exception]], None]] = None,
+    ) -> Tuple[str, float]:
+        """
+        Difunde una imagen y la encola para guardarla en segundo plano.
+
+        Args:
+            al_guardar: Se llama con (segundos de difusión, error) cuando la imagen
+                está en disco
+
+        Returns:
+            Tuple con (ruta de la imagen, segundos de difusión)
+        """
+        inicio = time.time()
+        generator = self.backend.generador(seed)
+        parametros = dict(
+            num_inference_steps=self.pasos,
+            guidance_scale=7.0,
+            negative_prompt="text, watermark, low quality, cropped",
+            max_sequence_length=77,
+            generator=generator,
+        )
 
-            with torch.inference_mode():
+        with torch.inference_mode():
+            if imagen_inicial:
+                # Partimos de una imagen parecida ya renderizada: menos pasos efectivos
+                if self.pipe_img2img is None:
+                    self.pipe_img2img = StableDiffusion3Img2ImgPipeline.from_pipe(pipe)
+                with Image.open(imagen_inicial) as img:
+                    inicial = img.convert("RGB").resize(
+                        (self.ancho_difusion, self.alto_difusion), Image.LANCZOS
+                    )
+                imagen = self.pipe_img2img(
+                    prompt, image=inicial, strength=self.fuerza_img2img, **parametros
+                ).images[0]
+            else:
                 imagen = pipe(
                     prompt,
-                    num_inference_steps=50,
-                    guidance_scale=7.0,
-                    negative_prompt="text, watermark, low quality, cropped",
-                    height=self.IMAGE_HEIGHT,
-                    width=self.IMAGE_WIDTH,
-                    max_sequence_length=77,
-                    generator=generator,
+                    height=self.alto_difusion,
+                    width=self.ancho_difusion,
+                    **parametros,
                 ).images[0]
 
-            # Guardamos la imagen con su seed en los metadatos
-            ruta_imagen = os.path.join(
-                self.IMAGE_DIR, f"imagen_{idx + 1:03d}_{nicho}.jpeg"
+        segundos = time.time() - inicio
+
+        # Guardamos la imagen con su seed en los metadatos
+        ruta_imagen = self.ruta_imagen(prefijo, idx)
+        self.escritor.enviar(
+            imagen,
+            ruta_imagen,
+            seed,
+            (lambda error: al_guardar(segundos, error)) if al_guardar else None,
+            tamano=self.escala,
+        )
+        return ruta_imagen, segundos
+
+    def planificar_reutilizacion(
+        self, tareas: List[Tuple[int, str, int]]
+    ) -> Dict[int, Tuple[str, Any]]:
+        """
+        Decide qué hacer con cada prompt antes de renderizar.
+
+        Returns:
+            Diccionario idx -> (acción, origen) donde la acción es "render",
+            "img2img" (origen: imagen inicial), "reusar" (origen: entrada del índice)
+            o "copiar" (origen: idx de un prompt casi idéntico del mismo trabajo)
+        """
+        plan = {}
+        firmas_trabajo = []
+        for idx, prompt, _ in tareas:
+            if self.prompt_index is None:
+                plan[idx] = ("render", None)
+                continue
+
+            firma = self.prompt_index.firma(prompt)
+
+            # Duplicados dentro del mismo trabajo
+            similitud, origen = max(
+                ((self.prompt_index.similitud(firma, f), j) for j, f in firmas_trabajo),
+                default=(0.0, None),
             )
-            metadata = f"seed:{current_seed}"
-            imagen.save(
-                ruta_imagen,
-                quality=self.IMAGEN_QUALITY,
-                optimize=True,
-                comment=metadata.encode(),
+            if similitud >= self.prompt_index.umbral_reuso:
+                plan[idx] = ("copiar", origen)
+                continue
+
+            # Duplicados de trabajos anteriores
+            encontrado = self.prompt_index.buscar(firma, self.variante)
+            if encontrado and encontrado[1] >= self.prompt_index.umbral_reuso:
+                plan[idx] = ("reusar", encontrado[0])
+                continue
+            if encontrado:
+                plan[idx] = ("img2img", encontrado[0]["ruta"])
+            else:
+                plan[idx] = ("render", None)
+            firmas_trabajo.append((idx, firma))
+
+        return plan
+
+    def renderizar_tareas(
+        self, prefijo: str, tareas: List[Tuple[int, str, int, Optional[str]]]
+    ) -> Tuple[Dict[int, str], Dict[int, float]]:
+        """
+        Renderiza las tareas (idx, prompt, seed, imagen_inicial) en este proceso o
+        repartidas entre los trabajadores.
+
+        Returns:
+            Tuple con (rutas por idx, segundos de difusión por idx)
+        """
+        if not tareas:
+            return {}, {}
+
+        if self.al_cargar_modelo and self.pipe is None and self.worker_pool is None:
+            self.al_cargar_modelo()
+
+        if self.trabajadores:
+            # Los prompts se reparten entre procesos con el modelo ya cargado
+            from generators.image_workers import ImageWorkerPool
+
+            if self.worker_pool is None:
+                self.worker_pool = ImageWorkerPool(
+                    self.trabajadores,
+                    {
+                        "cpu_config": self.cpu_config,
+                        "fuerza_img2img": self.fuerza_img2img,
+                        "escritura": self.escritura,
+                        "escalado": self.escalado,
+                    },
+                )
+            return self.worker_pool.renderizar(
+                prefijo,
+                tareas,
+                {
+                    "pasos": self.pasos,
+                    "ancho": self.ancho,
+                    "alto": self.alto,
+                    "factor_difusion": self.factor,
+                },
+            )
+
+        pipe = self.cargar_modelo()
+        rutas, tiempos = {}, {}
+        for idx, prompt, seed, imagen_inicial in tareas:
+            rutas[idx], tiempos[idx] = self.renderizar(
+                pipe, prefijo, idx, prompt, seed, imagen_inicial
             )
-            imagenes_ruta.append(ruta_imagen)
-            time.sleep(0.5)
-
-        return imagenes_ruta
-
-    def generate(self, nicho: str, seed: Optional[int] = None) -> List[str]:
-        pipe = self.configurar_modelo()
-        imagenes_rutas = self.generar_imagenes_desde_prompts(nicho, pipe, seed)
-        torch.cuda.empty_cache()
-        torch.cuda.ipc_collect()
-        del pipe
-        return imagenes_rutas
+        # La etapa no termina hasta que todas las imágenes están en disco
+        self.escritor.vaciar()
+        return rutas, tiempos
+
+    def reutilizar(self, origen: str, seed: int, prefijo: str, idx: int) -> str:
+        """Copia una imagen existente como imagen idx del trabajo."""
+        destino = self.ruta_imagen(prefijo, idx)
+        if os.path.splitext(origen)[1] == self.escritor.extension and not os.path.exists(
+            f"{origen}.json"
+        ):
+            return shutil.copyfile(origen, destino)
+
+        # Formato distinto (o PPM con metadatos aparte): se vuelve a codificar
+        with Image.open(origen) as img:
+            self.escritor.enviar(img.convert("RGB"), destino, seed)
+        return destino
+
+    def cargar_modelo(self) -> StableDiffusion3Pipeline:
+        if self.pipe is None:
+            self.pipe = self.configurar_modelo()
+        return self.pipe
+
+    def liberar_modelo(self):
+        if self.worker_pool:
+            self.worker_pool.cerrar()
+            self.worker_pool = None
+        self.pipe = None
+        self.pipe_img2img = None
+        self.backend.liberar_memoria()
+
+    def generate(self, ctx: JobContext) -> List[str]:
+        """Renderiza una imagen por cada prompt de ctx.prompts y completa ctx.imagenes."""
+        prefijo = ctx.prefijo_archivos
+        self.aplicar_perfil(ctx.perfil)
+        tareas = self.planificar_tareas(ctx.prompts, ctx.seed)
+        plan = self.planificar_reutilizacion(tareas)
+
+        # Otro proceso puede haber expulsado del índice la imagen de origen
+        for idx, (accion, origen) in plan.items():
+            if (accion == "reusar" and not os.path.exists(origen["ruta"])) or (
+                accion == "img2img" and not os.path.exists(origen)
+            ):
+                plan[idx] = ("render", None)
+
+        a_renderizar = [
+            (idx, prompt, seed_imagen, plan[idx][1] if plan[idx][0] == "img2img" else None)
+            for idx, prompt, seed_imagen in tareas
+            if plan[idx][0] in ("render", "img2img")
+        ]
+        rutas, tiempos = self.renderizar_tareas(prefijo, a_renderizar)
+
+        seeds = {idx: seed_imagen for idx, _, seed_imagen in tareas}
+        perdidas = []
+        for idx, prompt, seed_imagen in tareas:
+            accion, origen = plan[idx]
+            if accion == "reusar":
+                try:
+                    rutas[idx] = self.reutilizar(origen["ruta"], origen["seed"], prefijo, idx)
+                except FileNotFoundError:
+                    # Expulsada entre la planificación y la copia: se renderiza
+                    plan[idx] = ("render", None)
+                    perdidas.append((idx, prompt, seed_imagen, None))
+            elif accion == "copiar":
+                rutas[idx] = self.reutilizar(rutas[origen], seeds[origen], prefijo, idx)
+        if perdidas:
+            rutas_perdidas, tiempos_perdidas = self.renderizar_tareas(prefijo, perdidas)
+            rutas.update(rutas_perdidas)
+            tiempos.update(tiempos_perdidas)
+        self.escritor.vaciar()
+
+        self.registrar_estadisticas(tareas, plan, tiempos, rutas)
+
+        if not self.mantener_modelo:
+            self.liberar_modelo()
+        ctx.imagenes = [rutas[idx] for idx, _, _ in tareas]
+        ctx.metricas["imagenes"] = self.estadisticas
+        return ctx.imagenes
+
+    def registrar_estadisticas(
+        self,
+        tareas: List[Tuple[int, str, int]],
+        plan: Dict[int, Tuple[str, Any]],
+        tiempos: Dict[int, float],
+        rutas: Dict[int, str],
+    ):
+        """Indexa las imágenes nuevas y calcula la tasa de reutilización del trabajo."""
+        acciones = [accion for accion, _ in plan.values()]
+        reutilizadas = acciones.count("reusar") + acciones.count("copiar")
+        img2img = acciones.count("img2img")
+
+        completos = [tiempos[idx] for idx, (accion, _) in plan.items() if accion == "render"]
+        segundos_por_imagen = sum(completos) / len(completos) if completos else None
+
+        if self.prompt_index:
+            for idx, prompt, seed in tareas:
+                if plan[idx][0] in ("render", "img2img"):
+                    self.prompt_index.agregar(prompt, rutas[idx], seed, self.variante)
+            if segundos_por_imagen:
+                self.prompt_index.segundos_por_imagen = segundos_por_imagen
+            else:
+                segundos_por_imagen = self.prompt_index.segundos_por_imagen
+            self.prompt_index.guardar()
+
+        # Coste de cada ajuste de resolución, para comparar factores entre trabajos
+        segundos_escalado = self.escritor.tomar_segundos_escalado()
+        rendimiento = {
+            "resolucion_difusion": f"{self.ancho_difusion}x{self.alto_difusion}",
+            "factor_difusion": self.factor,
+            "segundos_difusion_medio": (
+                round(sum(tiempos.values()) / len(tiempos), 2) if tiempos else None
+            ),
+            "segundos_escalado_medio": (
+                round(sum(segundos_escalado) / len(segundos_escalado), 3)
+                if segundos_escalado
+                else None
+            ),
+        }
+
+        segundos_por_imagen = segundos_por_imagen or 0.0
+        self.estadisticas = {
+            **rendimiento,
+            "imagenes": len(tareas),
+            "reutilizadas": reutilizadas,
+            "img2img": img2img,
+            "tasa_reutilizacion": reutilizadas / len(tareas) if tareas else 0.0,
+            "segundos_gpu_ahorrados": round(
+                reutilizadas * segundos_por_imagen
+                + img2img * segundos_por_imagen * (1 - self.fuerza_img2img),
+                1,
+            ),
+        }
+        logging.info(f"Reutilización de imágenes: {self.estadisticas}")
@@ -0,0 +1,222 @@
+import os
+import time
+import queue
+import logging
+import multiprocessing
+from typing import List, Optional, Dict, Any, Tuple, Callable
+
+
+def crear_image_generator(dispositivo: str, opciones: Dict[str, Any]):
+    """Generador de cada trabajador (se importa en el proceso hijo, no en el principal)."""
+    from generators.image_generator import ImageGenerator
+
+    return ImageGenerator(mantener_modelo=True, dispositivo=dispositivo, **opciones)
+
+
+def _trabajador(
+    dispositivo: str,
+    opciones: Dict[str, Any],
+    tareas: multiprocessing.Queue,
+    resultados: multiprocessing.Queue,
+    crear_generador: Callable[[str, Dict[str, Any]], Any] = crear_image_generator,
+):
+    """Proceso trabajador: carga el modelo una vez y renderiza tareas hasta recibir None."""
+    try:
+        generador = crear_generador(dispositivo, opciones)
+        pipe = generador.cargar_modelo()
+    except Exception as e:
+        resultados.put(("fallo", dispositivo, str(e), 0.0))
+        return
+    resultados.put(("listo", dispositivo, None, 0.0))
+
+    padre = multiprocessing.parent_process()
+    while True:
+        try:
+            tarea = tareas.get(timeout=5)
+        except queue.Empty:
+            tarea = False
+        # Si el proceso principal muere (p. ej. /cancel), el trabajador no debe
+        # quedar huérfano ni seguir renderizando las tareas pendientes
+        if padre is not None and not padre.is_alive():
+            break
+        if tarea is False:
+            continue
+        if tarea is None:
+            break
+
+        lote, prefijo, idx, prompt, seed, imagen_inicial, perfil = tarea
+        generador.aplicar_perfil(perfil)
+        ruta = generador.ruta_imagen(prefijo, idx)
+        # Cada resultado lleva el id de su tarea: uno que llega tarde de un lote
+        # abandonado por timeout no se confunde con el de la siguiente llamada
+        tarea_id = (lote, idx)
+
+        # El resultado se publica cuando la imagen está en disco, no al acabar la difusión
+        def al_guardar(segundos, error, tarea_id=tarea_id, ruta=ruta):
+            if error:
+                resultados.put(("error", tarea_id, str(error), segundos))
+            else:
+                resultados.put(("ok", tarea_id, ruta, segundos))
+
+        inicio = time.time()
+        try:
+            generador.renderizar(pipe, prefijo, idx, prompt, seed, imagen_inicial, al_guardar)
+        except Exception as e:
+            resultados.put(("error", tarea_id, str(e), time.time() - inicio))
+
+    generador.escritor.cerrar()
+
+
+class ImageWorkerPool:
+    """
+    Reparte los prompts de un trabajo entre varios procesos trabajadores.
+
+    Cada trabajador mantiene su pipeline cargado en su dispositivo y toma tareas
+    (idx, prompt, seed, imagen_inicial) de una cola compartida, de modo que los más rápidos
+    procesan más imágenes. Los resultados se reordenan por idx.
+    """
+
+    TIMEOUT_TAREA = 1800
+    TIMEOUT_CARGA = 900
+    INTERVALO_COMPROBACION = 5
+
+    def __init__(
+        self,
+        dispositivos: List[str],
+        opciones: Optional[Dict[str, Any]] = None,
+        crear_generador: Callable[[str, Dict[str, Any]], Any] = crear_image_generator,
+    ):
+        """
+        Args:
+            dispositivos: Un trabajador por entrada ("cuda:0", "cuda:1", "cpu", ...)
+            opciones: Argumentos adicionales del ImageGenerator de cada trabajador
+            crear_generador: Función (dispositivo, opciones) -> generador que se
+                ejecuta en cada trabajador. Debe poder importarse desde el proceso hijo
+        """
+        self.dispositivos = dispositivos
+        self.opciones = dict(opciones or {})
+        self.crear_generador = crear_generador
+        self.procesos: List[multiprocessing.Process] = []
+        self.lote = 0
+
+        # Los trabajadores de CPU se reparten los núcleos en lugar de competir por ellos
+        cpu_config = dict(self.opciones.get("cpu_config") or {})
+        num_cpu = sum(1 for d in dispositivos if d == "cpu")
+        if num_cpu and not cpu_config.get("hilos"):
+            cpu_config["hilos"] = max(1, (os.cpu_count() or 1) // num_cpu)
+        self.opciones["cpu_config"] = cpu_config
+
+        # spawn: CUDA no se puede inicializar en un proceso creado con fork
+        self.contexto = multiprocessing.get_context("spawn")
+        self.tareas = self.contexto.Queue()
+        self.resultados = self.contexto.Queue()
+
+    def iniciar(self):
+        if self.procesos:
+            return
+
+        for dispositivo in self.dispositivos:
+            proceso = self.contexto.Process(
+                target=_trabajador,
+                args=(
+                    dispositivo,
+                    self.opciones,
+                    self.tareas,
+                    self.resultados,
+                    self.crear_generador,
+                ),
+                daemon=True,
+            )
+            proceso.start()
+            self.procesos.append(proceso)
+
+        # Esperar a que todos los modelos estén cargados. Un trabajador que muere
+        # al cargar (OOM, error de CUDA) no publica nada: se vigila su exitcode
+        limite = time.monotonic() + self.TIMEOUT_CARGA
+        listos = 0
+        while listos < len(self.procesos):
+            try:
+                estado, dispositivo, error, _ = self.resultados.get(
+                    timeout=self.INTERVALO_COMPROBACION
+                )
+            except queue.Empty:
+                muertos = [
+                    f"{dispositivo} (código {proceso.exitcode})"
+                    for dispositivo, proceso in zip(self.dispositivos, self.procesos)
+                    if not proceso.is_alive()
+                ]
+                if muertos:
+                    self.cerrar()
+                    raise RuntimeError(
+                        "Trabajador de imágenes terminado al cargar el modelo: "
+                        + ", ".join(muertos)
+                    )
+                if time.monotonic() > limite:
+                    self.cerrar()
+                    raise RuntimeError(
+                        "Tiempo de espera agotado al cargar los trabajadores de imágenes"
+                    )
+                continue
+            if estado == "fallo":
+                self.cerrar()
+                raise RuntimeError(f"No se pudo iniciar el trabajador {dispositivo}: {error}")
+            listos += 1
+            logging.info(f"Trabajador de imágenes listo en {dispositivo}")
+
+    def renderizar(
+        self,
+        prefijo: str,
+        tareas: List[Tuple[int, str, int, Optional[str]]],
+        perfil: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Dict[int, str], Dict[int, float]]:
+        """
+        Renderiza las tareas en paralelo con los pasos y la resolución del perfil.
+
+        Returns:
+            Tuple con (rutas por idx, segundos de difusión por idx)
+        """
+        if not tareas:
+            return {}, {}
+        self.iniciar()
+
+        self.lote += 1
+        lote = self.lote
+        for idx, prompt, seed, imagen_inicial in tareas:
+            self.tareas.put((lote, prefijo, idx, prompt, seed, imagen_inicial, perfil))
+
+        rutas, tiempos = {}, {}
+        errores = []
+        pendientes = {idx for idx, _, _, _ in tareas}
+        while pendientes:
+            try:
+                estado, tarea_id, valor, segundos = self.resultados.get(
+                    timeout=self.TIMEOUT_TAREA
+                )
+            except queue.Empty:
+                raise RuntimeError("Tiempo de espera agotado en los trabajadores de imágenes")
+            lote_resultado, idx = tarea_id
+            if lote_resultado != lote or idx not in pendientes:
+                logging.warning(
+                    f"Resultado tardío descartado: lote {lote_resultado}, imagen {idx + 1}"
+                )
+                continue
+            pendientes.discard(idx)
+            if estado == "ok":
+                rutas[idx] = valor
+                tiempos[idx] = segundos
+            else:
+                errores.append(f"imagen {idx + 1}: {valor}")
+
+        if errores:
+            raise RuntimeError("Error al generar imágenes: " + "; ".join(errores))
+
+        return rutas, tiempos
+
+    def cerrar(self):
+        for _ in self.procesos:
+            self.tareas.put(None)
+        for proceso in self.procesos:
+            proceso.join(timeout=30)
+            if proceso.is_alive():
+                proceso.terminate()
+        self.procesos = []
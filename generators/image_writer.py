@@ -0,0 +1,155 @@
+import json
+import time
+import queue
+import threading
+from typing import Optional, Callable, Dict, Any, List, Tuple
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+
+class ImageWriterPool:
+    """
+    Codifica y guarda imágenes en hilos de fondo mientras se difunde la siguiente.
+
+    La cola es acotada: si la codificación va por detrás de la difusión, `enviar`
+    se bloquea en lugar de acumular imágenes en memoria.
+    """
+
+    # "raw" se guarda como PPM sin compresión (FFmpeg lo lee directamente)
+    EXTENSIONES = {"jpeg": ".jpeg", "webp": ".webp", "png": ".png", "raw": ".ppm"}
+    TAG_DESCRIPCION = 0x010E  # EXIF ImageDescription
+
+    def __init__(
+        self,
+        formato: str = "jpeg",
+        calidad: int = 90,
+        hilos: int = 2,
+        max_cola: int = 4,
+        escalador=None,
+    ):
+        """
+        Args:
+            formato: "jpeg", "webp", "png" o "raw"
+            calidad: Calidad de los formatos con pérdida
+            hilos: Hilos de codificación
+            max_cola: Imágenes pendientes como máximo antes de bloquear
+            escalador: ImageUpscaler para las imágenes enviadas con `tamano`
+        """
+        if formato not in self.EXTENSIONES:
+            raise ValueError(f"Formato de imagen no soportado: {formato}")
+        self.formato = formato
+        self.calidad = calidad
+        self.cola: queue.Queue = queue.Queue(maxsize=max_cola)
+        self.errores = []
+        self.escalador = escalador
+        self.segundos_escalado: List[float] = []
+        self._lock = threading.Lock()
+        self.hilos = [
+            threading.Thread(target=self._bucle, name=f"image-writer-{i}", daemon=True)
+            for i in range(max(1, hilos))
+        ]
+        for hilo in self.hilos:
+            hilo.start()
+
+    @classmethod
+    def desde_config(
+        cls, config: Optional[Dict[str, Any]], escalador=None
+    ) -> "ImageWriterPool":
+        return cls(**(config or {}), escalador=escalador)
+
+    @property
+    def extension(self) -> str:
+        return self.EXTENSIONES[self.formato]
+
+    def guardar(self, imagen: Image.Image, ruta: str, seed: Optional[int]):
+        """Codifica y escribe una imagen conservando la seed en sus metadatos."""
+        metadata = f"seed:{seed}" if seed is not None else ""
+
+        if self.formato == "jpeg":
+            # Sin optimize: evita la pasada extra de Huffman
+            imagen.save(ruta, "JPEG", quality=self.calidad, comment=metadata.encode())
+        elif self.formato == "webp":
+            exif = Image.Exif()
+            exif[self.TAG_DESCRIPCION] = metadata
+            imagen.save(ruta, "WEBP", quality=self.calidad, exif=exif.tobytes())
+        elif self.formato == "png":
+            info = PngInfo()
+            info.add_text("seed", str(seed))
+            imagen.save(ruta, "PNG", pnginfo=info, compress_level=1)
+        else:
+            # PPM no admite metadatos: la seed va en un archivo JSON al lado
+            imagen.save(ruta, "PPM")
+            with open(f"{ruta}.json", "w", encoding="utf-8") as f:
+                json.dump({"seed": seed}, f)
+
+    def _bucle(self):
+        while True:
+            tarea = self.cola.get()
+            try:
+                if tarea is None:
+                    return
+                imagen, ruta, seed, al_guardar, tamano = tarea
+                error = None
+                try:
+                    if tamano and self.escalador:
+                        inicio = time.perf_counter()
+                        imagen = self.escalador.escalar(imagen, tamano)
+                        with self._lock:
+                            self.segundos_escalado.append(time.perf_counter() - inicio)
+                    self.guardar(imagen, ruta, seed)
+                except Exception as e:
+                    error = e
+                    with self._lock:
+                        self.errores.append(f"{ruta}: {e}")
+                if al_guardar:
+                    al_guardar(error)
+            except Exception as e:
+                with self._lock:
+                    self.errores.append(str(e))
+            finally:
+                self.cola.task_done()
+
+    def enviar(
+        self,
+        imagen: Image.Image,
+        ruta: str,
+        seed: Optional[int],
+        al_guardar: Optional[Callable[[Optional[Exception]], None]] = None,
+        tamano: Optional[Tuple[int, int]] = None,
+    ):
+        """
+        Encola una imagen para guardarla.
+
+        Args:
+            imagen: Imagen PIL
+            ruta: Ruta de destino
+            seed: Semilla con la que se generó
+            al_guardar: Se llama con None o con la excepción cuando termina la escritura
+            tamano: Si se indica, la imagen se escala a (ancho, alto) antes de guardarla
+        """
+        self.cola.put((imagen, ruta, seed, al_guardar, tamano))
+
+    def tomar_segundos_escalado(self) -> List[float]:
+        """Devuelve y reinicia los tiempos de escalado acumulados."""
+        with self._lock:
+            segundos, self.segundos_escalado = self.segundos_escalado, []
+        return segundos
+
+    def vaciar(self):
+        """Espera a que se escriban todas las imágenes pendientes."""
+        self.cola.join()
+        with self._lock:
+            errores, self.errores = self.errores, []
+        if errores:
+            raise RuntimeError("Error al guardar imágenes: " + "; ".join(errores))
+
+    def cerrar(self):
+        try:
+            self.vaciar()
+        finally:
+            for _ in self.hilos:
+                self.cola.put(None)
+            for hilo in self.hilos:
+                hilo.join()
+            if self.escalador:
+                self.escalador.cerrar()
@@ -2,9 +2,9 @@ import os
 import csv
 import re
 from typing import List, Optional
-from pydub import AudioSegment
 from utils import start_ollama, stop_ollama
-import ollama
+from job_context import JobContext
+from llm_cache import LLMCache
 
 
 class PromptGenerator:
@@ -12,20 +12,14 @@ class PromptGenerator:
 
     OUTPUT_FOLDER = "resources/prompts"
     CSV_HEADERS = ["ID", "Prompt"]
-    TEXT_DIR = "resources/texto"
-    AUDIO_DIR = "resources/audio"
+    DURACION_POR_DEFECTO = 40  # Segundos (10 imágenes) si no se conoce la narración
+    MODELO = "prompt-engineer"
 
-    def __init__(self):
+    def __init__(self, detener_ollama: bool = True, cache: Optional[LLMCache] = None):
+        self.detener_ollama = detener_ollama
+        self.cache = cache or LLMCache(activo=False)
         os.makedirs(self.OUTPUT_FOLDER, exist_ok=True)
 
-    def obtener_duracion_audio(self, nicho: str) -> float:
-        audio_path = os.path.join(self.AUDIO_DIR, f"audio_{nicho}.mp3")
-        if not os.path.exists(audio_path):
-            return 40  # Valor por defecto (10 imágenes)
-
-        audio = AudioSegment.from_mp3(audio_path)
-        return len(audio) / 1000  # Convertir de milisegundos a segundos
-
     def procesar_respuesta(self, respuesta: dict) -> str:
         content = respuesta.get("response", "").strip()
         content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL)
@@ -34,50 +28,56 @@ class PromptGenerator:
         )
         return content
 
+    def limpiar_prompts(self, prompts: List[str]) -> List[str]:
+        # Quita la numeración ("1. ...") que suele añadir el modelo
+        return [re.sub(r"^\d+\.\s*", "", p.strip()) for p in prompts if p.strip()]
+
     def guardar_prompts_csv(self, prompts: List[str], archivo: str):
         with open(archivo, "w", newline="", encoding="utf-8") as file:
             writer = csv.writer(file)
             writer.writerow(self.CSV_HEADERS)
             for i, prompt in enumerate(prompts, 1):
-                prompt_limpio = re.sub(r"^\d+\.\s*", "", prompt)
-                writer.writerow([i, prompt_limpio])
+                writer.writerow([i, prompt])
 
-    def generar_prompts_deepseek(self, text: str, num_prompts: int) -> str:
+    def generar_prompts_deepseek(
+        self, text: str, num_prompts: int, seed: Optional[int] = None
+    ) -> str:
         # Iniciando Ollama
-        start_ollama()
+        start_ollama(self.cache.cliente)
 
         try:
-            modelo = "prompt-engineer"
             prompt = (
                 f"""Generate {num_prompts} image prompts based on this text:{text}"""
             )
 
-            response = ollama.generate(model=modelo, prompt=prompt, stream=False)
+            response = self.cache.generate(
+                model=self.MODELO,
+                prompt=prompt,
+                options={"seed": seed} if seed is not None else None,
+            )
 
             return self.procesar_respuesta(response)
         except Exception as e:
             print(f"Error al generar prompts con Ollama: {e}")
             return ""
         finally:
-            stop_ollama()
+            if self.detener_ollama:
+                stop_ollama()
 
-    def generate(self, nicho: str) -> Optional[str]:
-        prompts_path = os.path.join(self.OUTPUT_FOLDER, f"prompts_{nicho}.csv")
+    def generate(self, ctx: JobContext) -> List[str]:
+        """
+        Completa ctx.prompts con un prompt por cada 4 segundos de narración.
 
-        # Obtener duración del audio y calcular número de prompts
-        duracion = self.obtener_duracion_audio(nicho)
+        Si hay una duración estimada se usa esa, aunque el audio ya esté listo,
+        para que el número de prompts no dependa de qué etapa termine antes.
+        """
+        duracion = ctx.duracion_estimada or ctx.duracion_audio or self.DURACION_POR_DEFECTO
         num_prompts = max(1, int(duracion // 4))  # Una imagen cada 4 segundos
 
-        # Leer el texto del CSV
-        csv_filename = os.path.join(self.TEXT_DIR, f"idea_{nicho}.csv")
-        with open(csv_filename, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            row = next(reader)
-            texto = row["Idea"]
-
         # Generamos la respuesta con el número calculado de prompts
-        prompts_str = self.generar_prompts_deepseek(texto, num_prompts)
-        prompts_list = [p.strip() for p in prompts_str.splitlines() if p.strip()]
-        self.guardar_prompts_csv(prompts_list, prompts_path)
+        prompts_str = self.generar_prompts_deepseek(ctx.texto, num_prompts, ctx.seed)
+        ctx.prompts = self.limpiar_prompts(prompts_str.splitlines())
 
-        return prompts_path
+        prompts_path = os.path.join(self.OUTPUT_FOLDER, f"prompts_{ctx.prefijo_archivos}.csv")
+        ctx.persistir(self.guardar_prompts_csv, list(ctx.prompts), prompts_path)
+        return ctx.prompts
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import random
+import shutil
+import hashlib
+from typing import List, Optional, Dict, Any, Tuple
+from nltk.corpus import stopwords
+from nltk.stem import SnowballStemmer
+from utils import bloqueo_archivo
+
+
+class PromptIndex:
+    """
+    Índice persistente de prompts ya renderizados para reutilizar imágenes.
+
+    Los prompts se normalizan (minúsculas, sin stopwords, con stemming), se
+    convierten en shingles de una y dos palabras y se resumen con una firma
+    MinHash. La fracción de componentes iguales entre dos firmas estima la
+    similitud de Jaccard entre los prompts.
+
+    Varios procesos comparten el índice: las entradas nuevas se acumulan en
+    memoria y guardar() las fusiona con el archivo bajo un lock de archivo.
+    """
+
+    INDEX_PATH = "resources/cache/prompt_index.json"
+    CACHE_DIR = "resources/cache/imagenes"
+    NUM_PERMUTACIONES = 64
+    _PRIMO = (1 << 61) - 1
+
+    def __init__(
+        self,
+        path: str = INDEX_PATH,
+        cache_dir: str = CACHE_DIR,
+        umbral_reuso: float = 0.9,
+        umbral_img2img: Optional[float] = None,
+        max_entradas: int = 5000,
+    ):
+        """
+        Args:
+            path: Archivo JSON del índice
+            cache_dir: Carpeta donde se conservan las imágenes indexadas
+            umbral_reuso: Similitud a partir de la cual se reutiliza la imagen tal cual
+            umbral_img2img: Similitud a partir de la cual se usa como punto de partida
+                de img2img (None para desactivarlo)
+            max_entradas: Número máximo de imágenes indexadas (se descartan las más antiguas)
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.cache_dir = cache_dir
+        self.umbral_reuso = umbral_reuso
+        self.umbral_img2img = umbral_img2img
+        self.max_entradas = max_entradas
+        os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.stopwords = set(stopwords.words("english"))
+        self.stemmer = SnowballStemmer("english")
+
+        # Coeficientes fijos: las firmas deben ser comparables entre ejecuciones
+        rng = random.Random(20240229)
+        self.permutaciones = [
+            (rng.randrange(1, self._PRIMO), rng.randrange(0, self._PRIMO))
+            for _ in range(self.NUM_PERMUTACIONES)
+        ]
+
+        self.entradas: List[Dict[str, Any]] = []
+        self.nuevas: List[Dict[str, Any]] = []
+        self.segundos_por_imagen: Optional[float] = None
+        self.cargar()
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> Optional["PromptIndex"]:
+        """Crea el índice a partir de `imagenes.reutilizacion` o None si está desactivado."""
+        if not config.get("activo", False):
+            return None
+        return cls(
+            umbral_reuso=config.get("umbral_reuso", 0.9),
+            umbral_img2img=config.get("umbral_img2img"),
+            max_entradas=config.get("max_entradas", 5000),
+        )
+
+    def _leer(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def cargar(self):
+        datos = self._leer()
+        self.entradas = [e for e in datos.get("entradas", []) if os.path.exists(e["ruta"])]
+        self.segundos_por_imagen = datos.get("segundos_por_imagen")
+
+    def guardar(self):
+        """
+        Fusiona las entradas nuevas con las que otros procesos hayan guardado y
+        descarta las más antiguas por encima de max_entradas.
+        """
+        with bloqueo_archivo(self.lock_path):
+            datos = self._leer()
+            rutas_nuevas = {e["ruta"] for e in self.nuevas}
+            entradas = [
+                e
+                for e in datos.get("entradas", [])
+                if e["ruta"] not in rutas_nuevas and os.path.exists(e["ruta"])
+            ]
+            entradas = sorted(entradas + self.nuevas, key=lambda e: e["creado"])
+
+            # Solo se borran imágenes que ya no están en el índice compartido
+            sobrantes = len(entradas) - self.max_entradas
+            if sobrantes > 0:
+                for antigua in entradas[:sobrantes]:
+                    try:
+                        os.remove(antigua["ruta"])
+                    except OSError:
+                        pass
+                entradas = entradas[sobrantes:]
+
+            temporal = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"entradas": entradas, "segundos_por_imagen": self.segundos_por_imagen},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(temporal, self.path)
+
+        self.entradas = entradas
+        self.nuevas = []
+
+    def normalizar(self, prompt: str) -> List[str]:
+        tokens = re.findall(r"[a-z0-9]+", prompt.lower())
+        return [self.stemmer.stem(t) for t in tokens if t not in self.stopwords]
+
+    def shingles(self, tokens: List[str]) -> set:
+        unigramas = set(tokens)
+        bigramas = {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+        return unigramas | bigramas
+
+    def firma(self, prompt: str) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+            for s in self.shingles(self.normalizar(prompt))
+        ]
+        if not hashes:
+            return [self._PRIMO] * self.NUM_PERMUTACIONES
+        return [min((a * h + b) % self._PRIMO for h in hashes) for a, b in self.permutaciones]
+
+    @staticmethod
+    def similitud(firma_a: List[int], firma_b: List[int]) -> float:
+        iguales = sum(1 for a, b in zip(firma_a, firma_b) if a == b)
+        return iguales / len(firma_a)
+
+    def buscar(
+        self, firma: List[int], variante: Optional[str] = None
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Devuelve la entrada más parecida si supera algún umbral de reutilización.
+
+        Args:
+            firma: Firma MinHash del prompt
+            variante: Solo se consideran imágenes renderizadas con la misma variante
+                (resolución y pasos)
+        """
+        umbral = min(u for u in (self.umbral_reuso, self.umbral_img2img) if u is not None)
+        mejor, mejor_similitud = None, 0.0
+        for entrada in self.entradas:
+            if entrada.get("variante") != variante:
+                continue
+            similitud = self.similitud(firma, entrada["firma"])
+            if similitud > mejor_similitud:
+                mejor, mejor_similitud = entrada, similitud
+        if mejor is None or mejor_similitud < umbral:
+            return None
+        return mejor, mejor_similitud
+
+    def agregar(
+        self, prompt: str, ruta_imagen: str, seed: int, variante: Optional[str] = None
+    ) -> None:
+        """Copia la imagen a la caché y la indexa con la firma de su prompt."""
+        nombre = hashlib.sha1(f"{prompt}|{seed}|{variante}".encode("utf-8")).hexdigest()
+        extension = os.path.splitext(ruta_imagen)[1]
+        ruta_cache = os.path.join(self.cache_dir, f"{nombre}{extension}")
+        # Copia atómica: otro proceso puede estar leyendo la misma imagen
+        temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        shutil.copyfile(ruta_imagen, temporal)
+        os.replace(temporal, ruta_cache)
+
+        entrada = {
+            "prompt": prompt,
+            "firma": self.firma(prompt),
+            "ruta": ruta_cache,
+            "seed": seed,
+            "variante": variante,
+            "creado": time.time(),
+        }
+        self.entradas.append(entrada)
+        self.nuevas.append(entrada)
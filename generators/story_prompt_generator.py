@@ -0,0 +1,179 @@
+import os
+import re
+import json
+from typing import List, Optional, Tuple, Dict, Any
+from utils import start_ollama, stop_ollama
+from generators.text_generator import TextGenerator
+from generators.prompt_generator import PromptGenerator
+from job_context import JobContext
+from llm_cache import LLMCache
+
+
+class StoryPromptGenerator:
+    """Clase encargada de generar historia y prompts de imagen en una sola llamada al LLM."""
+
+    MODELO = TextGenerator.MODELO
+    NUM_PROMPTS_DEFECTO = 10  # ~40 segundos de narración, una imagen cada 4 segundos
+    MAX_REINTENTOS = 2
+    SYSTEM_PROMPT = (
+        "You write micro-stories for short vertical videos and the image prompts "
+        "that illustrate them. The story must be a single paragraph of 80 to 120 "
+        "words, engaging from the first sentence. Each image prompt describes one "
+        "scene of the story in order, in a single line, with subject, setting, "
+        "lighting and style, without text or watermarks. Answer only with a JSON "
+        'object with the keys "story" (string) and "prompts" (array of strings).'
+    )
+
+    def __init__(
+        self,
+        text_generator: Optional[TextGenerator] = None,
+        prompt_generator: Optional[PromptGenerator] = None,
+        detener_ollama: bool = True,
+        cache: Optional[LLMCache] = None,
+    ):
+        self.detener_ollama = detener_ollama
+        self.cache = cache or LLMCache(activo=False)
+        self.text_generator = text_generator or TextGenerator(cache=self.cache)
+        self.prompt_generator = prompt_generator or PromptGenerator(cache=self.cache)
+
+    def esquema(self, num_prompts: int) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "story": {"type": "string"},
+                "prompts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "minItems": num_prompts,
+                    "maxItems": num_prompts,
+                },
+            },
+            "required": ["story", "prompts"],
+        }
+
+    def validar_respuesta(self, contenido: str, num_prompts: int) -> Tuple[str, List[str]]:
+        """
+        Extrae y valida la historia y los prompts de la respuesta JSON del modelo.
+
+        Raises:
+            ValueError: Si la respuesta no es JSON o no cumple el esquema
+        """
+        contenido = re.sub(r"<think>.*?</think>", "", contenido, flags=re.DOTALL)
+        inicio, fin = contenido.find("{"), contenido.rfind("}")
+        if inicio == -1 or fin <= inicio:
+            raise ValueError("la respuesta no contiene un objeto JSON")
+
+        datos = json.loads(contenido[inicio : fin + 1])
+        if not isinstance(datos, dict):
+            raise ValueError("la respuesta no es un objeto JSON")
+
+        historia = datos.get("story")
+        if not isinstance(historia, str) or not historia.strip():
+            raise ValueError('falta el campo "story" o está vacío')
+
+        prompts = datos.get("prompts")
+        if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+            raise ValueError('el campo "prompts" debe ser una lista de textos')
+        prompts = [p.strip() for p in prompts if p.strip()]
+        if len(prompts) < num_prompts:
+            raise ValueError(
+                f'"prompts" tiene {len(prompts)} elementos y se esperaban {num_prompts}'
+            )
+
+        historia = " ".join(historia.split())
+        return historia, prompts[:num_prompts]
+
+    def reparar_respuesta(self, contenido: str, error: str, num_prompts: int) -> str:
+        """Pide al modelo que corrija solo el formato de una respuesta inválida."""
+        prompt = (
+            f"This output does not match the required JSON format ({error}). "
+            f'Return only the corrected JSON object with the keys "story" and '
+            f'"prompts" (exactly {num_prompts} strings). Keep the original story '
+            f"text, do not rewrite it.\n\n{contenido}"
+        )
+        response = self.cache.generate(
+            model=self.MODELO,
+            prompt=prompt,
+            system=self.SYSTEM_PROMPT,
+            format=self.esquema(num_prompts),
+            options={"temperature": 0},
+        )
+        return response.get("response", "")
+
+    def generar_historia_y_prompts(
+        self,
+        nicho: str,
+        era: str,
+        location: str,
+        tone: str,
+        num_prompts: int,
+        seed: Optional[int] = None,
+    ) -> Optional[Tuple[str, List[str]]]:
+        start_ollama(self.cache.cliente)
+
+        try:
+            prompt = f"""
+                Topic: {nicho}
+                Time period: {era if era else "any relevant time period"}
+                Location: {location if location else "appropriate geographical context"}
+                Tone: {tone}
+                Write the micro-story and exactly {num_prompts} image prompts for its scenes.
+            """
+
+            response = self.cache.generate(
+                model=self.MODELO,
+                prompt=prompt,
+                system=self.SYSTEM_PROMPT,
+                format=self.esquema(num_prompts),
+                options={"seed": seed} if seed is not None else None,
+            )
+            contenido = response.get("response", "")
+
+            for intento in range(self.MAX_REINTENTOS + 1):
+                try:
+                    return self.validar_respuesta(contenido, num_prompts)
+                except ValueError as e:
+                    if intento == self.MAX_REINTENTOS:
+                        raise
+                    contenido = self.reparar_respuesta(contenido, str(e), num_prompts)
+        except Exception as e:
+            print(f"Error al generar historia y prompts con Ollama: {e}")
+            return None
+        finally:
+            if self.detener_ollama:
+                stop_ollama()
+
+    def generate(
+        self, ctx: JobContext, num_prompts: Optional[int] = None, respaldo: bool = True
+    ) -> bool:
+        """
+        Completa ctx.texto y ctx.prompts con una sola llamada al LLM.
+
+        Si la respuesta sigue siendo inválida tras las reparaciones y `respaldo`
+        está activo, la historia se genera en modo separado y ctx.prompts queda
+        vacío para que lo complete el PromptGenerator.
+
+        Returns:
+            bool: False si no se obtuvo la historia
+        """
+        num_prompts = num_prompts or self.NUM_PROMPTS_DEFECTO
+
+        resultado = self.generar_historia_y_prompts(
+            ctx.nicho_texto, ctx.era, ctx.location, ctx.tone, num_prompts, ctx.seed
+        )
+        if not resultado:
+            if not respaldo:
+                return False
+            print("Respuesta combinada inválida: se genera la historia en modo separado")
+            return self.text_generator.generate(ctx) is not None
+        historia, prompts = resultado
+        ctx.texto = historia = " ".join(historia.split("\n"))
+        ctx.prompts = self.prompt_generator.limpiar_prompts(prompts)
+
+        idea_path = os.path.join(self.text_generator.OUTPUT_FOLDER, f"idea_{ctx.prefijo_archivos}.csv")
+        prompts_path = os.path.join(
+            self.prompt_generator.OUTPUT_FOLDER, f"prompts_{ctx.prefijo_archivos}.csv"
+        )
+        ctx.persistir(self.text_generator.guardar_idea_csv, historia, ctx.nicho, idea_path)
+        ctx.persistir(self.prompt_generator.guardar_prompts_csv, list(ctx.prompts), prompts_path)
+        return True
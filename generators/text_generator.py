@@ -1,9 +1,11 @@
 import os
 import csv
 import re
-import ollama
-from typing import Optional
+import asyncio
+from typing import Optional, List, Tuple
 from utils import start_ollama, stop_ollama
+from job_context import JobContext
+from llm_cache import LLMCache
 
 
 class TextGenerator:
@@ -11,8 +13,12 @@ class TextGenerator:
 
     OUTPUT_FOLDER = "resources/texto"
     CSV_HEADERS = ["ID", "Idea", "Nicho"]
+    MODELO = "storyteller"
 
-    def __init__(self):
+    def __init__(self, detener_ollama: bool = True, cache: Optional[LLMCache] = None):
+        # Sin árbitro de memoria se detiene Ollama tras cada llamada para liberar la GPU
+        self.detener_ollama = detener_ollama
+        self.cache = cache or LLMCache(activo=False)
         os.makedirs(self.OUTPUT_FOLDER, exist_ok=True)
 
     def procesar_respuesta(self, respuesta: dict) -> str:
@@ -27,32 +33,9 @@ class TextGenerator:
             writer.writerow(self.CSV_HEADERS)
             writer.writerow([1, idea, nicho])
 
-    def formatear_csv(self, archivo: str):
-        with open(archivo, "r", encoding="utf-8") as f:
-            contenido = f.read()
-
-        dentro_comillas = False
-        nuevo_contenido = []
-        for char in contenido:
-            if char == '"':
-                dentro_comillas = not dentro_comillas
-            if dentro_comillas and char == "\n":
-                nuevo_contenido.append(" ")
-            else:
-                nuevo_contenido.append(char)
-
-        with open(archivo, "w", encoding="utf-8", newline="") as f:
-            f.write("".join(nuevo_contenido))
-
-    def generar_ideas_deepseek(
-        self, nicho: str, era: str, location: str, tone: str
-    ) -> Optional[str]:
-        start_ollama()
-
-        try:
-            # Crear modelo personalizado si no existe
-            modelo = "storyteller"
-            prompt = f"""
+    @staticmethod
+    def prompt_idea(nicho: str, era: str, location: str, tone: str) -> str:
+        return f"""
                 Topic: {nicho}
                 Time period: {era if era else "any relevant time period"}
                 Location: {location if location else "appropriate geographical context"}
@@ -60,7 +43,23 @@ class TextGenerator:
                 Generate a micro-story following the system instructions.
             """
 
-            response = ollama.generate(model=modelo, prompt=prompt, stream=False)
+    def generar_ideas_deepseek(
+        self, nicho: str, era: str, location: str, tone: str, seed: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Genera una micro-historia.
+
+        Con seed la generación es reproducible y puede servirse desde la caché;
+        sin ella cada llamada produce una historia distinta.
+        """
+        start_ollama(self.cache.cliente)
+
+        try:
+            response = self.cache.generate(
+                model=self.MODELO,
+                prompt=self.prompt_idea(nicho, era, location, tone),
+                options={"seed": seed} if seed is not None else None,
+            )
 
             texto_generado = response.get("response", "")
             return self.procesar_respuesta({"response": texto_generado})
@@ -68,19 +67,57 @@ class TextGenerator:
             print(f"Error al generar texto con Ollama: {e}")
             return None
         finally:
-            stop_ollama()
+            if self.detener_ollama:
+                stop_ollama()
 
-    def generate(
-        self, nicho: str, era: str = "", location: str = "", tone: str = "engaging"
+    async def agenerar_ideas(
+        self, nicho: str, era: str, location: str, tone: str, seed: Optional[int] = None
     ) -> Optional[str]:
-        nicho_archivo = nicho
+        """
+        Versión asíncrona de generar_ideas_deepseek.
 
-        nicho_texto = nicho.replace("_", " ")
+        No detiene Ollama al terminar: puede haber otras generaciones en vuelo.
+        """
+        try:
+            await asyncio.to_thread(start_ollama, self.cache.cliente)
+            response = await self.cache.agenerate(
+                model=self.MODELO,
+                prompt=self.prompt_idea(nicho, era, location, tone),
+                options={"seed": seed} if seed is not None else None,
+            )
+            return self.procesar_respuesta(response)
+        except Exception as e:
+            print(f"Error al generar texto con Ollama: {e}")
+            return None
+
+    async def agenerar_lote(
+        self, combinaciones: List[Tuple[str, str, str, str]]
+    ) -> List[Optional[str]]:
+        """
+        Genera una historia por combinación (nicho, era, ubicación, tono) a la vez.
+
+        La concurrencia real la limita el OllamaClient de la caché.
+        """
+        return await asyncio.gather(
+            *(self.agenerar_ideas(*combinacion) for combinacion in combinaciones)
+        )
+
+    def generate(self, ctx: JobContext) -> Optional[str]:
+        """
+        Completa ctx.texto con la historia del video.
+
+        Si el contexto ya trae una idea pregenerada no se llama al LLM.
+        """
+        idea = ctx.texto
+        if idea is None:
+            idea = self.generar_ideas_deepseek(
+                ctx.nicho_texto, ctx.era, ctx.location, ctx.tone, ctx.seed
+            )
+        if not idea:
+            return None
 
-        csv_path = os.path.join(self.OUTPUT_FOLDER, f"idea_{nicho_archivo}.csv")
-        idea = self.generar_ideas_deepseek(nicho_texto, era, location, tone)
-        if idea:
-            self.guardar_idea_csv(idea, nicho, csv_path)
-            self.formatear_csv(csv_path)
-            return csv_path
-        return None
+        # Los saltos de línea se pliegan en memoria: la historia es un único párrafo
+        ctx.texto = " ".join(idea.split("\n"))
+        csv_path = os.path.join(self.OUTPUT_FOLDER, f"idea_{ctx.prefijo_archivos}.csv")
+        ctx.persistir(self.guardar_idea_csv, ctx.texto, ctx.nicho, csv_path)
+        return ctx.texto
@@ -1,49 +1,289 @@
 import os
-import glob
-import torch
+import json
+import time
+import threading
 import subprocess
 import tempfile
 import datetime
+from collections import deque
+from typing import List, Optional, Dict, Any, Callable
 from PIL import Image
+from job_context import JobContext
 
 
 class VideoGenerator:
     """Clase encargada de generar videos a partir de imágenes, audio y subtítulos."""
 
-    IMAGE_DIR = "resources/imagenes"
-    AUDIO_DIR = "resources/audio"
     VIDEO_DIR = "resources/video"
-    TEXT_DIR = "resources/texto"
-    SUBTITULOS_DIR = "resources/subtitulos"
+    FPS = 30
+    LINEAS_STDERR = 40
+    ESTILO_SUBTITULOS = {
+        "Fontsize": 15,
+        "Bold": 1,
+        "PrimaryColour": "&HFFFFFF",
+        "OutlineColour": "&H222222",
+        "Outline": 1,
+        "Shadow": 1,
+        "Alignment": 2,
+        "MarginV": 50,
+    }
 
-    def __init__(self):
+    def __init__(self, versiones: Optional[List[Dict[str, Any]]] = None):
+        """
+        Args:
+            versiones: Versiones (resolución, bitrate, estilo de subtítulos) que se
+                generan a la vez en cada render de producción
+        """
+        self.versiones = versiones or []
         os.makedirs(self.VIDEO_DIR, exist_ok=True)
+        self.telemetria: Dict[str, Any] = {}
 
-    def obtener_duracion_audio(self, nicho: str) -> float:
-        audio_path = os.path.join(self.AUDIO_DIR, f"audio_{nicho}.mp3")
-        comando = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            audio_path,
+    @staticmethod
+    def _numero(valor: Optional[str], sufijo: str = "") -> Optional[float]:
+        if valor is None:
+            return None
+        valor = valor.strip()
+        if sufijo and valor.endswith(sufijo):
+            valor = valor[: -len(sufijo)]
+        try:
+            return float(valor)
+        except ValueError:
+            # FFmpeg escribe "N/A" mientras no tiene el dato
+            return None
+
+    def parsear_progreso(self, bloque: Dict[str, str], duracion_total: float) -> Dict[str, Any]:
+        """Convierte un bloque clave=valor de `-progress` en una muestra estructurada."""
+        # out_time_us y out_time_ms están ambos en microsegundos
+        out_time_us = self._numero(bloque.get("out_time_us") or bloque.get("out_time_ms"))
+        out_time = out_time_us / 1_000_000 if out_time_us is not None else None
+        frame = self._numero(bloque.get("frame"))
+        muestra = {
+            "frame": int(frame) if frame is not None else None,
+            "fps": self._numero(bloque.get("fps")),
+            "speed": self._numero(bloque.get("speed"), "x"),
+            "out_time": out_time,
+            "bitrate_kbps": self._numero(bloque.get("bitrate"), "kbits/s"),
+            "total_size": self._numero(bloque.get("total_size")),
+            "progreso": (
+                min(1.0, out_time / duracion_total)
+                if out_time is not None and duracion_total
+                else None
+            ),
+            "fin": bloque.get("progress") == "end",
+        }
+        return muestra
+
+    def ejecutar_ffmpeg(
+        self,
+        cmd: List[str],
+        duracion_total: float,
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ejecuta FFmpeg leyendo su flujo `-progress` y devuelve las muestras recogidas.
+
+        Si FFmpeg falla se lanza RuntimeError con las últimas líneas de stderr.
+        """
+        cmd = [cmd[0], "-nostats", "-progress", "pipe:1", *cmd[1:]]
+        proceso = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+        )
+
+        # stderr se drena en otro hilo para que FFmpeg no se bloquee con la tubería llena
+        stderr = deque(maxlen=self.LINEAS_STDERR)
+        lector = threading.Thread(
+            target=lambda: stderr.extend(proceso.stderr), daemon=True
+        )
+        lector.start()
+
+        muestras = []
+        bloque: Dict[str, str] = {}
+        for linea in proceso.stdout:
+            clave, _, valor = linea.strip().partition("=")
+            if not clave:
+                continue
+            bloque[clave] = valor
+            # Cada bloque termina con progress=continue o progress=end
+            if clave == "progress":
+                muestra = self.parsear_progreso(bloque, duracion_total)
+                muestras.append(muestra)
+                bloque = {}
+                if al_progreso:
+                    try:
+                        al_progreso(muestra)
+                    except Exception as e:
+                        print(f"Error en el callback de progreso: {e}")
+
+        codigo = proceso.wait()
+        lector.join()
+        if codigo != 0:
+            detalle = "".join(stderr).strip()
+            raise RuntimeError(f"FFmpeg terminó con código {codigo}:\n{detalle}")
+        return muestras
+
+    def resumir_telemetria(
+        self, muestras: List[Dict[str, Any]], segundos: float
+    ) -> Dict[str, Any]:
+        fps = [m["fps"] for m in muestras if m["fps"]]
+        final = muestras[-1] if muestras else {}
+        return {
+            "segundos": segundos,
+            "frames": final.get("frame"),
+            "fps_medio": sum(fps) / len(fps) if fps else None,
+            "fps_max": max(fps) if fps else None,
+            "speed": final.get("speed"),
+            "bitrate_kbps": final.get("bitrate_kbps"),
+            "total_size": final.get("total_size"),
+        }
+
+    def guardar_muestras(self, muestras: List[Dict[str, Any]], video_path: str) -> str:
+        """
+        Escribe las muestras de -progress en un JSON junto al video.
+
+        No viajan con el resultado del trabajo: pueden ser miles y el resultado
+        pasa por una multiprocessing.Queue.
+        """
+        ruta = f"{os.path.splitext(video_path)[0]}.progreso.json"
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(muestras, f)
+        return ruta
+
+    def opciones_audio(self, audio_path: str) -> List[str]:
+        # La pista M4A del AudioGenerator ya es AAC: se copia sin recodificar
+        if os.path.splitext(audio_path)[1].lower() in (".m4a", ".aac"):
+            return ["-c:a", "copy"]
+        return ["-c:a", "aac", "-b:a", "128k"]
+
+    def normalizar_versiones(
+        self,
+        versiones: Optional[List[Dict[str, Any]]],
+        output_path: str,
+        ancho: int,
+        alto: int,
+        preset: str,
+        crf: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Completa cada versión con los valores por defecto y su ruta de salida.
+
+        Sin versiones se genera una sola salida en output_path con el tamaño de
+        las imágenes, como hasta ahora. Las versiones sin nombre se llaman v0, v1...
+
+        Raises:
+            ValueError: Si dos versiones tienen el mismo nombre (se pisarían)
+        """
+        if not versiones:
+            versiones = [{"nombre": "principal", "ruta": output_path}]
+
+        base, extension = os.path.splitext(output_path)
+        completas = []
+        nombres = set()
+        for i, version in enumerate(versiones):
+            nombre = version.get("nombre") or f"v{i}"
+            if nombre in nombres:
+                raise ValueError(f"Nombre de versión duplicado: {nombre}")
+            nombres.add(nombre)
+            completas.append(
+                {
+                    "ancho": ancho,
+                    "alto": alto,
+                    "preset": preset,
+                    "crf": crf,
+                    "bitrate_maximo_kbps": None,
+                    **version,
+                    "nombre": nombre,
+                    "ruta": version.get("ruta") or f"{base}_{nombre}{extension}",
+                    "estilo_subtitulos": {
+                        **self.ESTILO_SUBTITULOS,
+                        **version.get("estilo_subtitulos", {}),
+                    },
+                }
+            )
+        return completas
+
+    def filtro_versiones(self, versiones: List[Dict[str, Any]], subtitulos_path: str) -> str:
+        """
+        Construye el grafo de filtros: una sola decodificación de las imágenes que
+        `split` reparte entre las versiones (cada una con su escala y subtítulos).
+        """
+        etiquetas = "".join(f"[s{i}]" for i in range(len(versiones)))
+        cadenas = [f"[0:v]fps={self.FPS},split={len(versiones)}{etiquetas}"]
+        for i, version in enumerate(versiones):
+            force_style = ",".join(
+                f"{clave}={valor}" for clave, valor in version["estilo_subtitulos"].items()
+            )
+            cadenas.append(
+                f"[s{i}]scale={version['ancho']}:{version['alto']},"
+                f"subtitles={subtitulos_path}:force_style='{force_style}'[v{i}]"
+            )
+        return ";".join(cadenas)
+
+    def salida_version(
+        self, indice: int, version: Dict[str, Any], audio_path: str
+    ) -> List[str]:
+        opciones = [
+            "-map",
+            f"[v{indice}]",
+            "-map",
+            "1:a",
+            "-c:v",
+            "libx264",
+            "-preset",
+            version["preset"],
+            "-crf",
+            str(version["crf"]),
+        ]
+        if version["bitrate_maximo_kbps"]:
+            # CRF con techo de bitrate (VBV) para plataformas con límite
+            bitrate = int(version["bitrate_maximo_kbps"])
+            opciones += ["-maxrate", f"{bitrate}k", "-bufsize", f"{bitrate * 2}k"]
+        opciones += [
+            *self.opciones_audio(audio_path),
+            "-shortest",
+            "-avoid_negative_ts",
+            "make_zero",
+            "-pix_fmt",
+            "yuv420p",
+            version["ruta"],
         ]
-        return float(subprocess.check_output(comando).decode().strip())
+        return opciones
 
     def crear_video(
-        self, nicho: str, duracion_audio: float, subtitulos_path: str, output_path: str
-    ) -> str:
-        audio_path = os.path.join(self.AUDIO_DIR, f"audio_{nicho}.mp3")
-        imagenes = sorted(
-            glob.glob(os.path.join(self.IMAGE_DIR, f"imagen_*_{nicho}.jpeg"))
-        )
+        self,
+        imagenes: List[str],
+        audio_path: str,
+        duracion_audio: float,
+        subtitulos_path: str,
+        output_path: str,
+        preset: str = "medium",
+        crf: int = 23,
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        versiones: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, str]:
+        """
+        Monta el video con FFmpeg y deja en self.telemetria las métricas del encode.
 
+        Args:
+            al_progreso: Se llama con cada muestra (frame, fps, speed, out_time,
+                bitrate_kbps, progreso) mientras FFmpeg codifica
+            versiones: Salidas a generar en la misma invocación de FFmpeg. Cada una
+                admite nombre, ancho, alto, preset, crf, bitrate_maximo_kbps y
+                estilo_subtitulos. Por defecto, una sola salida en output_path
+
+        Returns:
+            Dict con la ruta de cada versión por nombre
+        """
         with Image.open(imagenes[0]) as img:
             width, height = img.size
 
+        versiones = self.normalizar_versiones(
+            versiones, output_path, width, height, preset, crf
+        )
+
         duracion_total = duracion_audio + 0.5
         duracion_por_imagen = duracion_total / len(imagenes)
 
@@ -62,17 +302,6 @@ class VideoGenerator:
 
             list_file = f.name
 
-        force_style = (
-            "Fontsize=15,"
-            "Bold=1,"
-            "PrimaryColour=&HFFFFFF,"
-            "OutlineColour=&H222222,"
-            "Outline=1,"
-            "Shadow=1,"
-            "Alignment=2,"
-            "MarginV=50"
-        )
-
         cmd = [
             "ffmpeg",
             "-y",
@@ -85,41 +314,64 @@ class VideoGenerator:
             "-i",
             audio_path,
             "-filter_complex",
-            f"[0:v]fps=30,scale={width}:{height}[vid];[vid]subtitles={subtitulos_path}:force_style='{force_style}'[v]",
-            "-map",
-            "[v]",
-            "-map",
-            "1:a",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "medium",
-            "-crf",
-            "23",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "128k",
-            "-shortest",
-            "-avoid_negative_ts",
-            "make_zero",
-            "-pix_fmt",
-            "yuv420p",
-            output_path,
+            self.filtro_versiones(versiones, subtitulos_path),
         ]
+        for i, version in enumerate(versiones):
+            cmd += self.salida_version(i, version, audio_path)
 
-        subprocess.run(cmd, check=True)
-        os.unlink(list_file)
-        return output_path
+        inicio = time.time()
+        try:
+            muestras = self.ejecutar_ffmpeg(cmd, duracion_total, al_progreso)
+        finally:
+            os.unlink(list_file)
 
-    def generate(self, nicho: str, subtitulos_path: str) -> str:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.telemetria = self.resumir_telemetria(muestras, time.time() - inicio)
+        self.telemetria["muestras_path"] = self.guardar_muestras(
+            muestras, versiones[0]["ruta"]
+        )
+        self.telemetria["versiones"] = [
+            {
+                "nombre": version["nombre"],
+                "ruta": version["ruta"],
+                "ancho": version["ancho"],
+                "alto": version["alto"],
+                "preset": version["preset"],
+                "crf": version["crf"],
+                "bitrate_maximo_kbps": version["bitrate_maximo_kbps"],
+                "bytes": os.path.getsize(version["ruta"]),
+            }
+            for version in versiones
+        ]
+        return {version["nombre"]: version["ruta"] for version in versiones}
 
-        duracion_audio = self.obtener_duracion_audio(nicho)
-        output_path = os.path.join(self.VIDEO_DIR, f"video_{nicho}_{timestamp}.mp4")
+    def generate(
+        self,
+        ctx: JobContext,
+        al_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> str:
+        """
+        Monta el video con las imágenes, el audio y los subtítulos del contexto.
 
-        self.crear_video(nicho, duracion_audio, subtitulos_path, output_path)
-        torch.cuda.empty_cache()
-        torch.cuda.ipc_collect()
+        Si el perfil lo permite se generan todas las versiones configuradas y
+        ctx.video_path apunta a la primera.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_path = os.path.join(self.VIDEO_DIR, f"video_{ctx.nicho}_{timestamp}_{ctx.trabajo_id}.mp4")
+        versiones = self.versiones if ctx.perfil.get("versiones", True) else None
+
+        rutas = self.crear_video(
+            ctx.imagenes,
+            ctx.audio_path,
+            ctx.duracion_audio,
+            ctx.subtitulos_path,
+            output_path,
+            preset=ctx.perfil.get("preset", "medium"),
+            crf=ctx.perfil.get("crf", 23),
+            al_progreso=al_progreso,
+            versiones=versiones,
+        )
 
-        return output_path
+        ctx.versiones = rutas
+        ctx.video_path = next(iter(rutas.values()))
+        ctx.metricas["video"] = self.telemetria
+        return ctx.video_path
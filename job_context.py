@@ -0,0 +1,68 @@
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable
+
+
+@dataclass
+class JobContext:
+    """
+    Estado de un trabajo que se pasa de etapa en etapa del pipeline.
+
+    Cada etapa lee lo que necesita de memoria y completa sus campos. Los CSV de
+    texto y prompts ya no son el canal entre etapas: si `persistir_csv` está
+    activo se escriben en segundo plano solo como registro.
+    """
+
+    nicho: str
+    # Distingue los archivos intermedios de trabajos simultáneos del mismo nicho
+    trabajo_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    era: str = ""
+    location: str = ""
+    tone: str = "engaging"
+    seed: Optional[int] = None
+    perfil: Dict[str, Any] = field(default_factory=dict)
+    texto: Optional[str] = None
+    prompts: List[str] = field(default_factory=list)
+    duracion_audio: Optional[float] = None
+    # Duración prevista antes de sintetizar el audio (ver DurationEstimator)
+    duracion_estimada: Optional[float] = None
+    audio_path: Optional[str] = None
+    imagenes: List[str] = field(default_factory=list)
+    subtitulos_path: Optional[str] = None
+    video_path: Optional[str] = None
+    versiones: Dict[str, str] = field(default_factory=dict)
+    metricas: Dict[str, Any] = field(default_factory=dict)
+    persistir_csv: bool = True
+    _escritor: Optional[ThreadPoolExecutor] = field(default=None, repr=False)
+    _pendientes: List[Future] = field(default_factory=list, repr=False)
+
+    @property
+    def nicho_texto(self) -> str:
+        return self.nicho.replace("_", " ")
+
+    @property
+    def prefijo_archivos(self) -> str:
+        """Sufijo de los archivos intermedios del trabajo en `resources/` (compartido entre nodos)."""
+        return f"{self.nicho}_{self.trabajo_id}"
+
+    def persistir(self, funcion: Callable[..., Any], *args: Any) -> None:
+        """Encola una escritura a disco (write-behind) si la persistencia está activa."""
+        if not self.persistir_csv:
+            return
+        if self._escritor is None:
+            self._escritor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="persistencia"
+            )
+        self._pendientes.append(self._escritor.submit(funcion, *args))
+
+    def esperar_persistencia(self) -> None:
+        """Espera a que terminen las escrituras pendientes y propaga sus errores."""
+        try:
+            for pendiente in self._pendientes:
+                pendiente.result()
+        finally:
+            self._pendientes = []
+            if self._escritor is not None:
+                self._escritor.shutdown()
+                self._escritor = None
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+# Estados de un trabajo
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+ESTADOS_FINALES = (COMPLETADO, FALLIDO, CANCELADO)
+
+
+class JobQueue:
+    """
+    Cola de trabajos duradera en SQLite compartida por el bot y los nodos de render.
+
+    El bot encola; cada nodo reclama el trabajo pendiente más antiguo con un
+    lease que renueva con latidos. Si un nodo muere, su lease caduca y el
+    trabajo vuelve a la cola (hasta max_intentos). Para varios nodos, la base de
+    datos debe estar en un sistema de archivos compartido con bloqueos de
+    archivo funcionales; por eso se usa el journal clásico y no WAL.
+    """
+
+    DEFAULT_PATH = "resources/cola/trabajos.db"
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT,
+            tipo TEXT NOT NULL,
+            parametros TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            trabajador TEXT,
+            lease_hasta REAL,
+            resultado TEXT,
+            notificado INTEGER NOT NULL DEFAULT 0,
+            creado REAL NOT NULL,
+            actualizado REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, id);
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        duracion_lease: float = 300.0,
+        max_intentos: int = 3,
+    ):
+        """
+        Args:
+            path: Archivo SQLite de la cola
+            duracion_lease: Segundos que un trabajo sigue asignado sin recibir latidos
+            max_intentos: Reclamaciones máximas de un trabajo antes de darlo por fallido
+        """
+        self.path = path
+        self.duracion_lease = duracion_lease
+        self.max_intentos = max_intentos
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.executescript(self.ESQUEMA)
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> Optional["JobQueue"]:
+        """Crea la cola a partir de la sección `cola` o None si está desactivada."""
+        ajustes = config.get("cola", {})
+        if not ajustes.get("activo", False):
+            return None
+        return cls(
+            path=ajustes.get("path", cls.DEFAULT_PATH),
+            duracion_lease=ajustes.get("duracion_lease", 300.0),
+            max_intentos=ajustes.get("max_intentos", 3),
+        )
+
+    @contextmanager
+    def _conexion(self):
+        conexion = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    @contextmanager
+    def _transaccion(self):
+        """Transacción con bloqueo de escritura desde el principio (BEGIN IMMEDIATE)."""
+        with self._conexion() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                yield conexion
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+            conexion.execute("COMMIT")
+
+    @staticmethod
+    def _a_dict(fila: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        trabajo["parametros"] = json.loads(trabajo["parametros"])
+        trabajo["resultado"] = (
+            json.loads(trabajo["resultado"]) if trabajo["resultado"] else None
+        )
+        return trabajo
+
+    def encolar(self, tipo: str, parametros: Dict[str, Any], chat_id=None) -> int:
+        """
+        Añade un trabajo a la cola.
+
+        Args:
+            tipo: "random", "draft" o "approve"
+            parametros: Argumentos del trabajo (perfil, borrador_id...)
+            chat_id: Chat de Telegram al que se notifica el resultado
+
+        Returns:
+            int: Identificador del trabajo
+        """
+        ahora = time.time()
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "INSERT INTO trabajos (chat_id, tipo, parametros, estado, creado, actualizado)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    None if chat_id is None else str(chat_id),
+                    tipo,
+                    json.dumps(parametros),
+                    PENDIENTE,
+                    ahora,
+                    ahora,
+                ),
+            )
+            return cursor.lastrowid
+
+    def _recuperar_caducados(self, conexion: sqlite3.Connection, ahora: float) -> None:
+        """Devuelve a la cola los trabajos cuyo trabajador dejó de enviar latidos."""
+        conexion.execute(
+            "UPDATE trabajos SET estado = ?, trabajador = NULL, lease_hasta = NULL,"
+            " actualizado = ? WHERE estado = ? AND lease_hasta < ? AND intentos < ?",
+            (PENDIENTE, ahora, EN_CURSO, ahora, self.max_intentos),
+        )
+        conexion.execute(
+            "UPDATE trabajos SET estado = ?, resultado = ?, actualizado = ?"
+            " WHERE estado = ? AND lease_hasta < ?",
+            (
+                FALLIDO,
+                json.dumps(
+                    {
+                        "error": "El trabajador dejó de responder demasiadas veces",
+                        "video_path": None,
+                    }
+                ),
+                ahora,
+                EN_CURSO,
+                ahora,
+            ),
+        )
+
+    def reclamar(self, trabajador: str) -> Optional[Dict[str, Any]]:
+        """
+        Asigna al trabajador el trabajo pendiente más antiguo.
+
+        Returns:
+            Dict con el trabajo (id, tipo, parametros, intentos...) o None si no hay
+        """
+        ahora = time.time()
+        with self._transaccion() as conexion:
+            self._recuperar_caducados(conexion, ahora)
+            fila = conexion.execute(
+                "SELECT id FROM trabajos WHERE estado = ? ORDER BY id LIMIT 1",
+                (PENDIENTE,),
+            ).fetchone()
+            if fila is None:
+                return None
+            conexion.execute(
+                "UPDATE trabajos SET estado = ?, trabajador = ?, lease_hasta = ?,"
+                " intentos = intentos + 1, actualizado = ? WHERE id = ?",
+                (EN_CURSO, trabajador, ahora + self.duracion_lease, ahora, fila["id"]),
+            )
+            return self._a_dict(
+                conexion.execute("SELECT * FROM trabajos WHERE id = ?", (fila["id"],)).fetchone()
+            )
+
+    def latido(self, trabajo_id: int, trabajador: str) -> bool:
+        """
+        Renueva el lease de un trabajo en curso.
+
+        Returns:
+            bool: False si el trabajo ya no pertenece al trabajador (lease
+                perdido o trabajo cancelado) y debe abandonarse
+        """
+        ahora = time.time()
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET lease_hasta = ?, actualizado = ?"
+                " WHERE id = ? AND trabajador = ? AND estado = ?",
+                (ahora + self.duracion_lease, ahora, trabajo_id, trabajador, EN_CURSO),
+            )
+            return cursor.rowcount > 0
+
+    def actualizar_parametros(
+        self, trabajo_id: int, trabajador: str, parametros: Dict[str, Any]
+    ) -> bool:
+        """
+        Guarda los parámetros resueltos en el primer intento (p. ej. la semilla)
+        para que los reintentos repitan el mismo trabajo.
+
+        Returns:
+            bool: False si el trabajo ya no pertenecía al trabajador
+        """
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET parametros = ?, actualizado = ?"
+                " WHERE id = ? AND trabajador = ? AND estado = ?",
+                (json.dumps(parametros), time.time(), trabajo_id, trabajador, EN_CURSO),
+            )
+            return cursor.rowcount > 0
+
+    def completar(self, trabajo_id: int, trabajador: str, resultado: Dict[str, Any]) -> bool:
+        """
+        Registra el resultado de un trabajo; se marca fallido si contiene "error".
+
+        Returns:
+            bool: False si el trabajo ya no pertenecía al trabajador
+        """
+        estado = FALLIDO if resultado.get("error") else COMPLETADO
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET estado = ?, resultado = ?, lease_hasta = NULL,"
+                " actualizado = ? WHERE id = ? AND trabajador = ? AND estado = ?",
+                (
+                    estado,
+                    json.dumps(resultado, ensure_ascii=False, default=str),
+                    time.time(),
+                    trabajo_id,
+                    trabajador,
+                    EN_CURSO,
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def cancelar(self, trabajo_id: int) -> bool:
+        """Cancela un trabajo pendiente o en curso; su trabajador lo abandona en el siguiente latido."""
+        with self._transaccion() as conexion:
+            cursor = conexion.execute(
+                "UPDATE trabajos SET estado = ?, notificado = 1, actualizado = ?"
+                " WHERE id = ? AND estado IN (?, ?)",
+                (CANCELADO, time.time(), trabajo_id, PENDIENTE, EN_CURSO),
+            )
+            return cursor.rowcount > 0
+
+    def obtener(self, trabajo_id: int) -> Optional[Dict[str, Any]]:
+        with self._conexion() as conexion:
+            return self._a_dict(
+                conexion.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+            )
+
+    def activos(self, chat_id=None) -> List[Dict[str, Any]]:
+        """Trabajos pendientes o en curso (de un chat, si se indica)."""
+        consulta = "SELECT * FROM trabajos WHERE estado IN (?, ?)"
+        argumentos: list = [PENDIENTE, EN_CURSO]
+        if chat_id is not None:
+            consulta += " AND chat_id = ?"
+            argumentos.append(str(chat_id))
+        with self._conexion() as conexion:
+            filas = conexion.execute(consulta + " ORDER BY id", argumentos).fetchall()
+        return [self._a_dict(fila) for fila in filas]
+
+    def sin_notificar(self) -> List[Dict[str, Any]]:
+        """Trabajos cuyo resultado aún no se ha enviado al chat (incluye los no terminados)."""
+        with self._conexion() as conexion:
+            filas = conexion.execute(
+                "SELECT * FROM trabajos WHERE notificado = 0 AND chat_id IS NOT NULL ORDER BY id"
+            ).fetchall()
+        return [self._a_dict(fila) for fila in filas]
+
+    def marcar_notificado(self, trabajo_id: int) -> None:
+        with self._transaccion() as conexion:
+            conexion.execute(
+                "UPDATE trabajos SET notificado = 1 WHERE id = ?", (trabajo_id,)
+            )
@@ -0,0 +1,213 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+from ollama_client import OllamaClient
+
+
+class LLMCache:
+    """
+    Caché persistente de respuestas de Ollama en SQLite.
+
+    La clave es el modelo, el prompt completo y las opciones de generación
+    (system, format, options). Solo se cachean llamadas deterministas: con
+    temperatura 0 o con una seed fija. Las llamadas que muestrean libremente
+    (sin seed) van siempre al modelo para no repetir historias.
+
+    Las llamadas al modelo pasan por un OllamaClient (conexiones reutilizables,
+    reintentos y concurrencia limitada); `agenerate` es la variante asíncrona.
+    """
+
+    DEFAULT_PATH = "resources/cache/llm.db"
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        ttl_horas: float = 168.0,
+        max_mb: float = 100.0,
+        activo: bool = True,
+        cliente: Optional[OllamaClient] = None,
+    ):
+        """
+        Args:
+            path: Archivo SQLite de la caché
+            ttl_horas: Antigüedad máxima de una respuesta
+            max_mb: Tamaño máximo de las respuestas guardadas (se descartan las
+                menos usadas recientemente)
+            activo: Si es False todas las llamadas van directamente a Ollama
+            cliente: Cliente de Ollama (por defecto uno nuevo con OLLAMA_HOST)
+        """
+        self.path = path
+        self.ttl = ttl_horas * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.activo = activo
+        self.cliente = cliente or OllamaClient()
+        # Se llama con el modelo antes de cada llamada real (no con los aciertos de caché)
+        self.al_llamar_modelo: Optional[Callable[[str], Any]] = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.omitidas = 0
+        self._lock = threading.Lock()
+        if activo:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._conexion() as conexion:
+                conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS respuestas ("
+                    " clave TEXT PRIMARY KEY, modelo TEXT, respuesta TEXT NOT NULL,"
+                    " bytes INTEGER NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL)"
+                )
+
+    @classmethod
+    def desde_config(
+        cls, config: Dict[str, Any], cliente: Optional[OllamaClient] = None
+    ) -> "LLMCache":
+        """Crea la caché a partir de `llm.cache` (desactivada si falta la sección)."""
+        ajustes = config.get("llm", {}).get("cache", {})
+        return cls(
+            path=ajustes.get("path", cls.DEFAULT_PATH),
+            ttl_horas=ajustes.get("ttl_horas", 168.0),
+            max_mb=ajustes.get("max_mb", 100.0),
+            activo=ajustes.get("activo", False),
+            cliente=cliente or OllamaClient.desde_config(config),
+        )
+
+    @contextmanager
+    def _conexion(self):
+        conexion = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    @staticmethod
+    def clave(argumentos: Dict[str, Any]) -> str:
+        serializado = json.dumps(argumentos, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def es_determinista(argumentos: Dict[str, Any]) -> bool:
+        opciones = argumentos.get("options") or {}
+        return opciones.get("temperature") == 0 or opciones.get("seed") is not None
+
+    def _leer(self, clave: str) -> Optional[Dict[str, Any]]:
+        ahora = time.time()
+        with self._lock, self._conexion() as conexion:
+            fila = conexion.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            if ahora - fila[1] > self.ttl:
+                conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                return None
+            conexion.execute("UPDATE respuestas SET usado = ? WHERE clave = ?", (ahora, clave))
+            return json.loads(fila[0])
+
+    def _escribir(self, clave: str, modelo: str, respuesta: Dict[str, Any]) -> None:
+        ahora = time.time()
+        datos = json.dumps(respuesta, ensure_ascii=False)
+        with self._lock, self._conexion() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            conexion.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, modelo, datos, len(datos.encode("utf-8")), ahora, ahora),
+            )
+            conexion.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+            # Se descartan las menos usadas hasta volver por debajo del límite
+            total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()[0]
+            if total > self.max_bytes:
+                for clave_vieja, tamano in conexion.execute(
+                    "SELECT clave, bytes FROM respuestas ORDER BY usado"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave_vieja,))
+                    total -= tamano
+            conexion.execute("COMMIT")
+
+    def _cacheable(self, usar_cache: bool, argumentos: Dict[str, Any]) -> bool:
+        if self.activo and usar_cache and self.es_determinista(argumentos):
+            return True
+        with self._lock:
+            self.omitidas += 1
+        return False
+
+    def _buscar(self, clave: str) -> Optional[Dict[str, Any]]:
+        try:
+            respuesta = self._leer(clave)
+        except sqlite3.Error as e:
+            print(f"Error al leer la caché del LLM: {e}")
+            respuesta = None
+        with self._lock:
+            if respuesta is not None:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+        return respuesta
+
+    def _guardar(self, clave: str, modelo: str, resultado: Dict[str, Any]) -> Dict[str, Any]:
+        respuesta = {"response": resultado.get("response", "")}
+        try:
+            self._escribir(clave, modelo, respuesta)
+        except sqlite3.Error as e:
+            print(f"Error al escribir en la caché del LLM: {e}")
+        return respuesta
+
+    def _llamar(self, argumentos: Dict[str, Any]) -> Dict[str, Any]:
+        if self.al_llamar_modelo:
+            self.al_llamar_modelo(argumentos.get("model", ""))
+        return self.cliente.generate_sync(**argumentos)
+
+    async def _allamar(self, argumentos: Dict[str, Any]) -> Dict[str, Any]:
+        if self.al_llamar_modelo:
+            await asyncio.to_thread(self.al_llamar_modelo, argumentos.get("model", ""))
+        return await self.cliente.generate(**argumentos)
+
+    def generate(self, usar_cache: bool = True, **argumentos) -> Dict[str, Any]:
+        """
+        Equivalente a ollama.generate (sin streaming) que consulta antes la caché.
+
+        Args:
+            usar_cache: False para forzar la llamada al modelo
+            **argumentos: Argumentos de ollama.generate (model, prompt, system,
+                format, options...)
+        """
+        if not self._cacheable(usar_cache, argumentos):
+            return self._llamar(argumentos)
+
+        clave = self.clave(argumentos)
+        respuesta = self._buscar(clave)
+        if respuesta is not None:
+            return respuesta
+        resultado = self._llamar(argumentos)
+        return self._guardar(clave, argumentos.get("model", ""), resultado)
+
+    async def agenerate(self, usar_cache: bool = True, **argumentos) -> Dict[str, Any]:
+        """Versión asíncrona de generate(): el acceso a SQLite se hace en un hilo aparte."""
+        if not self._cacheable(usar_cache, argumentos):
+            return await self._allamar(argumentos)
+
+        clave = self.clave(argumentos)
+        respuesta = await asyncio.to_thread(self._buscar, clave)
+        if respuesta is not None:
+            return respuesta
+        resultado = await self._allamar(argumentos)
+        return await asyncio.to_thread(
+            self._guardar, clave, argumentos.get("model", ""), resultado
+        )
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "omitidas": self.omitidas,
+                "tasa_aciertos": self.aciertos / consultas if consultas else None,
+            }
@@ -0,0 +1,441 @@
+"""
+Prueba de carga del bot de Telegram contra una Bot API falsa.
+
+Levanta un servidor HTTP local que imita la Bot API (getUpdates, sendMessage,
+sendVideo...), arranca el bot de main.py apuntando a él con una automatización
+simulada (etapas con duraciones configurables) y simula muchos chats enviando
+/run, /last_video y /cancel a la vez.
+
+Informa de:
+- latencia de cada comando (desde que el update está disponible hasta la
+  primera respuesta del bot), en percentiles
+- bloqueos del event loop del bot
+- procesos de automatización vivos y memoria (RSS) del bot y de sus hijos
+
+Uso:
+    python load_test.py --chats 50 --duracion 60 --etapas texto=1,audio=0.5,imagenes=4,video=2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import functools
+import multiprocessing
+from collections import deque, defaultdict
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from typing import Dict, Any, List, Optional
+
+TOKEN = "123456:PRUEBA-DE-CARGA"
+COMANDOS = {"/run": 0.4, "/last_video": 0.4, "/cancel": 0.2}
+# Mensajes que el bot envía al terminar un trabajo (no responden a un comando)
+PREFIJOS_NOTIFICACION = (
+    "✅ Automatización",
+    "❌ Error en la automatización",
+    "❌ Proceso terminado",
+)
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicion = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[posicion]
+
+
+def resumen(valores: List[float], escala: float = 1000.0) -> Dict[str, Any]:
+    """Percentiles en milisegundos (por defecto) de una lista de segundos."""
+    return {
+        "n": len(valores),
+        "p50": percentil(valores, 50) and round(percentil(valores, 50) * escala, 1),
+        "p90": percentil(valores, 90) and round(percentil(valores, 90) * escala, 1),
+        "p99": percentil(valores, 99) and round(percentil(valores, 99) * escala, 1),
+        "max": round(max(valores) * escala, 1) if valores else None,
+    }
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """Servidor local que imita los métodos de la Bot API que usa el bot."""
+
+    daemon_threads = True
+
+    def __init__(self, puerto: int = 0):
+        super().__init__(("127.0.0.1", puerto), _ManejadorBotAPI)
+        self.condicion = threading.Condition()
+        self.updates: List[Dict[str, Any]] = []
+        self.siguiente_update = 1
+        self.siguiente_mensaje = 1
+        # Comandos enviados por cada chat que aún no han recibido respuesta
+        self.pendientes: Dict[int, deque] = defaultdict(deque)
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.notificaciones = 0
+        self.videos_enviados = 0
+        self.sin_emparejar = 0
+        self.errores_http = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def enviar_comando(self, chat_id: int, texto: str):
+        """Publica un update con el comando como si lo hubiera escrito el chat."""
+        comando = texto.split()[0]
+        with self.condicion:
+            update_id = self.siguiente_update
+            self.siguiente_update += 1
+            self.updates.append(
+                {
+                    "update_id": update_id,
+                    "message": {
+                        "message_id": update_id,
+                        "date": int(time.time()),
+                        "chat": {"id": chat_id, "type": "private"},
+                        "from": {"id": chat_id, "is_bot": False, "first_name": f"chat{chat_id}"},
+                        "text": texto,
+                        "entities": [
+                            {"type": "bot_command", "offset": 0, "length": len(comando)}
+                        ],
+                    },
+                }
+            )
+            self.pendientes[chat_id].append((comando, time.perf_counter()))
+            self.condicion.notify_all()
+
+    def obtener_updates(self, offset: int, timeout: float) -> List[Dict[str, Any]]:
+        limite = time.monotonic() + min(timeout, 1.0)
+        with self.condicion:
+            # Los updates con id menor que offset quedan confirmados
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self.condicion.wait(restante)
+            return list(self.updates)
+
+    def registrar_respuesta(self, chat_id: int, texto: str, video: bool = False):
+        ahora = time.perf_counter()
+        with self.condicion:
+            if video:
+                self.videos_enviados += 1
+                return
+            if texto.startswith(PREFIJOS_NOTIFICACION):
+                self.notificaciones += 1
+                return
+            if not self.pendientes[chat_id]:
+                self.sin_emparejar += 1
+                return
+            comando, inicio = self.pendientes[chat_id].popleft()
+            self.latencias[comando].append(ahora - inicio)
+
+    def mensaje(self, chat_id: int, texto: str = "") -> Dict[str, Any]:
+        with self.condicion:
+            message_id = self.siguiente_mensaje
+            self.siguiente_mensaje += 1
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "carga"},
+            "text": texto,
+        }
+
+
+class _ManejadorBotAPI(BaseHTTPRequestHandler):
+    server: FakeBotAPI
+
+    def log_message(self, *args):
+        pass
+
+    def _parametros(self) -> Dict[str, str]:
+        cuerpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        tipo = self.headers.get("Content-Type", "")
+        if tipo.startswith("application/json"):
+            return {k: v for k, v in json.loads(cuerpo or b"{}").items()}
+        if tipo.startswith("multipart/form-data"):
+            mensaje = BytesParser(policy=politica_email).parsebytes(
+                f"Content-Type: {tipo}\r\n\r\n".encode() + cuerpo
+            )
+            parametros = {}
+            for parte in mensaje.iter_parts():
+                nombre = parte.get_param("name", header="content-disposition")
+                if not parte.get_filename():
+                    parametros[nombre] = parte.get_content()
+            return parametros
+        return {k: v[0] for k, v in parse_qs(cuerpo.decode()).items()}
+
+    def _responder(self, resultado: Any, codigo: int = 200):
+        cuerpo = json.dumps({"ok": codigo == 200, "result": resultado}).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        metodo = self.path.rsplit("/", 1)[-1]
+        try:
+            parametros = self._parametros()
+        except Exception:
+            self.server.errores_http += 1
+            self._responder(None, 400)
+            return
+
+        if metodo == "getMe":
+            self._responder(
+                {"id": 1, "is_bot": True, "first_name": "carga", "username": "carga_bot"}
+            )
+        elif metodo == "getUpdates":
+            self._responder(
+                self.server.obtener_updates(
+                    int(parametros.get("offset") or 0), float(parametros.get("timeout") or 0)
+                )
+            )
+        elif metodo == "sendMessage":
+            chat_id = int(parametros["chat_id"])
+            texto = parametros.get("text", "")
+            self.server.registrar_respuesta(chat_id, texto)
+            self._responder(self.server.mensaje(chat_id, texto))
+        elif metodo == "sendVideo":
+            chat_id = int(parametros["chat_id"])
+            self.server.registrar_respuesta(chat_id, "", video=True)
+            self._responder(self.server.mensaje(chat_id))
+        else:
+            # deleteWebhook, setMyCommands...
+            self._responder(True)
+
+    do_GET = do_POST
+
+
+def automatizacion_simulada(
+    process_id,
+    result_queue,
+    perfil="produccion",
+    borrador_id=None,
+    etapas: Optional[Dict[str, float]] = None,
+    prob_fallo: float = 0.0,
+    memoria_mb: int = 0,
+):
+    """Sustituye a run_automation_in_process: duerme lo que dura cada etapa."""
+    # Reserva memoria para simular los modelos cargados en el proceso del trabajo
+    reserva = bytearray(memoria_mb * 1024 * 1024)
+    for nombre, segundos in (etapas or {}).items():
+        time.sleep(segundos)
+        if random.random() < prob_fallo:
+            result_queue.put({"error": f"Fallo simulado en la etapa {nombre}"})
+            return
+    del reserva
+    result_queue.put(
+        {
+            "video_path": f"resources/video/simulado_{process_id}.mp4",
+            "nicho": "Simulado",
+            "perfil": perfil,
+            "borrador_id": borrador_id or "simulado",
+        }
+    )
+
+
+def rss_mb(pid: int) -> float:
+    """Memoria residente de un proceso en MB (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class Muestreo(threading.Thread):
+    """Registra periódicamente procesos vivos y memoria del bot y sus hijos."""
+
+    def __init__(self, modulo_bot, intervalo: float = 0.5):
+        super().__init__(name="muestreo-carga", daemon=True)
+        self.modulo_bot = modulo_bot
+        self.intervalo = intervalo
+        self.muestras: List[Dict[str, float]] = []
+        self._detener = threading.Event()
+
+    def run(self):
+        inicio = time.monotonic()
+        while not self._detener.wait(self.intervalo):
+            hijos = multiprocessing.active_children()
+            self.muestras.append(
+                {
+                    "t": time.monotonic() - inicio,
+                    "procesos_activos": len(self.modulo_bot.active_processes),
+                    "procesos_hijos": len(hijos),
+                    "rss_bot_mb": rss_mb(os.getpid()),
+                    "rss_hijos_mb": sum(rss_mb(h.pid) for h in hijos),
+                }
+            )
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+    def informe(self) -> Dict[str, Any]:
+        if not self.muestras:
+            return {}
+        informe = {}
+        for clave in ("procesos_activos", "procesos_hijos", "rss_bot_mb", "rss_hijos_mb"):
+            valores = [m[clave] for m in self.muestras]
+            informe[clave] = {
+                "inicio": round(valores[0], 1),
+                "max": round(max(valores), 1),
+                "fin": round(valores[-1], 1),
+            }
+        return informe
+
+
+async def vigilar_bucle(registro: Dict[str, Any], intervalo: float = 0.05):
+    """Mide cuánto se retrasa un sleep corto: cualquier exceso es tiempo con el loop bloqueado."""
+    bucle = asyncio.get_running_loop()
+    while True:
+        inicio = bucle.time()
+        await asyncio.sleep(intervalo)
+        registro["retrasos"].append(max(0.0, bucle.time() - inicio - intervalo))
+        registro["tareas_max"] = max(registro["tareas_max"], len(asyncio.all_tasks()))
+
+
+def simular_chats(servidor: FakeBotAPI, chats: int, duracion: float, pausa: float, semilla: int):
+    """Cada chat envía comandos al azar con pausas exponenciales durante `duracion` segundos."""
+    fin = time.monotonic() + duracion
+    comandos, pesos = list(COMANDOS), list(COMANDOS.values())
+
+    def chat(indice: int):
+        aleatorio = random.Random(semilla + indice)
+        chat_id = 1000 + indice
+        while time.monotonic() < fin:
+            servidor.enviar_comando(chat_id, aleatorio.choices(comandos, pesos)[0])
+            time.sleep(aleatorio.expovariate(1 / pausa))
+
+    hilos = [threading.Thread(target=chat, args=(i,), daemon=True) for i in range(chats)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+
+def preparar_directorio(videos: int, tamano_video_mb: float) -> str:
+    """Crea un directorio de trabajo aislado con videos falsos para /last_video."""
+    directorio = tempfile.mkdtemp(prefix="carga_bot_")
+    carpeta = os.path.join(directorio, "resources", "video")
+    os.makedirs(carpeta)
+    for i in range(videos):
+        with open(os.path.join(carpeta, f"video_{i:03d}.mp4"), "wb") as f:
+            f.write(os.urandom(int(tamano_video_mb * 1024 * 1024)))
+    return directorio
+
+
+async def ejecutar(args) -> Dict[str, Any]:
+    import main as bot
+
+    servidor = FakeBotAPI()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    etapas = {
+        nombre: float(segundos)
+        for nombre, segundos in (e.split("=") for e in args.etapas.split(",") if e)
+    }
+    ejecutor = functools.partial(
+        automatizacion_simulada,
+        etapas=etapas,
+        prob_fallo=args.prob_fallo,
+        memoria_mb=args.memoria_mb,
+    )
+    aplicacion = bot.build_application(
+        TOKEN, base_url=servidor.url, config_path=None, ejecutor=ejecutor
+    )
+
+    bucle = {"retrasos": [], "tareas_max": 0}
+    muestreo = Muestreo(bot)
+    inicio = time.perf_counter()
+    async with aplicacion:
+        await aplicacion.start()
+        await aplicacion.updater.start_polling(poll_interval=0.0, timeout=1)
+        vigilante = asyncio.create_task(vigilar_bucle(bucle))
+        muestreo.start()
+
+        await asyncio.to_thread(
+            simular_chats, servidor, args.chats, args.duracion, args.pausa, args.semilla
+        )
+
+        # Se espera a que terminen los trabajos en curso (o al tiempo máximo)
+        limite = time.monotonic() + args.espera_final
+        while bot.active_processes and time.monotonic() < limite:
+            await asyncio.sleep(0.5)
+
+        vigilante.cancel()
+        await aplicacion.updater.stop()
+        await aplicacion.stop()
+    muestreo.detener()
+    servidor.shutdown()
+
+    for info in list(bot.active_processes.values()):
+        if info["process"].is_alive():
+            info["process"].terminate()
+
+    retrasos = bucle["retrasos"]
+    return {
+        "parametros": vars(args),
+        "segundos": round(time.perf_counter() - inicio, 1),
+        "latencia_ms": {cmd: resumen(v) for cmd, v in sorted(servidor.latencias.items())},
+        "sin_respuesta": sum(len(p) for p in servidor.pendientes.values()),
+        "notificaciones": servidor.notificaciones,
+        "videos_enviados": servidor.videos_enviados,
+        "respuestas_sin_emparejar": servidor.sin_emparejar,
+        "errores_http": servidor.errores_http,
+        "bucle_eventos": {
+            "retraso_ms": resumen(retrasos),
+            "bloqueos_mayores_100ms": sum(1 for r in retrasos if r > 0.1),
+            "tareas_max": bucle["tareas_max"],
+        },
+        "procesos_y_memoria": muestreo.informe(),
+        "trabajos_sin_terminar": len(bot.active_processes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del bot de Telegram")
+    parser.add_argument("--chats", type=int, default=50, help="Chats simultáneos")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos enviando comandos")
+    parser.add_argument("--pausa", type=float, default=2.0, help="Pausa media entre comandos de un chat")
+    parser.add_argument(
+        "--etapas",
+        default="texto=1,audio=0.5,prompts=1,imagenes=4,video=2",
+        help="Duración simulada de cada etapa (nombre=segundos,...)",
+    )
+    parser.add_argument("--prob-fallo", type=float, default=0.0, help="Probabilidad de fallo por etapa")
+    parser.add_argument("--memoria-mb", type=int, default=0, help="Memoria que reserva cada trabajo simulado")
+    parser.add_argument("--videos", type=int, default=20, help="Videos falsos para /last_video")
+    parser.add_argument("--tamano-video-mb", type=float, default=5.0)
+    parser.add_argument("--espera-final", type=float, default=30.0, help="Espera máxima a los trabajos en curso")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Guarda el informe en este archivo JSON")
+    args = parser.parse_args()
+
+    # El bot trabaja con rutas relativas: se aísla en un directorio temporal
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(preparar_directorio(args.videos, args.tamano_video_mb))
+
+    informe = asyncio.run(ejecutar(args))
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import json
+import queue
 import asyncio
 import multiprocessing
 import time
@@ -11,10 +13,16 @@ from telegram.ext import (
     ContextTypes,
 )
 import sys
-from utils import borrar_recursos_generados, stop_ollama
+from utils import borrar_recursos_generados, descargar_modelo_ollama
+from story_pool import StoryPool, StoryPrefetcher, enumerar_combinaciones
+from job_queue import JobQueue, CANCELADO, ESTADOS_FINALES, EN_CURSO
 
 # Diccionario para almacenar procesos activos
 active_processes = {}
+# Cola de trabajos compartida con los nodos de render (None: se ejecuta en local)
+job_queue = None
+# Función que ejecuta cada automatización en su proceso (ver build_application)
+ejecutor_automatizacion = None
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -22,7 +30,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     # Create keyboard buttons
     keyboard = [
-        [KeyboardButton("/run"), KeyboardButton("/last_video")],
+        [KeyboardButton("/run"), KeyboardButton("/draft"), KeyboardButton("/last_video")],
         [KeyboardButton("/clean"), KeyboardButton("/cancel")],
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -35,8 +43,36 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def run_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Ejecuta la automatización directamente con configuración aleatoria"""
+    await launch_automation(update, context, "random")
+
+
+async def draft_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ejecuta la automatización en modo borrador (render rápido de baja calidad)"""
+    await launch_automation(update, context, "draft", perfil="borrador")
+
+
+async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Vuelve a renderizar un borrador con calidad de producción"""
+    if not context.args:
+        await update.message.reply_text("Uso: /approve <id_del_borrador>")
+        return
+    await launch_automation(update, context, "approve", borrador_id=context.args[0])
+
+
+async def launch_automation(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    tipo: str,
+    perfil: str = "produccion",
+    borrador_id=None,
+) -> None:
+    """Lanza la automatización en un proceso separado si el usuario no tiene otro activo"""
     chat_id = update.effective_chat.id
 
+    if job_queue:
+        await encolar_automatizacion(update, context, tipo, perfil, borrador_id)
+        return
+
     # Verificar si ya hay un proceso activo para este usuario
     user_processes = [
         pid for pid in active_processes.keys() if pid.startswith(f"{chat_id}_")
@@ -50,13 +86,16 @@ async def run_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     await update.message.reply_text("Iniciando proceso de automatización...")
 
     # Inicia la tarea en un proceso separado
-    process_id = f"{chat_id}_random"
+    process_id = f"{chat_id}_{tipo}"
     result_queue = multiprocessing.Queue()
 
-    process = Process(target=run_automation_in_process, args=(process_id, result_queue))
-    process.daemon = (
-        True  # Importante: esto asegura que el proceso hijo termine si el padre termina
+    process = Process(
+        target=ejecutor_automatizacion,
+        args=(process_id, result_queue, perfil, borrador_id),
     )
+    # No es daemon: la etapa de imágenes puede lanzar sus propios procesos trabajadores.
+    # Los procesos activos se terminan al cerrar el bot (ver main)
+    process.daemon = False
     process.start()
 
     # Registramos el trabajo en proceso
@@ -70,23 +109,72 @@ async def run_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     context.application.create_task(monitor_process(chat_id, process_id))
 
 
-def run_automation_in_process(process_id, result_queue):
+async def encolar_automatizacion(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    tipo: str,
+    perfil: str = "produccion",
+    borrador_id=None,
+) -> None:
+    """Encola el trabajo para que lo ejecute cualquier nodo de render"""
+    chat_id = update.effective_chat.id
+
+    # La cola es SQLite: sus llamadas bloquean y se hacen fuera del event loop
+    if await asyncio.to_thread(job_queue.activos, chat_id):
+        await update.message.reply_text(
+            "Ya tienes un proceso activo. Usa /cancel para detenerlo antes de iniciar uno nuevo."
+        )
+        return
+
+    trabajo_id = await asyncio.to_thread(
+        job_queue.encolar, tipo, {"perfil": perfil, "borrador_id": borrador_id}, chat_id=chat_id
+    )
+    await update.message.reply_text(
+        f"Trabajo #{trabajo_id} en cola. Se ejecutará en el primer nodo de render libre."
+    )
+    context.application.create_task(monitor_trabajo(chat_id, trabajo_id))
+
+
+async def monitor_trabajo(chat_id, trabajo_id):
+    """Espera a que un trabajo de la cola termine y notifica el resultado"""
+    while True:
+        trabajo = await asyncio.to_thread(job_queue.obtener, trabajo_id)
+        if trabajo is None or trabajo["estado"] in ESTADOS_FINALES:
+            break
+        await asyncio.sleep(5)
+
+    if trabajo and trabajo["estado"] != CANCELADO and not trabajo["notificado"]:
+        await notificar_resultado(chat_id, trabajo["resultado"])
+        await asyncio.to_thread(job_queue.marcar_notificado, trabajo_id)
+
+
+async def reanudar_monitores(app: Application) -> None:
+    """Tras reiniciar el bot, vuelve a vigilar los trabajos aún no notificados"""
+    if not job_queue:
+        return
+    for trabajo in await asyncio.to_thread(job_queue.sin_notificar):
+        app.create_task(monitor_trabajo(int(trabajo["chat_id"]), trabajo["id"]))
+
+
+def run_automation_in_process(
+    process_id, result_queue, perfil="produccion", borrador_id=None
+):
     """Esta función se ejecuta en un proceso separado"""
     try:
         from automation import VideoAutomation
 
         # Ejecutamos la automatización
         automation = VideoAutomation()
-        result = automation.generate_video()  # Nicho aleatorio
+        if borrador_id:
+            result = automation.aprobar_borrador(borrador_id)
+        else:
+            result = automation.generate_video(perfil=perfil)  # Nicho aleatorio
 
         # Enviamos el resultado al proceso principal
         result_queue.put(result)
 
     except Exception as e:
         result_queue.put({"error": str(e)})
-    finally:
-        # Asegurar que Ollama está detenido en este proceso
-        stop_ollama()
 
 
 async def monitor_process(chat_id, process_id):
@@ -98,16 +186,34 @@ async def monitor_process(chat_id, process_id):
     process = process_info["process"]
     result_queue = process_info["result_queue"]
 
-    # Esperar a que el proceso termine o revisar periódicamente
-    while process.is_alive():
-        await asyncio.sleep(2)  # Revisar cada 2 segundos
-
-    # Obtener el resultado (si está disponible)
+    # Se lee la cola mientras se espera: un resultado grande no cabe en el buffer
+    # de la tubería y el hijo no puede terminar hasta que alguien lo consuma
     result = None
-    if not result_queue.empty():
-        result = result_queue.get(timeout=1)
+    while result is None:
+        try:
+            result = result_queue.get_nowait()
+        except queue.Empty:
+            if not process.is_alive():
+                # El hijo pudo publicar justo antes de salir
+                try:
+                    result = result_queue.get(timeout=1)
+                except queue.Empty:
+                    pass
+                break
+            await asyncio.sleep(2)  # Revisar cada 2 segundos
+
+    await notificar_resultado(chat_id, result)
 
-    # Notificar al usuario
+    # Eliminar el proceso de los activos
+    if process_id in active_processes:
+        # Limpiar recursos
+        await asyncio.to_thread(process.join, 5)
+        process.terminate() if process.is_alive() else None
+        del active_processes[process_id]
+
+
+async def notificar_resultado(chat_id, result):
+    """Envía al chat el resultado de una automatización"""
     if result:
         if "error" in result:
             await application.bot.send_message(
@@ -115,23 +221,22 @@ async def monitor_process(chat_id, process_id):
                 text=f"❌ Error en la automatización: {result['error']}",
             )
         else:
-            await application.bot.send_message(
-                chat_id=chat_id,
-                text=f"✅ Automatización completada exitosamente\n"
+            text = (
+                f"✅ Automatización completada exitosamente\n"
                 f"Nicho: {result['nicho']}\n"
-                f"Video generado en: {result['video_path']}",
+                f"Video generado en: {result['video_path']}"
             )
+            if result.get("perfil") == "borrador":
+                text += (
+                    f"\nBorrador: {result['borrador_id']}\n"
+                    f"Usa /approve {result['borrador_id']} para renderizarlo en calidad final"
+                )
+            await application.bot.send_message(chat_id=chat_id, text=text)
     else:
         await application.bot.send_message(
             chat_id=chat_id, text="❌ Proceso terminado sin resultados disponibles"
         )
 
-    # Eliminar el proceso de los activos
-    if process_id in active_processes:
-        # Limpiar recursos
-        process.terminate() if process.is_alive() else None
-        del active_processes[process_id]
-
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Cancela cualquier proceso activo del usuario"""
@@ -139,11 +244,16 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_processes = [
         pid for pid in active_processes.keys() if pid.startswith(f"{chat_id}_")
     ]
+    trabajos = await asyncio.to_thread(job_queue.activos, chat_id) if job_queue else []
 
-    if not user_processes:
+    if not user_processes and not trabajos:
         await update.message.reply_text("No hay procesos activos para cancelar.")
         return
 
+    # Los nodos de render abandonan los trabajos cancelados en su siguiente latido
+    for trabajo in trabajos:
+        await asyncio.to_thread(job_queue.cancelar, trabajo["id"])
+
     # Cancela todos los procesos del usuario
     for process_id in user_processes:
         process_info = active_processes[process_id]
@@ -164,7 +274,7 @@ async def clean_resources_command(
         pid for pid in active_processes.keys() if pid.startswith(f"{chat_id}_")
     ]
 
-    if user_processes:
+    if user_processes or (job_queue and await asyncio.to_thread(job_queue.activos, chat_id)):
         await update.message.reply_text(
             "No se pueden limpiar los recursos mientras hay procesos activos. "
             "Usa /cancel para detener los procesos primero."
@@ -236,24 +346,111 @@ async def last_video_command(
         await update.message.reply_text(f"Error al enviar el video: {str(e)}")
 
 
-def main() -> None:
-    os.makedirs("log", exist_ok=True)
-    load_dotenv()
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    if not token:
-        sys.exit(1)
+def iniciar_prefetcher(config_path: str = "config.json"):
+    """Arranca el relleno en segundo plano de la reserva de historias si está activo"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except Exception:
+        return None
+
+    pool = StoryPool.desde_config(config)
+    if not pool:
+        return None
+
+    from generators.text_generator import TextGenerator
+    from llm_cache import LLMCache
+    from ollama_client import OllamaClient
+
+    # Las historias pregeneradas no llevan seed: no se cachean
+    cliente = OllamaClient.desde_config(config)
+    text_generator = TextGenerator(
+        detener_ollama=False, cache=LLMCache(activo=False, cliente=cliente)
+    )
 
-    global application
-    application = Application.builder().token(token).build()
+    def generar_lote(combinaciones):
+        # Varias historias en vuelo a la vez y una sola descarga del modelo al final;
+        # se descarga el modelo en lugar de matar Ollama, que puede estar sirviendo a un trabajo
+        try:
+            return cliente.ejecutar(text_generator.agenerar_lote(combinaciones))
+        finally:
+            descargar_modelo_ollama(TextGenerator.MODELO, cliente)
+
+    prefetcher = StoryPrefetcher(
+        pool,
+        generar_lote,
+        enumerar_combinaciones(config),
+        # Solo se usa el LLM cuando no hay ningún trabajo en curso
+        esta_inactivo=lambda: not active_processes
+        and not (
+            job_queue
+            and any(t["estado"] == EN_CURSO for t in job_queue.activos())
+        ),
+        intervalo=config["pool_historias"].get("intervalo_inactivo", 30),
+        lote=config["pool_historias"].get("lote", 1),
+    )
+    prefetcher.start()
+    return prefetcher
+
+
+def build_application(
+    token: str,
+    base_url: str = None,
+    config_path: str = "config.json",
+    ejecutor=None,
+) -> Application:
+    """
+    Construye la aplicación del bot con todos sus comandos.
+
+    Args:
+        token: Token del bot
+        base_url: URL de la Bot API (p. ej. un servidor falso para pruebas de carga)
+        config_path: Configuración de la que se lee la cola de trabajos (None: sin cola)
+        ejecutor: Función que ejecuta cada automatización en su proceso (por
+            defecto, run_automation_in_process)
+    """
+    global application, job_queue, ejecutor_automatizacion
+    job_queue = None
+    if config_path:
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                job_queue = JobQueue.desde_config(json.load(f))
+        except Exception:
+            job_queue = None
+    ejecutor_automatizacion = ejecutor or run_automation_in_process
+
+    builder = Application.builder().token(token).post_init(reanudar_monitores)
+    if base_url:
+        builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+    application = builder.build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("run", run_command))
+    application.add_handler(CommandHandler("draft", draft_command))
+    application.add_handler(CommandHandler("approve", approve_command))
     application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(CommandHandler("last_video", last_video_command))
     application.add_handler(CommandHandler("clean", clean_resources_command))
+    return application
+
+
+def main() -> None:
+    os.makedirs("log", exist_ok=True)
+    load_dotenv()
+    token = os.environ.get("TELEGRAM_BOT_TOKEN")
+    if not token:
+        sys.exit(1)
+
+    build_application(token)
+    iniciar_prefetcher()
 
     application.run_polling()
 
+    # Asegurar que ningún proceso de automatización sobrevive al bot
+    for process_info in active_processes.values():
+        if process_info["process"].is_alive():
+            process_info["process"].terminate()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,151 @@
+import logging
+from typing import Optional, Dict, Any, List, Callable
+
+
+class ModeloGestionado:
+    """Modelo pesado cuya residencia en memoria decide el árbitro."""
+
+    def __init__(
+        self,
+        nombre: str,
+        tamano_mb: float,
+        descargar: Callable[[], None],
+        cargar: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Args:
+            nombre: Identificador del modelo
+            tamano_mb: Memoria que ocupa cuando está cargado
+            descargar: Libera el modelo de memoria
+            cargar: Carga el modelo (opcional, si la etapa no lo carga por sí misma).
+                Sin él, el modelo solo cuenta como residente cuando la etapa avisa
+                con `marcar_residente` de que lo va a usar de verdad
+        """
+        self.nombre = nombre
+        self.tamano_mb = tamano_mb
+        self.descargar = descargar
+        self.cargar = cargar
+        self.residente = False
+
+
+class MemoryArbiter:
+    """
+    Decide qué modelos pesados (LLM de Ollama, Stable Diffusion) permanecen en memoria.
+
+    Antes de cada etapa se le indican los modelos que necesita y los de las etapas
+    siguientes. Si no caben, expulsa primero el modelo residente cuyo próximo uso
+    está más lejos (o que no se vuelve a usar).
+
+    Los modelos que carga la propia etapa (Ollama al recibir una llamada, el
+    pipeline de imágenes al renderizar) no se dan por cargados al preparar la
+    etapa: puede que la etapa no los llegue a usar (respuesta en caché, imágenes
+    reutilizadas). Se hace sitio y se marcan como residentes en `marcar_residente`,
+    justo antes del uso real; así nunca se "descarga" un modelo que no se cargó.
+    """
+
+    def __init__(self, capacidad_mb: float):
+        self.capacidad_mb = capacidad_mb
+        self.modelos: Dict[str, ModeloGestionado] = {}
+        # Etapa en curso, para decidir expulsiones al marcar un modelo como residente
+        self.necesarios: List[str] = []
+        self.proximas: List[List[str]] = []
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> "MemoryArbiter":
+        """Crea el árbitro a partir de la sección `memoria` de la configuración."""
+        return cls(config.get("capacidad_mb", 12288))
+
+    def registrar(
+        self,
+        nombre: str,
+        tamano_mb: float,
+        descargar: Callable[[], None],
+        cargar: Optional[Callable[[], None]] = None,
+    ) -> None:
+        if nombre not in self.modelos:
+            self.modelos[nombre] = ModeloGestionado(nombre, tamano_mb, descargar, cargar)
+
+    def residentes(self) -> List[str]:
+        return [m.nombre for m in self.modelos.values() if m.residente]
+
+    def uso_mb(self) -> float:
+        return sum(m.tamano_mb for m in self.modelos.values() if m.residente)
+
+    def _proximo_uso(self, nombre: str, proximas: List[List[str]]) -> float:
+        for distancia, modelos in enumerate(proximas):
+            if nombre in modelos:
+                return distancia
+        return float("inf")
+
+    def expulsar(self, nombre: str) -> None:
+        modelo = self.modelos[nombre]
+        if not modelo.residente:
+            return
+        try:
+            modelo.descargar()
+        except Exception as e:
+            logging.error(f"Error al liberar el modelo {nombre}: {str(e)}")
+        modelo.residente = False
+        logging.info(f"Modelo liberado de memoria: {nombre}")
+
+    def _hacer_sitio(self, modelo: ModeloGestionado) -> List[str]:
+        expulsados = []
+        while self.uso_mb() + modelo.tamano_mb > self.capacidad_mb:
+            candidatos = [n for n in self.residentes() if n not in self.necesarios]
+            if not candidatos:
+                logging.warning(
+                    f"El modelo {modelo.nombre} no cabe en {self.capacidad_mb} MB "
+                    "aunque se liberen los demás"
+                )
+                break
+            victima = max(candidatos, key=lambda n: self._proximo_uso(n, self.proximas))
+            self.expulsar(victima)
+            expulsados.append(victima)
+        return expulsados
+
+    def preparar(
+        self, necesarios: List[str], proximas: Optional[List[List[str]]] = None
+    ) -> List[str]:
+        """
+        Empieza una etapa: carga los modelos que el árbitro sabe cargar y deja
+        anotados los demás para `marcar_residente`.
+
+        Args:
+            necesarios: Modelos que usa la etapa que va a empezar
+            proximas: Modelos de cada una de las etapas siguientes, en orden
+
+        Returns:
+            Lista de modelos expulsados
+        """
+        self.necesarios = list(necesarios)
+        self.proximas = proximas or []
+        expulsados = []
+
+        for nombre in necesarios:
+            modelo = self.modelos.get(nombre)
+            if modelo is None or modelo.residente or modelo.cargar is None:
+                continue
+            expulsados.extend(self._hacer_sitio(modelo))
+            modelo.cargar()
+            modelo.residente = True
+
+        return expulsados
+
+    def marcar_residente(self, nombre: str) -> List[str]:
+        """
+        Avisa de que la etapa va a cargar el modelo (llamada real a Ollama,
+        render de imágenes). Hace sitio antes si hace falta.
+
+        Returns:
+            Lista de modelos expulsados
+        """
+        modelo = self.modelos.get(nombre)
+        if modelo is None or modelo.residente:
+            return []
+        expulsados = self._hacer_sitio(modelo)
+        modelo.residente = True
+        return expulsados
+
+    def liberar_todo(self) -> None:
+        for nombre in self.residentes():
+            self.expulsar(nombre)
@@ -0,0 +1,267 @@
+import os
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+
+class OllamaClient:
+    """
+    Cliente asíncrono de la API HTTP de Ollama con conexiones reutilizables.
+
+    Todas las peticiones pasan por un único httpx.AsyncClient que vive en un
+    event loop propio (hilo "ollama-cliente"), así que el pool de conexiones y
+    el límite de concurrencia se comparten entre hilos:
+    - desde código asíncrono (el bot, lotes): `await cliente.generate(...)`
+      funciona desde cualquier event loop
+    - desde código bloqueante (generadores, prefetcher): `generate_sync(...)`
+
+    Los errores de red, los timeouts y las respuestas 429/5xx se reintentan con
+    espera exponencial y jitter. El host se toma de `OLLAMA_HOST` si no se indica.
+    """
+
+    HOST_POR_DEFECTO = "http://127.0.0.1:11434"
+    PUERTO_POR_DEFECTO = 11434
+    CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        max_concurrentes: int = 2,
+        max_conexiones: int = 4,
+        timeout_conexion: float = 5.0,
+        timeout_lectura: float = 600.0,
+        reintentos: int = 3,
+        espera_base: float = 1.0,
+        espera_max: float = 30.0,
+    ):
+        """
+        Args:
+            host: URL del servidor de Ollama (por defecto OLLAMA_HOST o localhost)
+            max_concurrentes: Peticiones en vuelo a la vez (el resto espera turno)
+            max_conexiones: Conexiones HTTP que se mantienen abiertas
+            timeout_conexion: Segundos para establecer la conexión
+            timeout_lectura: Segundos de espera a la respuesta (generaciones largas)
+            reintentos: Reintentos ante errores transitorios
+            espera_base: Espera antes del primer reintento (se duplica en cada uno)
+            espera_max: Espera máxima entre reintentos
+        """
+        self.host = self.normalizar_host(
+            host or os.environ.get("OLLAMA_HOST") or self.HOST_POR_DEFECTO
+        )
+        self.max_concurrentes = max(1, max_concurrentes)
+        self.max_conexiones = max(self.max_concurrentes, max_conexiones)
+        self.timeout = httpx.Timeout(timeout_lectura, connect=timeout_conexion)
+        self.reintentos = max(0, reintentos)
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+
+        self.peticiones = 0
+        self.reintentos_hechos = 0
+        self.en_curso = 0
+
+        self._lock = threading.Lock()
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> "OllamaClient":
+        """Crea el cliente a partir de `llm.cliente` (valores por defecto si falta)."""
+        ajustes = config.get("llm", {}).get("cliente", {})
+        return cls(
+            host=ajustes.get("host"),
+            max_concurrentes=ajustes.get("max_concurrentes", 2),
+            max_conexiones=ajustes.get("max_conexiones", 4),
+            timeout_conexion=ajustes.get("timeout_conexion", 5.0),
+            timeout_lectura=ajustes.get("timeout_lectura", 600.0),
+            reintentos=ajustes.get("reintentos", 3),
+            espera_base=ajustes.get("espera_base", 1.0),
+            espera_max=ajustes.get("espera_max", 30.0),
+        )
+
+    @classmethod
+    def normalizar_host(cls, host: str) -> str:
+        """Acepta los mismos formatos que OLLAMA_HOST ("0.0.0.0", "host:puerto", URL)."""
+        # Como la librería ollama: con esquema explícito el puerto por defecto es el del esquema
+        puerto_defecto = cls.PUERTO_POR_DEFECTO
+        if "://" in host:
+            puerto_defecto = {"http": 80, "https": 443}.get(host.split("://")[0], puerto_defecto)
+        else:
+            host = f"http://{host}"
+        partes = urlsplit(host)
+        nombre = partes.hostname or "127.0.0.1"
+        if nombre == "0.0.0.0":
+            nombre = "127.0.0.1"
+        if ":" in nombre:
+            nombre = f"[{nombre}]"
+        puerto = partes.port or puerto_defecto
+        return f"{partes.scheme}://{nombre}:{puerto}{partes.path.rstrip('/')}"
+
+    def _asegurar_bucle(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # Tras un fork el hilo del bucle no existe en el hijo: se crea otro
+            if self._bucle is None or self._pid != os.getpid():
+                bucle = asyncio.new_event_loop()
+                hilo = threading.Thread(
+                    target=bucle.run_forever, name="ollama-cliente", daemon=True
+                )
+                hilo.start()
+                self._bucle, self._hilo, self._pid = bucle, hilo, os.getpid()
+                self._cliente = None
+            return self._bucle
+
+    def _cliente_http(self) -> httpx.AsyncClient:
+        """Cliente HTTP del bucle propio (solo se llama desde ese bucle)."""
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(
+                base_url=self.host,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_conexiones,
+                    max_keepalive_connections=self.max_conexiones,
+                ),
+            )
+            self._semaforo = asyncio.Semaphore(self.max_concurrentes)
+        return self._cliente
+
+    def _espera(self, intento: int, respuesta: Optional[httpx.Response]) -> float:
+        if respuesta is not None:
+            try:
+                return min(self.espera_max, float(respuesta.headers["Retry-After"]))
+            except (KeyError, ValueError):
+                pass
+        espera = min(self.espera_max, self.espera_base * 2**intento)
+        # Jitter para que los reintentos simultáneos no lleguen todos a la vez
+        return espera * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _error_http(respuesta: httpx.Response) -> httpx.HTTPStatusError:
+        try:
+            detalle = respuesta.json().get("error", respuesta.text)
+        except ValueError:
+            detalle = respuesta.text
+        return httpx.HTTPStatusError(
+            f"Ollama respondió {respuesta.status_code}: {detalle}",
+            request=respuesta.request,
+            response=respuesta,
+        )
+
+    async def _post(self, ruta: str, cuerpo: Dict[str, Any]) -> Dict[str, Any]:
+        cliente = self._cliente_http()
+        # Las esperas entre reintentos mantienen el turno: no se carga más a un servidor con problemas
+        async with self._semaforo:
+            self.en_curso += 1
+            self.peticiones += 1
+            try:
+                for intento in range(self.reintentos + 1):
+                    respuesta = None
+                    try:
+                        respuesta = await cliente.post(ruta, json=cuerpo)
+                        if respuesta.status_code < 400:
+                            return respuesta.json()
+                        error = self._error_http(respuesta)
+                        if respuesta.status_code not in self.CODIGOS_REINTENTABLES:
+                            raise error
+                    except httpx.TransportError as e:
+                        error = e
+                    if intento == self.reintentos:
+                        raise error
+                    self.reintentos_hechos += 1
+                    await asyncio.sleep(self._espera(intento, respuesta))
+            finally:
+                self.en_curso -= 1
+
+    async def _en_bucle(self, corutina) -> Any:
+        bucle = self._asegurar_bucle()
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+        if actual is bucle:
+            return await corutina
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(corutina, bucle))
+
+    def ejecutar(self, corutina) -> Any:
+        """Ejecuta una corrutina en el bucle del cliente y espera su resultado (bloqueante)."""
+        bucle = self._asegurar_bucle()
+        if threading.current_thread() is self._hilo:
+            corutina.close()
+            raise RuntimeError("ejecutar() no se puede llamar desde el bucle del cliente")
+        return asyncio.run_coroutine_threadsafe(corutina, bucle).result()
+
+    @staticmethod
+    def _cuerpo(argumentos: Dict[str, Any]) -> Dict[str, Any]:
+        cuerpo = {clave: valor for clave, valor in argumentos.items() if valor is not None}
+        cuerpo["stream"] = False
+        return cuerpo
+
+    async def generate(self, **argumentos) -> Dict[str, Any]:
+        """
+        Equivalente asíncrono de ollama.generate (sin streaming).
+
+        Args:
+            **argumentos: model, prompt, system, format, options, keep_alive...
+
+        Returns:
+            Dict con la respuesta de /api/generate ("response", "done"...)
+        """
+        return await self._en_bucle(self._post("/api/generate", self._cuerpo(argumentos)))
+
+    def generate_sync(self, **argumentos) -> Dict[str, Any]:
+        """Versión bloqueante de generate() para hilos y procesos sin event loop."""
+        return self.ejecutar(self._post("/api/generate", self._cuerpo(argumentos)))
+
+    async def _get(self, ruta: str) -> Dict[str, Any]:
+        respuesta = await self._cliente_http().get(ruta)
+        if respuesta.status_code >= 400:
+            raise self._error_http(respuesta)
+        return respuesta.json()
+
+    async def listar_modelos(self) -> Dict[str, Any]:
+        """
+        Equivalente a ollama.list() (/api/tags).
+
+        Sin reintentos: se usa para comprobar si el servidor responde.
+        """
+        return await self._en_bucle(self._get("/api/tags"))
+
+    def listar_modelos_sync(self) -> Dict[str, Any]:
+        """Versión bloqueante de listar_modelos()."""
+        return self.ejecutar(self._get("/api/tags"))
+
+    async def generar_varios(self, peticiones: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Lanza varias generaciones a la vez (limitadas por max_concurrentes).
+
+        Returns:
+            Lista en el mismo orden: la respuesta o la excepción de cada petición
+        """
+        return await asyncio.gather(
+            *(self.generate(**peticion) for peticion in peticiones), return_exceptions=True
+        )
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "peticiones": self.peticiones,
+            "reintentos": self.reintentos_hechos,
+            "en_curso": self.en_curso,
+        }
+
+    def cerrar(self):
+        """Cierra las conexiones y detiene el bucle del cliente."""
+        with self._lock:
+            bucle, hilo, cliente = self._bucle, self._hilo, self._cliente
+            if bucle is None or self._pid != os.getpid():
+                return
+            self._bucle = self._hilo = self._cliente = None
+        if cliente is not None:
+            asyncio.run_coroutine_threadsafe(cliente.aclose(), bucle).result()
+        bucle.call_soon_threadsafe(bucle.stop)
+        hilo.join()
+        bucle.close()
@@ -0,0 +1,46 @@
+from typing import Dict, Any
+
+# Ajustes de render de cada perfil. "produccion" reproduce los valores de siempre;
+# "borrador" sirve para iterar rápido sobre nichos y prompts.
+PERFILES: Dict[str, Dict[str, Any]] = {
+    "produccion": {
+        "pasos": 50,
+        "ancho": 576,
+        "alto": 1024,
+        "preset": "medium",
+        "crf": 23,
+        "tts_cache": False,
+        "versiones": True,
+    },
+    "borrador": {
+        "pasos": 12,
+        "ancho": 288,
+        "alto": 512,
+        "preset": "ultrafast",
+        "crf": 32,
+        # La narración queda en caché para que aprobar el borrador no la repita
+        "tts_cache": True,
+        # Ya se difunde a baja resolución: sin escalado
+        "factor_difusion": 1.0,
+        # Los borradores solo generan una salida al tamaño de las imágenes
+        "versiones": False,
+    },
+}
+
+
+def obtener_perfil(nombre: str, config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Devuelve los ajustes de un perfil de render.
+
+    Args:
+        nombre: "produccion" o "borrador"
+        config: Configuración completa; la sección `perfiles` puede sobrescribir valores
+
+    Returns:
+        Diccionario con los ajustes del perfil (incluye su nombre)
+    """
+    if nombre not in PERFILES:
+        raise ValueError(f"Perfil de render desconocido: {nombre}")
+
+    sobrescritos = (config or {}).get("perfiles", {}).get(nombre, {})
+    return {**PERFILES[nombre], **sobrescritos, "nombre": nombre}
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+
+class _Muestreador(threading.Thread):
+    """Toma muestras periódicas de las pilas de todos los hilos del proceso."""
+
+    def __init__(self, intervalo: float):
+        super().__init__(name="perfilado-muestreo", daemon=True)
+        self.intervalo = intervalo
+        self.etapa: Optional[str] = None
+        self.pilas: Counter = Counter()
+        self._detener = threading.Event()
+
+    @staticmethod
+    def _marco(frame) -> str:
+        codigo = frame.f_code
+        return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            etapa = self.etapa
+            if etapa is None:
+                continue
+            nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                pila = []
+                while frame is not None:
+                    pila.append(self._marco(frame))
+                    frame = frame.f_back
+                pila.reverse()
+                # Formato "collapsed": etapa;hilo;función;...;función
+                self.pilas[";".join([etapa, nombres.get(ident, str(ident)), *pila])] += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+class StageProfiler:
+    """
+    Perfilado opcional por etapa de un trabajo.
+
+    - "muestreo": muestrea las pilas de todos los hilos (incluye los escritores
+      de imágenes y las esperas a subprocesos) y genera pilas colapsadas listas
+      para flamegraph.pl o speedscope.
+    - "determinista": un cProfile por etapa (.pstats), solo del hilo principal.
+    - torch: la etapa de difusión se envuelve además con torch.profiler.
+
+    Siempre se escribe una traza de Chrome (chrome://tracing o Perfetto) con la
+    duración de cada etapa. Los trabajadores de imágenes en otros procesos no
+    se perfilan.
+    """
+
+    def __init__(self, modo: str = "muestreo", intervalo_ms: float = 5.0, torch: bool = True):
+        """
+        Args:
+            modo: "muestreo", "determinista" o "ambos"
+            intervalo_ms: Periodo de muestreo
+            torch: Usa torch.profiler en las etapas que lo pidan
+        """
+        if modo not in ("muestreo", "determinista", "ambos"):
+            raise ValueError(f"Modo de perfilado desconocido: {modo}")
+        self.modo = modo
+        self.usar_torch = torch
+        self.inicio = time.perf_counter()
+        self.eventos: List[Dict[str, Any]] = []
+        self.cprofiles: Dict[str, cProfile.Profile] = {}
+        self.torch_profiles: Dict[str, Any] = {}
+        self.muestreador = None
+        if modo in ("muestreo", "ambos"):
+            self.muestreador = _Muestreador(intervalo_ms / 1000)
+            self.muestreador.start()
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> "StageProfiler":
+        ajustes = config.get("perfilado", {})
+        return cls(
+            modo=ajustes.get("modo", "muestreo"),
+            intervalo_ms=ajustes.get("intervalo_ms", 5.0),
+            torch=ajustes.get("torch", True),
+        )
+
+    def _perfil_torch(self):
+        try:
+            import torch
+            from torch.profiler import profile, ProfilerActivity
+        except ImportError:
+            return None
+        actividades = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            actividades.append(ProfilerActivity.CUDA)
+        return profile(activities=actividades, with_stack=True)
+
+    @contextmanager
+    def etapa(self, nombre: str, torch: bool = False):
+        """Perfila el bloque como la etapa `nombre`."""
+        perfil_torch = self._perfil_torch() if torch and self.usar_torch else None
+        cprofile = cProfile.Profile() if self.modo in ("determinista", "ambos") else None
+
+        if self.muestreador:
+            self.muestreador.etapa = nombre
+        if perfil_torch:
+            perfil_torch.__enter__()
+        if cprofile:
+            cprofile.enable()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            fin = time.perf_counter()
+            if cprofile:
+                cprofile.disable()
+                self.cprofiles[nombre] = cprofile
+            if perfil_torch:
+                perfil_torch.__exit__(None, None, None)
+                self.torch_profiles[nombre] = perfil_torch
+            if self.muestreador:
+                self.muestreador.etapa = None
+            self.eventos.append(
+                {
+                    "name": nombre,
+                    "cat": "etapa",
+                    "ph": "X",
+                    "ts": (inicio - self.inicio) * 1e6,
+                    "dur": (fin - inicio) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+
+    def guardar(self, directorio: str) -> Dict[str, Any]:
+        """
+        Detiene el muestreo y escribe los perfiles del trabajo en `directorio`.
+
+        Returns:
+            Dict con el directorio y los segundos de cada etapa
+        """
+        if self.muestreador:
+            self.muestreador.detener()
+        os.makedirs(directorio, exist_ok=True)
+
+        with open(os.path.join(directorio, "etapas.trace.json"), "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.eventos, "displayTimeUnit": "ms"}, f)
+
+        if self.muestreador:
+            with open(os.path.join(directorio, "muestras.collapsed"), "w", encoding="utf-8") as f:
+                for pila, cuenta in self.muestreador.pilas.most_common():
+                    f.write(f"{pila} {cuenta}\n")
+
+        for nombre, cprofile in self.cprofiles.items():
+            cprofile.dump_stats(os.path.join(directorio, f"{nombre}.pstats"))
+
+        for nombre, perfil_torch in self.torch_profiles.items():
+            perfil_torch.export_chrome_trace(os.path.join(directorio, f"{nombre}.torch.trace.json"))
+            perfil_torch.export_stacks(
+                os.path.join(directorio, f"{nombre}.torch.collapsed"), "self_cpu_time_total"
+            )
+
+        return {
+            "directorio": directorio,
+            "etapas": {e["name"]: e["dur"] / 1e6 for e in self.eventos},
+        }
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+from utils import bloqueo_archivo
+
+# (nicho, era, ubicación, tono)
+Combinacion = Tuple[str, str, str, str]
+
+
+def enumerar_combinaciones(config: Dict[str, Any]) -> List[Combinacion]:
+    """
+    Enumera todas las combinaciones nicho/era/ubicación/tono de la configuración.
+
+    Usa los mismos valores por defecto que ConfigManager cuando una lista está vacía.
+    """
+    combinaciones = []
+    for nicho_config in config.get("nichos", []):
+        eras = nicho_config.get("eras") or [""]
+        locations = nicho_config.get("locations") or [""]
+        tones = nicho_config.get("tones") or ["engaging"]
+        for era in eras:
+            for location in locations:
+                for tone in tones:
+                    combinaciones.append((nicho_config["name"], era, location, tone))
+    return combinaciones
+
+
+class StoryPool:
+    """
+    Reserva persistente y acotada de historias pregeneradas por combinación.
+
+    El estado vive en un archivo JSON para que el proceso del bot (que rellena)
+    y los procesos de generación (que consumen) compartan la misma reserva.
+    """
+
+    DEFAULT_PATH = "resources/pool/historias.json"
+    LOCK_TIMEOUT = 30.0
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        profundidad: int = 1,
+        max_edad_horas: float = 72.0,
+        historial_dedup: int = 500,
+        max_historias: int = 50,
+    ):
+        """
+        Inicializa la reserva de historias.
+
+        Args:
+            path: Ruta al archivo JSON de la reserva
+            profundidad: Historias listas que se mantienen por combinación
+            max_edad_horas: Antigüedad máxima de una historia antes de descartarla
+            historial_dedup: Huellas de historias entregadas que se recuerdan
+            max_historias: Historias listas en total, sumando todas las combinaciones
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.profundidad = max(1, profundidad)
+        self.max_historias = max(1, max_historias)
+        self.max_edad = max_edad_horas * 3600
+        self.historial_dedup = historial_dedup
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @classmethod
+    def desde_config(cls, config: Dict[str, Any]) -> Optional["StoryPool"]:
+        """Crea la reserva a partir de la sección `pool_historias` o None si está desactivada."""
+        ajustes = config.get("pool_historias", {})
+        if not ajustes.get("activo", False):
+            return None
+        return cls(
+            path=ajustes.get("path", cls.DEFAULT_PATH),
+            profundidad=ajustes.get("profundidad", 1),
+            max_edad_horas=ajustes.get("max_edad_horas", 72.0),
+            historial_dedup=ajustes.get("historial_dedup", 500),
+            max_historias=ajustes.get("max_historias", 50),
+        )
+
+    @staticmethod
+    def clave(combinacion: Combinacion) -> str:
+        return "|".join(combinacion)
+
+    @staticmethod
+    def huella(idea: str) -> str:
+        normalizada = " ".join(idea.lower().split())
+        return hashlib.sha1(normalizada.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _bloqueo(self):
+        """Bloqueo entre hilos y entre procesos mediante un archivo de lock."""
+        with self._lock, bloqueo_archivo(self.lock_path, self.LOCK_TIMEOUT):
+            yield
+
+    def _leer(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        except (OSError, ValueError):
+            estado = {}
+        estado.setdefault("historias", {})
+        estado.setdefault("entregadas", [])
+        return estado
+
+    def _escribir(self, estado: Dict[str, Any]) -> None:
+        temporal = f"{self.path}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(temporal, self.path)
+
+    @staticmethod
+    def _total(estado: Dict[str, Any]) -> int:
+        return sum(len(historias) for historias in estado["historias"].values())
+
+    def _purgar(self, estado: Dict[str, Any]) -> None:
+        limite = time.time() - self.max_edad
+        for clave, historias in list(estado["historias"].items()):
+            vigentes = [h for h in historias if h["creado"] >= limite]
+            if vigentes:
+                estado["historias"][clave] = vigentes
+            else:
+                del estado["historias"][clave]
+
+    def agregar(self, combinacion: Combinacion, idea: str) -> bool:
+        """
+        Añade una historia a la reserva.
+
+        Returns:
+            bool: False si la combinación o la reserva están llenas o la historia es un duplicado
+        """
+        huella = self.huella(idea)
+        clave = self.clave(combinacion)
+        with self._bloqueo():
+            estado = self._leer()
+            self._purgar(estado)
+
+            historias = estado["historias"].setdefault(clave, [])
+            en_reserva = {h["huella"] for lista in estado["historias"].values() for h in lista}
+            if len(historias) >= self.profundidad or self._total(estado) >= self.max_historias:
+                return False
+            if huella in en_reserva or huella in estado["entregadas"]:
+                logging.info(f"Historia duplicada descartada para {clave}")
+                return False
+
+            historias.append({"idea": idea, "creado": time.time(), "huella": huella})
+            self._escribir(estado)
+            return True
+
+    def _extraer(self, estado: Dict[str, Any], clave: str) -> str:
+        historia = estado["historias"][clave].pop(0)
+        if not estado["historias"][clave]:
+            del estado["historias"][clave]
+        estado["entregadas"].append(historia["huella"])
+        estado["entregadas"] = estado["entregadas"][-self.historial_dedup :]
+        return historia["idea"]
+
+    def tomar_cualquiera(
+        self, nicho: Optional[str] = None
+    ) -> Optional[Tuple[Combinacion, str]]:
+        """
+        Entrega una historia lista de cualquier combinación, opcionalmente filtrando por nicho.
+
+        Returns:
+            Tuple con (combinación, idea) o None si no hay historias listas
+        """
+        with self._bloqueo():
+            estado = self._leer()
+            self._purgar(estado)
+            claves = [
+                clave
+                for clave, historias in estado["historias"].items()
+                if historias and (nicho is None or clave.split("|")[0] == nicho)
+            ]
+            if not claves:
+                self._escribir(estado)
+                return None
+            clave = random.choice(claves)
+            idea = self._extraer(estado, clave)
+            self._escribir(estado)
+            return tuple(clave.split("|")), idea
+
+    def faltantes(self, combinaciones: List[Combinacion]) -> List[Combinacion]:
+        """
+        Devuelve las combinaciones que están por debajo de la profundidad configurada.
+
+        Con la reserva llena no falta ninguna, aunque queden combinaciones incompletas.
+        """
+        with self._bloqueo():
+            estado = self._leer()
+            self._purgar(estado)
+        if self._total(estado) >= self.max_historias:
+            return []
+        return [
+            combinacion
+            for combinacion in combinaciones
+            if len(estado["historias"].get(self.clave(combinacion), [])) < self.profundidad
+        ]
+
+    def tamano(self) -> int:
+        with self._bloqueo():
+            estado = self._leer()
+            self._purgar(estado)
+        return self._total(estado)
+
+
+class StoryPrefetcher(threading.Thread):
+    """Hilo en segundo plano que rellena la reserva de historias mientras no hay trabajos."""
+
+    def __init__(
+        self,
+        pool: StoryPool,
+        generar_lote: Callable[[List[Combinacion]], List[Optional[str]]],
+        combinaciones: List[Combinacion],
+        esta_inactivo: Callable[[], bool] = lambda: True,
+        intervalo: float = 30.0,
+        lote: int = 1,
+    ):
+        """
+        Inicializa el prefetcher.
+
+        Args:
+            pool: Reserva a rellenar
+            generar_lote: Función que genera a la vez una idea por combinación
+                (None en las que fallen)
+            combinaciones: Combinaciones a mantener pregeneradas
+            esta_inactivo: Devuelve True cuando se puede usar el LLM sin molestar
+            intervalo: Segundos de espera cuando no hay nada que hacer
+            lote: Combinaciones incompletas que se rellenan en cada ronda
+        """
+        super().__init__(name="story-prefetcher", daemon=True)
+        self.pool = pool
+        self.generar_lote = generar_lote
+        self.combinaciones = combinaciones
+        self.esta_inactivo = esta_inactivo
+        self.intervalo = intervalo
+        self.lote = max(1, lote)
+        self._detener = threading.Event()
+
+    def rellenar(self) -> int:
+        """Genera historias para hasta `lote` combinaciones incompletas. Devuelve cuántas añadió."""
+        faltantes = self.pool.faltantes(self.combinaciones)
+        if not faltantes:
+            return 0
+
+        # No se generan más historias de las que caben en la reserva
+        hueco = self.pool.max_historias - self.pool.tamano()
+        combinaciones = random.sample(faltantes, max(0, min(self.lote, len(faltantes), hueco)))
+        if not combinaciones:
+            return 0
+        ideas = self.generar_lote(combinaciones)
+        return sum(
+            1
+            for combinacion, idea in zip(combinaciones, ideas)
+            if idea and self.pool.agregar(combinacion, idea)
+        )
+
+    def run(self) -> None:
+        while not self._detener.is_set():
+            trabajo_hecho = False
+            try:
+                # Se vuelve a comprobar la inactividad antes de cada generación
+                if self.esta_inactivo():
+                    trabajo_hecho = self.rellenar() > 0
+            except Exception as e:
+                logging.error(f"Error al pregenerar historia: {str(e)}")
+            self._detener.wait(1 if trabajo_hecho else self.intervalo)
+
+    def detener(self) -> None:
+        self._detener.set()
@@ -0,0 +1,107 @@
+"""
+Mide, para cada factor de `imagenes.escalado`, cuánto se ahorra en difusión y
+cuánto cuesta después el escalado en CPU, con el pipeline real de SD3.
+
+A diferencia de `python -m generators.upscaler`, que solo mide el escalado, aquí
+cada imagen se difunde de verdad a la resolución reducida; el ahorro se calcula
+contra el factor 1.0 con los mismos prompts, seeds y pasos. Necesita torch,
+diffusers y el modelo descargado.
+
+Uso:
+    python tests/benchmark_escalado.py --factores 0.5 0.625 0.75 1.0 --imagenes 4
+    python tests/benchmark_escalado.py --pasos 28 --dispositivo cuda:0
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generators.image_generator import ImageGenerator  # noqa: E402
+
+PROMPTS = [
+    "A lighthouse on a cliff at dusk, cinematic lighting, volumetric fog",
+    "Ancient bronze gears inside a desert temple, dramatic shadows",
+    "A crowded night market in the rain, neon reflections, 35mm photo",
+    "An abandoned observatory overgrown with ivy, golden hour",
+]
+
+
+def cargar_config(ruta: str = "config.json") -> dict:
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f).get("imagenes", {})
+
+
+def medir(generador: ImageGenerator, pipe, factor: float, imagenes: int, seed: int):
+    """Devuelve (segundos de difusión por imagen, segundos de escalado por imagen)."""
+    generador.factor = factor
+    generador.escritor.tomar_segundos_escalado()
+    difusion = 0.0
+    for idx in range(imagenes):
+        _, segundos = generador.renderizar(
+            pipe, "benchmark", idx, PROMPTS[idx % len(PROMPTS)], seed + idx
+        )
+        difusion += segundos
+    generador.escritor.vaciar()
+    escalado = generador.escritor.tomar_segundos_escalado()
+    return difusion / imagenes, (sum(escalado) / imagenes if escalado else 0.0)
+
+
+def benchmark(factores, imagenes: int = 4, pasos: int = None, dispositivo: str = None, seed: int = 0):
+    config = cargar_config()
+    generador = ImageGenerator(
+        mantener_modelo=True,
+        dispositivo=dispositivo or config.get("dispositivo", "auto"),
+        cpu_config=config.get("cpu"),
+        escritura=config.get("escritura"),
+        # Activo siempre: el factor de cada medida se fija a mano
+        escalado={**config.get("escalado", {}), "activo": True},
+    )
+    generador.aplicar_perfil({"pasos": pasos} if pasos else None)
+    pipe = generador.cargar_modelo()
+
+    # Una imagen de calentamiento para no cargar la compilación y las reservas al primer factor
+    medir(generador, pipe, 1.0, 1, seed)
+
+    factores = sorted(set(factores) | {1.0})
+    resultados = {}
+    for factor in factores:
+        resultados[factor] = medir(generador, pipe, factor, imagenes, seed)
+        resultados[factor] += ((generador.ancho_difusion, generador.alto_difusion),)
+
+    base = resultados[1.0][0]
+    print(
+        f"Salida {generador.ancho}x{generador.alto}, {generador.pasos} pasos,"
+        f" {imagenes} imágenes, {generador.backend.dispositivo}"
+    )
+    print("factor  difusión   píxeles  s difusión  ms escalado  ahorro/imagen")
+    for factor in factores:
+        difusion, escalado, (ancho, alto) = resultados[factor]
+        pixeles = (ancho * alto) / (generador.ancho * generador.alto)
+        # El escalado corre en los hilos de escritura, solapado con la siguiente difusión
+        print(
+            f"{factor:>6.3f}  {ancho:>4}x{alto:<4}  {pixeles:>6.0%}  {difusion:>10.2f}"
+            f"  {escalado * 1000:>11.1f}  {base - difusion:>+9.2f} s ({1 - difusion / base:.0%})"
+        )
+
+    generador.escritor.cerrar()
+    for idx in range(imagenes):
+        ruta = generador.ruta_imagen("benchmark", idx)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ahorro de difusión por factor de escalado")
+    parser.add_argument("--factores", type=float, nargs="+", default=[0.5, 0.625, 0.75, 1.0])
+    parser.add_argument("--imagenes", type=int, default=4)
+    parser.add_argument("--pasos", type=int, help="Por defecto, los del perfil de producción")
+    parser.add_argument("--dispositivo", help="Por defecto, imagenes.dispositivo de config.json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.factores, args.imagenes, args.pasos, args.dispositivo, args.seed)
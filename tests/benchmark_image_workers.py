@@ -0,0 +1,67 @@
+"""
+Mide cómo escala ImageWorkerPool con el número de trabajadores.
+
+Por defecto usa el generador de prueba (cada imagen tarda --segundos en un proceso
+aparte), así que mide el reparto de tareas y el coste del propio pool, no la GPU.
+Con --real se usa ImageGenerator en los dispositivos indicados.
+
+Uso:
+    python tests/benchmark_image_workers.py --imagenes 24 --segundos 0.5 --trabajadores 1 2 4
+    python tests/benchmark_image_workers.py --real --dispositivos cuda:0 cuda:1 --imagenes 8
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generators.image_workers import ImageWorkerPool, crear_image_generator  # noqa: E402
+from stub_image_generator import crear_stub  # noqa: E402
+
+
+def medir(dispositivos, opciones, crear_generador, imagenes: int):
+    pool = ImageWorkerPool(dispositivos, opciones, crear_generador=crear_generador)
+    try:
+        inicio = time.perf_counter()
+        pool.iniciar()
+        carga = time.perf_counter() - inicio
+        tareas = [(idx, f"benchmark prompt {idx}", idx, None) for idx in range(imagenes)]
+        inicio = time.perf_counter()
+        pool.renderizar("benchmark", tareas)
+        return carga, time.perf_counter() - inicio
+    finally:
+        pool.cerrar()
+
+
+def benchmark(imagenes: int, segundos: float, trabajadores, real: bool, dispositivos):
+    directorio = tempfile.mkdtemp(prefix="benchmark_imagenes_")
+    if real:
+        configuraciones = [dispositivos[:n] for n in range(1, len(dispositivos) + 1)]
+        opciones, crear_generador = {}, crear_image_generator
+    else:
+        configuraciones = [["cpu"] * n for n in trabajadores]
+        opciones, crear_generador = {"directorio": directorio, "segundos": segundos}, crear_stub
+
+    print(f"{imagenes} imágenes, {'ImageGenerator' if real else f'{segundos} s por imagen (simulado)'}")
+    base = None
+    for configuracion in configuraciones:
+        carga, render = medir(configuracion, opciones, crear_generador, imagenes)
+        base = base or render
+        print(
+            f"{len(configuracion)} trabajador(es): carga {carga:6.2f} s, render {render:6.2f} s,"
+            f" {imagenes / render:5.2f} img/s  (x{base / render:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del pool de trabajadores de imágenes")
+    parser.add_argument("--imagenes", type=int, default=24)
+    parser.add_argument("--segundos", type=float, default=0.5, help="Tiempo simulado por imagen")
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--real", action="store_true", help="Usa ImageGenerator en lugar del simulado")
+    parser.add_argument("--dispositivos", nargs="+", default=["cuda:0"])
+    args = parser.parse_args()
+    benchmark(args.imagenes, args.segundos, args.trabajadores, args.real, args.dispositivos)
@@ -0,0 +1,124 @@
+"""
+Compara llamadas secuenciales (una conexión nueva por llamada, como las
+llamadas sueltas a ollama.generate) con el OllamaClient asíncrono.
+
+Las dos variantes usan la misma política de reintentos y el servidor falso
+falla exactamente las mismas peticiones en ambas, así que hacen el mismo trabajo.
+
+Uso:
+    python tests/benchmark_ollama_client.py --peticiones 16 --concurrencia 4 --prob-error 0.2
+    python tests/benchmark_ollama_client.py --host http://127.0.0.1:11434   # Ollama real
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_ollama import FakeOllama  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+
+
+def servidor_con_errores(latencia: float, prob_error: float, semilla: int) -> FakeOllama:
+    """Responde 503 a una fracción fija de peticiones, decidida por la posición de cada una."""
+    aleatorio = random.Random(semilla)
+    fallos = {i for i in range(100000) if aleatorio.random() < prob_error}
+    contador = {"n": 0}
+    lock = threading.Lock()
+
+    def responder(cuerpo):
+        with lock:
+            n = contador["n"]
+            contador["n"] += 1
+        if n in fallos:
+            return (503, {"error": "server busy"})
+        return {"model": cuerpo.get("model", ""), "response": f"Respuesta {n}", "done": True}
+
+    servidor = FakeOllama(responder, latencia).iniciar()
+    servidor.reiniciar = lambda: contador.update(n=0)
+    return servidor
+
+
+def benchmark(
+    peticiones: int = 16,
+    concurrencia: int = 4,
+    latencia: float = 0.2,
+    prob_error: float = 0.0,
+    host: str = None,
+    modelo: str = "storyteller",
+    semilla: int = 0,
+):
+    servidor = None
+    if host is None:
+        servidor = servidor_con_errores(latencia, prob_error, semilla)
+        host = servidor.host
+    cuerpos = [
+        {"model": modelo, "prompt": f"Petición {i}", "options": {"seed": i}}
+        for i in range(peticiones)
+    ]
+    politica = {"reintentos": 3, "espera_base": 0.1, "espera_max": 2.0}
+
+    # Secuencial: un cliente (y una conexión) por llamada, una llamada detrás de otra
+    reintentos_secuencial = fallidas_secuencial = 0
+    inicio = time.perf_counter()
+    for cuerpo in cuerpos:
+        cliente = OllamaClient(host, max_concurrentes=1, max_conexiones=1, **politica)
+        try:
+            cliente.generate_sync(**cuerpo)
+        except Exception:
+            fallidas_secuencial += 1
+        reintentos_secuencial += cliente.reintentos_hechos
+        cliente.cerrar()
+    secuencial = time.perf_counter() - inicio
+    conexiones_secuencial = servidor.conexiones if servidor else None
+
+    if servidor:
+        servidor.reiniciar()
+    cliente = OllamaClient(host, max_concurrentes=concurrencia, **politica)
+    inicio = time.perf_counter()
+    resultados = cliente.ejecutar(cliente.generar_varios(cuerpos))
+    concurrente = time.perf_counter() - inicio
+    cliente.cerrar()
+    fallidas = sum(1 for r in resultados if isinstance(r, Exception))
+
+    print(f"Servidor {host}, {peticiones} peticiones")
+    print(
+        f"secuencial:                 {secuencial:6.2f} s"
+        f"  {fallidas_secuencial} fallidas, {reintentos_secuencial} reintentos"
+    )
+    print(
+        f"asíncrono ({concurrencia} a la vez):    {concurrente:6.2f} s"
+        f"  {fallidas} fallidas, {cliente.reintentos_hechos} reintentos"
+        f"  (x{secuencial / concurrente:.1f})"
+    )
+    if servidor:
+        print(
+            f"conexiones abiertas: secuencial {conexiones_secuencial},"
+            f" asíncrono {servidor.conexiones - conexiones_secuencial}"
+        )
+        servidor.detener()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del cliente asíncrono de Ollama")
+    parser.add_argument("--peticiones", type=int, default=16)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latencia del servidor falso")
+    parser.add_argument("--prob-error", type=float, default=0.0, help="Tasa de 503 del servidor falso")
+    parser.add_argument("--host", help="Usa un Ollama real en lugar del servidor falso")
+    parser.add_argument("--modelo", default="storyteller")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(
+        args.peticiones,
+        args.concurrencia,
+        args.latencia,
+        args.prob_error,
+        args.host,
+        args.modelo,
+        args.semilla,
+    )
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import FakeOllama  # noqa: E402
+
+
+@pytest.fixture
+def fake_ollama():
+    """Servidor de Ollama falso; se ajusta con `fake_ollama.responder`."""
+    servidor = FakeOllama().iniciar()
+    yield servidor
+    servidor.detener()
+
+
+@pytest.fixture
+def directorio_trabajo(tmp_path, monkeypatch):
+    """Los generadores escriben en rutas relativas (resources/...)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,106 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List, Callable, Union, Tuple
+
+# Lo que devuelve `responder` para cada petición a /api/generate:
+# - un dict: respuesta 200 con ese JSON
+# - (código, datos) o (código, datos, cabeceras)
+# - None: se cierra la conexión sin responder (error de red)
+Respuesta = Union[None, Dict[str, Any], Tuple[Any, ...]]
+
+
+class FakeOllama(ThreadingHTTPServer):
+    """Servidor local que imita /api/generate y /api/tags de Ollama."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict[str, Any]], Respuesta]] = None,
+        latencia: float = 0.0,
+    ):
+        """
+        Args:
+            responder: Decide la respuesta a partir del cuerpo de la petición
+                (por defecto, {"response": "ok"})
+            latencia: Segundos que tarda cada generación
+        """
+        super().__init__(("127.0.0.1", 0), _Manejador)
+        self.responder = responder or (lambda cuerpo: {"response": "ok", "done": True})
+        self.latencia = latencia
+        self.peticiones: List[Dict[str, Any]] = []
+        self.instantes: List[float] = []
+        self.conexiones = 0
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self._lock = threading.Lock()
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self) -> "FakeOllama":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOllama
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.conexiones += 1
+
+    def _responder(self, codigo: int, datos: Any, cabeceras: Optional[Dict[str, str]] = None):
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for clave, valor in (cabeceras or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        # ollama.list(), que usa start_ollama para saber si el servidor responde
+        if self.path == "/api/tags":
+            self._responder(200, {"models": []})
+        else:
+            self._responder(404, {"error": "not found"})
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path != "/api/generate":
+            self._responder(404, {"error": "not found"})
+            return
+
+        servidor = self.server
+        with servidor._lock:
+            servidor.peticiones.append(cuerpo)
+            servidor.instantes.append(time.monotonic())
+            servidor.en_curso += 1
+            servidor.max_en_curso = max(servidor.max_en_curso, servidor.en_curso)
+        try:
+            time.sleep(servidor.latencia)
+            respuesta = servidor.responder(cuerpo)
+        finally:
+            with servidor._lock:
+                servidor.en_curso -= 1
+
+        if respuesta is None:
+            self.close_connection = True
+            return
+        if isinstance(respuesta, dict):
+            respuesta = (200, respuesta)
+        self._responder(*respuesta)
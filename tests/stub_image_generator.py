@@ -0,0 +1,52 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+
+class _Escritor:
+    def cerrar(self):
+        pass
+
+
+class StubImageGenerator:
+    """
+    Sustituto de ImageGenerator para los procesos trabajadores (sin torch ni modelo).
+
+    El prompt controla el render: "lento:<segundos>" tarda ese tiempo y "error"
+    falla. Cada imagen es un archivo de texto con el dispositivo y el prompt.
+    """
+
+    def __init__(self, dispositivo: str, opciones: Dict[str, Any]):
+        self.dispositivo = dispositivo
+        self.directorio = opciones["directorio"]
+        self.segundos = opciones.get("segundos", 0.0)
+        self.fallar_al_cargar = opciones.get("fallar_al_cargar", False)
+        self.escritor = _Escritor()
+        self.perfil: Optional[Dict[str, Any]] = None
+
+    def cargar_modelo(self):
+        if self.fallar_al_cargar:
+            raise RuntimeError("sin memoria")
+        return "pipe"
+
+    def aplicar_perfil(self, perfil):
+        self.perfil = perfil
+
+    def ruta_imagen(self, prefijo: str, idx: int) -> str:
+        return os.path.join(self.directorio, f"imagen_{idx + 1:03d}_{prefijo}.txt")
+
+    def renderizar(self, pipe, prefijo, idx, prompt, seed, imagen_inicial, al_guardar):
+        inicio = time.time()
+        segundos = float(prompt.split(":")[1]) if prompt.startswith("lento:") else self.segundos
+        time.sleep(segundos)
+        if prompt == "error":
+            raise ValueError("prompt inválido")
+        ruta = self.ruta_imagen(prefijo, idx)
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(f"{self.dispositivo}|{prompt}|{seed}|{self.perfil}")
+        al_guardar(time.time() - inicio, None)
+        return ruta, time.time() - inicio
+
+
+def crear_stub(dispositivo: str, opciones: Dict[str, Any]) -> StubImageGenerator:
+    return StubImageGenerator(dispositivo, opciones)
@@ -0,0 +1,58 @@
+import pytest
+
+from generators import audio_generator
+from generators.audio_generator import AudioGenerator
+
+
+@pytest.fixture
+def comandos(directorio_trabajo, monkeypatch):
+    """Captura los comandos de FFmpeg en lugar de ejecutarlos."""
+    ejecutados = []
+    monkeypatch.setattr(
+        audio_generator.subprocess, "run", lambda cmd, **kwargs: ejecutados.append(cmd)
+    )
+    return ejecutados
+
+
+def filtro(cmd):
+    return cmd[cmd.index("-af") + 1] if "-af" in cmd else None
+
+
+def test_sin_normalizar_por_defecto(comandos):
+    AudioGenerator().procesar_audio("entrada.mp3", "salida.m4a")
+
+    (cmd,) = comandos
+    assert filtro(cmd) is None
+    assert cmd[:6] == ["ffmpeg", "-y", "-v", "error", "-i", "entrada.mp3"]
+    assert cmd[-1] == "salida.m4a"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+
+
+def test_normalizacion_activada(comandos):
+    AudioGenerator(normalizar_volumen=True).procesar_audio("entrada.mp3", "salida.m4a")
+
+    assert filtro(comandos[0]) == AudioGenerator.LOUDNORM
+
+
+@pytest.mark.parametrize(
+    "tempo, normalizar, esperado",
+    [
+        (1.25, False, "atempo=1.2500"),
+        (1.25, True, f"atempo=1.2500,{AudioGenerator.LOUDNORM}"),
+        (3.0, False, "atempo=2.0,atempo=1.5000"),
+        (0.3, False, "atempo=0.5,atempo=0.6000"),
+    ],
+)
+def test_cadena_de_filtros(comandos, tempo, normalizar, esperado):
+    AudioGenerator(normalizar_volumen=normalizar, tempo=tempo).procesar_audio(
+        "entrada.mp3", "salida.m4a"
+    )
+
+    assert filtro(comandos[0]) == esperado
+
+
+def test_la_cache_distingue_la_normalizacion(directorio_trabajo):
+    con = AudioGenerator(normalizar_volumen=True)
+    sin = AudioGenerator(normalizar_volumen=False)
+
+    assert con.ruta_cache("texto") != sin.ruta_cache("texto")
@@ -0,0 +1,60 @@
+import types
+
+import pytest
+
+pytest.importorskip("torch")
+
+from automation import ConfigManager, ResourceManager, VideoAutomation  # noqa: E402
+from story_pool import StoryPool  # noqa: E402
+
+ROMANO = ("Ancient_Technology", "Roman", "Egypt", "epic")
+
+
+class _Pipeline:
+    """Sustituye a VideoGenerationPipeline: registra las llamadas sin generar nada."""
+
+    def __init__(self):
+        self.llamadas = []
+        self.metricas = {}
+        self.ultimo_trabajo = {}
+        self.ultimo_contexto = types.SimpleNamespace(versiones={})
+
+    def generate(self, **parametros):
+        self.llamadas.append(parametros)
+        self.ultimo_trabajo = {
+            "idea": parametros["idea"] or "historia nueva",
+            "prompts": parametros["prompts"] or ["a", "b"],
+        }
+        return "resources/video/video.mp4"
+
+
+@pytest.fixture
+def automatizacion(directorio_trabajo):
+    ResourceManager.ensure_directories()
+    automatizacion = VideoAutomation.__new__(VideoAutomation)
+    automatizacion.config_manager = ConfigManager(str(directorio_trabajo / "config.json"))
+    automatizacion.pipeline = _Pipeline()
+    automatizacion.story_pool = StoryPool(str(directorio_trabajo / "historias.json"))
+    return automatizacion
+
+
+def test_idea_de_la_reserva(automatizacion):
+    automatizacion.story_pool.agregar(ROMANO, "historia de la reserva")
+
+    resultado = automatizacion.generate_video(seed=1)
+
+    assert resultado["idea_pregenerada"]
+    assert resultado["nicho"] == "Ancient_Technology"
+    assert automatizacion.pipeline.llamadas[0]["idea"] == "historia de la reserva"
+
+
+def test_aprobar_borrador_no_cuenta_como_idea_pregenerada(automatizacion):
+    borrador = automatizacion.generate_video(seed=1, perfil="borrador")
+    assert not borrador["idea_pregenerada"]
+
+    resultado = automatizacion.aprobar_borrador(borrador["borrador_id"])
+
+    # La idea viene del borrador, no de la reserva
+    assert automatizacion.pipeline.llamadas[1]["idea"] == "historia nueva"
+    assert not resultado["idea_pregenerada"]
+    assert resultado["borrador_id"] == borrador["borrador_id"]
@@ -0,0 +1,81 @@
+import multiprocessing
+
+import pytest
+
+from duration_estimator import DurationEstimator
+
+VOZ = "gtts-en-1.0"
+
+
+@pytest.fixture
+def estimador(tmp_path):
+    return DurationEstimator(str(tmp_path / "duraciones.json"))
+
+
+def test_aproximacion_inicial_sin_calibrar(estimador):
+    assert not estimador.calibrado(VOZ)
+    assert estimador.estimar("x" * 140, VOZ) == pytest.approx(0.5 + 140 / 14)
+    # Nunca menos de un segundo
+    assert estimador.estimar("", VOZ) == 1.0
+
+
+def test_ajuste_por_minimos_cuadrados(estimador):
+    for caracteres in (100, 200, 300, 400, 500):
+        estimador.registrar("x" * caracteres, VOZ, 2.0 + caracteres / 10)
+
+    assert estimador.calibrado(VOZ)
+    coeficientes = estimador.coeficientes(VOZ)
+    assert coeficientes["base"] == pytest.approx(2.0)
+    assert coeficientes["segundos_por_caracter"] == pytest.approx(0.1)
+    assert estimador.estimar("x" * 250, VOZ) == pytest.approx(27.0)
+    # Cada voz se calibra por separado
+    assert not estimador.calibrado("otra-voz")
+
+
+def test_textos_de_igual_longitud_usan_la_tasa_media(estimador):
+    for duracion in (9.0, 10.0, 11.0, 10.0, 10.0):
+        estimador.registrar("x" * 100, VOZ, duracion)
+
+    assert estimador.coeficientes(VOZ) == {
+        "base": 0.0,
+        "segundos_por_caracter": pytest.approx(0.1),
+        "muestras": 5,
+    }
+
+
+def test_descarta_duraciones_invalidas(estimador):
+    for duracion in (None, 0, -3.0):
+        estimador.registrar("texto", VOZ, duracion)
+    estimador.registrar("", VOZ, 4.0)
+
+    assert estimador.coeficientes(VOZ)["muestras"] == 0
+
+
+def test_conserva_solo_las_muestras_recientes(tmp_path):
+    estimador = DurationEstimator(str(tmp_path / "duraciones.json"), max_muestras=3)
+    for i in range(1, 6):
+        estimador.registrar("x" * i, VOZ, float(i))
+
+    assert estimador._leer()[VOZ] == [[3, 3.0], [4, 4.0], [5, 5.0]]
+
+
+def _registrar_varias(path, inicio):
+    estimador = DurationEstimator(path)
+    for i in range(inicio, inicio + 20):
+        estimador.registrar("x" * (i + 1), VOZ, float(i + 1))
+
+
+def test_procesos_concurrentes_no_pierden_muestras(tmp_path):
+    path = str(tmp_path / "duraciones.json")
+    contexto = multiprocessing.get_context("spawn")
+    procesos = [
+        contexto.Process(target=_registrar_varias, args=(path, inicio))
+        for inicio in (0, 100, 200, 300)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(60)
+        assert proceso.exitcode == 0
+
+    assert len(DurationEstimator(path)._leer()[VOZ]) == 80
@@ -0,0 +1,75 @@
+import pytest
+
+from generators.image_workers import ImageWorkerPool
+from stub_image_generator import crear_stub
+
+
+@pytest.fixture
+def crear_pool(tmp_path):
+    pools = []
+
+    def crear(dispositivos, **opciones):
+        pool = ImageWorkerPool(
+            dispositivos, {"directorio": str(tmp_path), **opciones}, crear_generador=crear_stub
+        )
+        pools.append(pool)
+        return pool
+
+    yield crear
+    for pool in pools:
+        pool.cerrar()
+
+
+def leer(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return f.read().split("|")
+
+
+def test_reparte_las_tareas_entre_procesos(crear_pool):
+    pool = crear_pool(["cpu", "cpu"], segundos=0.2)
+    tareas = [(idx, f"prompt {idx}", 100 + idx, None) for idx in range(6)]
+
+    rutas, tiempos = pool.renderizar("nicho_abc", tareas, {"pasos": 8})
+
+    assert sorted(rutas) == list(range(6))
+    assert all(segundos >= 0.2 for segundos in tiempos.values())
+    contenidos = [leer(rutas[idx]) for idx in range(6)]
+    assert [c[1] for c in contenidos] == [f"prompt {idx}" for idx in range(6)]
+    assert {c[3] for c in contenidos} == {"{'pasos': 8}"}
+    # Los dos trabajadores siguen vivos para el siguiente trabajo
+    assert all(proceso.is_alive() for proceso in pool.procesos)
+
+
+def test_errores_de_render(crear_pool):
+    pool = crear_pool(["cpu"])
+
+    with pytest.raises(RuntimeError, match="imagen 2: prompt inválido"):
+        pool.renderizar("p", [(0, "ok", 1, None), (1, "error", 2, None)])
+
+    # El pool sigue sirviendo después de un error
+    rutas, _ = pool.renderizar("p", [(0, "ok", 1, None)])
+    assert list(rutas) == [0]
+
+
+def test_fallo_al_cargar(crear_pool):
+    pool = crear_pool(["cpu"], fallar_al_cargar=True)
+
+    with pytest.raises(RuntimeError, match="No se pudo iniciar el trabajador cpu: sin memoria"):
+        pool.renderizar("p", [(0, "ok", 1, None)])
+    assert pool.procesos == []
+
+
+def test_descarta_resultados_tardios_de_un_lote_abandonado(crear_pool):
+    pool = crear_pool(["cpu"])
+    pool.iniciar()
+
+    pool.TIMEOUT_TAREA = 0.3
+    with pytest.raises(RuntimeError, match="Tiempo de espera agotado"):
+        pool.renderizar("primero", [(0, "lento:1.0", 1, None)])
+
+    # El resultado del primer lote llega durante el segundo con el mismo idx
+    pool.TIMEOUT_TAREA = 10
+    rutas, _ = pool.renderizar("segundo", [(0, "rapido", 2, None)])
+
+    assert "segundo" in rutas[0]
+    assert leer(rutas[0])[1] == "rapido"
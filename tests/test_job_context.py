@@ -0,0 +1,18 @@
+from job_context import JobContext
+from generators.subtitle_generator import SubtitleGenerator
+
+
+def test_trabajos_del_mismo_nicho_no_comparten_archivos(directorio_trabajo):
+    uno = JobContext(nicho="Ancient_Technology", texto="uno dos tres", prompts=["a"])
+    otro = JobContext(nicho="Ancient_Technology", texto="cuatro cinco", prompts=["b"])
+    assert uno.trabajo_id != otro.trabajo_id
+    assert uno.prefijo_archivos.startswith("Ancient_Technology_")
+
+    subtitulos = SubtitleGenerator()
+    for ctx in (uno, otro):
+        ctx.duracion_audio = 3.0
+        subtitulos.generate(ctx)
+
+    assert uno.subtitulos_path != otro.subtitulos_path
+    with open(uno.subtitulos_path, encoding="utf-8") as f:
+        assert "uno dos tres" in f.read()
@@ -0,0 +1,157 @@
+import types
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, PENDIENTE, EN_CURSO, COMPLETADO, FALLIDO, CANCELADO
+
+
+class Reloj:
+    """Sustituye a time.time en job_queue para hacer caducar los leases sin esperar."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def avanzar(self, segundos: float):
+        self.ahora += segundos
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(job_queue, "time", types.SimpleNamespace(time=reloj))
+    return reloj
+
+
+@pytest.fixture
+def cola(tmp_path, reloj):
+    return JobQueue(str(tmp_path / "trabajos.db"), duracion_lease=60, max_intentos=2)
+
+
+def test_reclamar_en_orden_con_lease(cola, reloj):
+    primero = cola.encolar("random", {"perfil": "produccion"}, chat_id=42)
+    segundo = cola.encolar("draft", {"perfil": "borrador"}, chat_id=42)
+
+    trabajo = cola.reclamar("nodo-a")
+
+    assert trabajo["id"] == primero
+    assert trabajo["estado"] == EN_CURSO
+    assert trabajo["trabajador"] == "nodo-a"
+    assert trabajo["intentos"] == 1
+    assert trabajo["lease_hasta"] == reloj.ahora + 60
+    assert trabajo["parametros"] == {"perfil": "produccion"}
+    assert cola.reclamar("nodo-b")["id"] == segundo
+    assert cola.reclamar("nodo-c") is None
+
+
+def test_latido_renueva_el_lease(cola, reloj):
+    cola.encolar("random", {})
+    trabajo = cola.reclamar("nodo-a")
+
+    reloj.avanzar(50)
+    assert cola.latido(trabajo["id"], "nodo-a")
+    reloj.avanzar(50)
+
+    # Sin el latido el lease habría caducado a los 60 s
+    assert cola.reclamar("nodo-b") is None
+    assert cola.obtener(trabajo["id"])["trabajador"] == "nodo-a"
+    # Solo el dueño del trabajo puede renovarlo
+    assert not cola.latido(trabajo["id"], "nodo-b")
+
+
+def test_lease_caducado_vuelve_a_la_cola(cola, reloj):
+    cola.encolar("random", {"seed": 7})
+    trabajo = cola.reclamar("nodo-a")
+
+    reloj.avanzar(61)
+    reasignado = cola.reclamar("nodo-b")
+
+    assert reasignado["id"] == trabajo["id"]
+    assert reasignado["trabajador"] == "nodo-b"
+    assert reasignado["intentos"] == 2
+    assert reasignado["parametros"] == {"seed": 7}
+    # El nodo que perdió el lease se entera en su siguiente latido y no puede completar
+    assert not cola.latido(trabajo["id"], "nodo-a")
+    assert not cola.completar(trabajo["id"], "nodo-a", {"video_path": "x.mp4"})
+
+
+def test_falla_al_agotar_los_intentos(cola, reloj):
+    trabajo_id = cola.encolar("random", {})
+    for _ in range(2):
+        assert cola.reclamar("nodo")["id"] == trabajo_id
+        reloj.avanzar(61)
+
+    assert cola.reclamar("nodo") is None
+    trabajo = cola.obtener(trabajo_id)
+    assert trabajo["estado"] == FALLIDO
+    assert "dejó de responder" in trabajo["resultado"]["error"]
+
+
+def test_completar(cola):
+    ok = cola.encolar("random", {}, chat_id=1)
+    mal = cola.encolar("random", {}, chat_id=1)
+    cola.reclamar("nodo")
+    cola.reclamar("nodo")
+
+    assert cola.completar(ok, "nodo", {"video_path": "v.mp4"})
+    assert cola.completar(mal, "nodo", {"error": "boom", "video_path": None})
+
+    assert cola.obtener(ok)["estado"] == COMPLETADO
+    assert cola.obtener(ok)["resultado"] == {"video_path": "v.mp4"}
+    assert cola.obtener(mal)["estado"] == FALLIDO
+    assert cola.activos() == []
+
+
+def test_cancelar_pendiente_y_en_curso(cola):
+    en_curso = cola.encolar("random", {}, chat_id=1)
+    pendiente = cola.encolar("random", {}, chat_id=1)
+    cola.reclamar("nodo")
+
+    assert cola.cancelar(pendiente)
+    assert cola.cancelar(en_curso)
+
+    # El trabajo cancelado no se reclama y su nodo lo abandona en el siguiente latido
+    assert cola.reclamar("otro") is None
+    assert not cola.latido(en_curso, "nodo")
+    assert not cola.completar(en_curso, "nodo", {"video_path": "v.mp4"})
+    assert cola.obtener(en_curso)["estado"] == CANCELADO
+    # Un trabajo cancelado no se notifica y no se puede volver a cancelar
+    assert cola.sin_notificar() == []
+    assert not cola.cancelar(en_curso)
+
+
+def test_actualizar_parametros_solo_el_dueno(cola):
+    trabajo_id = cola.encolar("random", {"perfil": "produccion"})
+    cola.reclamar("nodo-a")
+
+    assert not cola.actualizar_parametros(trabajo_id, "nodo-b", {"seed": 1})
+    assert cola.actualizar_parametros(trabajo_id, "nodo-a", {"perfil": "produccion", "seed": 5})
+    assert cola.obtener(trabajo_id)["parametros"] == {"perfil": "produccion", "seed": 5}
+
+
+def test_activos_y_notificacion_por_chat(cola):
+    uno = cola.encolar("random", {}, chat_id=1)
+    cola.encolar("random", {}, chat_id=2)
+    cola.encolar("random", {})
+
+    assert [t["id"] for t in cola.activos(1)] == [uno]
+    assert len(cola.activos()) == 3
+    assert all(t["estado"] == PENDIENTE for t in cola.activos())
+    # Los trabajos sin chat no se notifican
+    assert len(cola.sin_notificar()) == 2
+
+    cola.marcar_notificado(uno)
+    assert [t["chat_id"] for t in cola.sin_notificar()] == ["2"]
+
+
+def test_dos_colas_sobre_el_mismo_archivo(tmp_path, reloj):
+    path = str(tmp_path / "trabajos.db")
+    bot, nodo = JobQueue(path), JobQueue(path)
+
+    trabajo_id = bot.encolar("random", {})
+
+    assert nodo.reclamar("nodo")["id"] == trabajo_id
+    assert bot.obtener(trabajo_id)["estado"] == EN_CURSO
@@ -0,0 +1,84 @@
+from llm_cache import LLMCache
+from memory_arbiter import MemoryArbiter
+from ollama_client import OllamaClient
+
+
+def arbitro(capacidad_mb=10000):
+    """Árbitro con dos LLM y un modelo de imágenes que se cargan al usarse."""
+    descargas = []
+    arbitro = MemoryArbiter(capacidad_mb)
+    for nombre, tamano in (("storyteller", 6000), ("prompt-engineer", 6000), ("sd3", 7000)):
+        arbitro.registrar(nombre, tamano, lambda n=nombre: descargas.append(n))
+    return arbitro, descargas
+
+
+def test_preparar_no_da_por_cargado_un_modelo_sin_usar():
+    arbitro_, descargas = arbitro()
+
+    # Etapa de texto servida desde la caché: el modelo no llega a cargarse
+    arbitro_.preparar(["storyteller"], [["prompt-engineer"], ["sd3"]])
+    assert arbitro_.residentes() == []
+
+    arbitro_.preparar(["prompt-engineer"], [["sd3"]])
+    arbitro_.marcar_residente("prompt-engineer")
+    arbitro_.liberar_todo()
+
+    # Solo se descarga lo que se cargó de verdad
+    assert descargas == ["prompt-engineer"]
+
+
+def test_marcar_residente_hace_sitio_con_la_etapa_en_curso():
+    arbitro_, descargas = arbitro()
+
+    arbitro_.preparar(["storyteller"], [["prompt-engineer"], ["sd3"]])
+    assert arbitro_.marcar_residente("storyteller") == []
+
+    arbitro_.preparar(["prompt-engineer"], [["sd3"], ["storyteller"]])
+    assert arbitro_.marcar_residente("prompt-engineer") == ["storyteller"]
+    # Una segunda llamada al mismo modelo no cambia nada
+    assert arbitro_.marcar_residente("prompt-engineer") == []
+
+    arbitro_.preparar(["sd3"], [])
+    assert arbitro_.marcar_residente("sd3") == ["prompt-engineer"]
+    assert arbitro_.residentes() == ["sd3"]
+    assert descargas == ["storyteller", "prompt-engineer"]
+
+
+def test_no_expulsa_modelos_de_la_etapa_en_curso():
+    arbitro_, descargas = arbitro(capacidad_mb=8000)
+
+    arbitro_.preparar(["storyteller", "prompt-engineer"])
+    arbitro_.marcar_residente("storyteller")
+    arbitro_.marcar_residente("prompt-engineer")
+
+    assert descargas == []
+    assert arbitro_.residentes() == ["storyteller", "prompt-engineer"]
+
+
+def test_modelos_con_cargar_se_cargan_al_preparar():
+    cargas = []
+    arbitro_ = MemoryArbiter(10000)
+    arbitro_.registrar("a", 6000, lambda: None, cargar=lambda: cargas.append("a"))
+
+    arbitro_.preparar(["a"])
+
+    assert cargas == ["a"]
+    assert arbitro_.residentes() == ["a"]
+
+
+def test_la_cache_solo_avisa_de_llamadas_reales(fake_ollama, tmp_path):
+    llamados = []
+    cache = LLMCache(
+        str(tmp_path / "llm.db"), cliente=OllamaClient(fake_ollama.host, reintentos=0)
+    )
+    cache.al_llamar_modelo = llamados.append
+    try:
+        for _ in range(2):
+            cache.generate(model="storyteller", prompt="p", options={"seed": 1})
+        cache.generate(model="prompt-engineer", prompt="p")
+    finally:
+        cache.cliente.cerrar()
+
+    # La segunda llamada con seed es un acierto de caché: no carga el modelo
+    assert llamados == ["storyteller", "prompt-engineer"]
+    assert len(fake_ollama.peticiones) == 2
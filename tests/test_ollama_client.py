@@ -0,0 +1,240 @@
+import socket
+import asyncio
+
+import httpx
+import pytest
+
+import ollama_client
+from ollama_client import OllamaClient
+
+
+@pytest.fixture
+def crear_cliente():
+    """Crea clientes sin esperas reales entre reintentos y los cierra al terminar."""
+    clientes = []
+
+    def crear(host, **ajustes):
+        ajustes.setdefault("espera_base", 0.01)
+        ajustes.setdefault("espera_max", 0.05)
+        cliente = OllamaClient(host, **ajustes)
+        clientes.append(cliente)
+        return cliente
+
+    yield crear
+    for cliente in clientes:
+        cliente.cerrar()
+
+
+def secuencia(*respuestas):
+    """Responder que devuelve las respuestas en orden (la última se repite)."""
+    pendientes = list(respuestas)
+
+    def responder(cuerpo):
+        return pendientes.pop(0) if len(pendientes) > 1 else pendientes[0]
+
+    return responder
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize(
+    "host, esperado",
+    [
+        ("0.0.0.0", "http://127.0.0.1:11434"),
+        ("example.com", "http://example.com:11434"),
+        ("example.com:56789", "http://example.com:56789"),
+        ("http://example.com", "http://example.com:80"),
+        ("https://example.com", "https://example.com:443"),
+        ("https://example.com:52372/", "https://example.com:52372"),
+        ("http://example.com/ollama/", "http://example.com:80/ollama"),
+        ("[::1]:8080", "http://[::1]:8080"),
+        (":56789", "http://127.0.0.1:56789"),
+    ],
+)
+def test_normalizar_host(host, esperado):
+    assert OllamaClient.normalizar_host(host) == esperado
+
+
+def test_host_desde_ollama_host(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "0.0.0.0:9999")
+    assert OllamaClient().host == "http://127.0.0.1:9999"
+    # El host explícito tiene prioridad sobre la variable
+    assert OllamaClient("otro:1234").host == "http://otro:1234"
+    monkeypatch.delenv("OLLAMA_HOST")
+    assert OllamaClient().host == OllamaClient.HOST_POR_DEFECTO
+
+
+def test_generate_sync_envia_el_cuerpo(fake_ollama, crear_cliente):
+    cliente = crear_cliente(fake_ollama.host)
+
+    respuesta = cliente.generate_sync(model="m", prompt="hola", system=None, options={"seed": 1})
+
+    assert respuesta["response"] == "ok"
+    assert fake_ollama.peticiones == [
+        {"model": "m", "prompt": "hola", "options": {"seed": 1}, "stream": False}
+    ]
+
+
+@pytest.mark.parametrize("codigo", [429, 500, 503])
+def test_reintenta_errores_transitorios(fake_ollama, crear_cliente, codigo):
+    fake_ollama.responder = secuencia(
+        (codigo, {"error": "busy"}), (codigo, {"error": "busy"}), {"response": "ok"}
+    )
+    cliente = crear_cliente(fake_ollama.host, reintentos=3)
+
+    assert cliente.generate_sync(model="m", prompt="p")["response"] == "ok"
+    assert len(fake_ollama.peticiones) == 3
+    assert cliente.reintentos_hechos == 2
+
+
+def test_no_reintenta_errores_del_cliente(fake_ollama, crear_cliente):
+    fake_ollama.responder = lambda cuerpo: (404, {"error": "model 'm' not found"})
+    cliente = crear_cliente(fake_ollama.host, reintentos=3)
+
+    with pytest.raises(httpx.HTTPStatusError, match="404: model 'm' not found"):
+        cliente.generate_sync(model="m", prompt="p")
+    assert len(fake_ollama.peticiones) == 1
+    assert cliente.reintentos_hechos == 0
+
+
+def test_se_rinde_tras_agotar_los_reintentos(fake_ollama, crear_cliente):
+    fake_ollama.responder = lambda cuerpo: (503, {"error": "busy"})
+    cliente = crear_cliente(fake_ollama.host, reintentos=2)
+
+    with pytest.raises(httpx.HTTPStatusError, match="503"):
+        cliente.generate_sync(model="m", prompt="p")
+    assert len(fake_ollama.peticiones) == 3
+
+
+def test_reintenta_conexion_cortada(fake_ollama, crear_cliente):
+    fake_ollama.responder = secuencia(None, {"response": "ok"})
+    cliente = crear_cliente(fake_ollama.host, reintentos=2)
+
+    assert cliente.generate_sync(model="m", prompt="p")["response"] == "ok"
+    assert len(fake_ollama.peticiones) == 2
+    assert cliente.reintentos_hechos == 1
+
+
+def test_reintenta_servidor_caido(crear_cliente):
+    cliente = crear_cliente(f"http://127.0.0.1:{puerto_libre()}", reintentos=2)
+
+    with pytest.raises(httpx.ConnectError):
+        cliente.generate_sync(model="m", prompt="p")
+    assert cliente.reintentos_hechos == 2
+
+
+def test_espera_exponencial_con_limite(monkeypatch):
+    monkeypatch.setattr(ollama_client.random, "uniform", lambda a, b: b)
+    cliente = OllamaClient("localhost", espera_base=1.0, espera_max=5.0)
+
+    assert [cliente._espera(i, None) for i in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    # El jitter reduce la espera como mucho a la mitad
+    monkeypatch.setattr(ollama_client.random, "uniform", lambda a, b: a)
+    assert cliente._espera(2, None) == 2.0
+
+
+def test_espera_respeta_retry_after():
+    cliente = OllamaClient("localhost", espera_base=0.01, espera_max=10.0)
+    peticion = httpx.Request("POST", "http://localhost/api/generate")
+
+    def respuesta(cabeceras):
+        return httpx.Response(503, headers=cabeceras, request=peticion)
+
+    assert cliente._espera(0, respuesta({"Retry-After": "3"})) == 3.0
+    assert cliente._espera(0, respuesta({"Retry-After": "60"})) == 10.0
+    # Una cabecera con fecha HTTP no se interpreta: se usa la espera exponencial
+    assert cliente._espera(0, respuesta({"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})) <= 0.01
+
+
+def test_retry_after_en_la_peticion_real(fake_ollama, crear_cliente):
+    fake_ollama.responder = secuencia(
+        (503, {"error": "busy"}, {"Retry-After": "0.3"}), {"response": "ok"}
+    )
+    cliente = crear_cliente(fake_ollama.host, reintentos=1, espera_max=1.0)
+
+    cliente.generate_sync(model="m", prompt="p")
+
+    primero, segundo = fake_ollama.instantes
+    assert segundo - primero >= 0.3
+
+
+def test_limite_de_concurrencia(fake_ollama, crear_cliente):
+    fake_ollama.latencia = 0.1
+    cliente = crear_cliente(fake_ollama.host, max_concurrentes=3)
+
+    resultados = cliente.ejecutar(
+        cliente.generar_varios([{"model": "m", "prompt": str(i)} for i in range(9)])
+    )
+
+    assert all(r["response"] == "ok" for r in resultados)
+    assert fake_ollama.max_en_curso == 3
+    assert cliente.estadisticas() == {"peticiones": 9, "reintentos": 0, "en_curso": 0}
+    # Las conexiones se reutilizan entre tandas
+    assert fake_ollama.conexiones <= 3
+
+
+def test_reutiliza_la_conexion(fake_ollama, crear_cliente):
+    cliente = crear_cliente(fake_ollama.host)
+
+    for i in range(5):
+        cliente.generate_sync(model="m", prompt=str(i))
+
+    assert fake_ollama.conexiones == 1
+
+
+def test_generar_varios_devuelve_los_errores_en_su_sitio(fake_ollama, crear_cliente):
+    fake_ollama.responder = lambda cuerpo: (
+        (400, {"error": "bad"}) if cuerpo["prompt"] == "1" else {"response": cuerpo["prompt"]}
+    )
+    cliente = crear_cliente(fake_ollama.host)
+
+    resultados = cliente.ejecutar(
+        cliente.generar_varios([{"model": "m", "prompt": str(i)} for i in range(3)])
+    )
+
+    assert resultados[0]["response"] == "0"
+    assert isinstance(resultados[1], httpx.HTTPStatusError)
+    assert resultados[2]["response"] == "2"
+
+
+def test_generate_desde_otro_event_loop(fake_ollama, crear_cliente):
+    cliente = crear_cliente(fake_ollama.host)
+
+    async def dos_llamadas():
+        return await asyncio.gather(
+            cliente.generate(model="m", prompt="a"), cliente.generate(model="m", prompt="b")
+        )
+
+    # Cada asyncio.run crea un bucle nuevo; el cliente sigue usando el suyo
+    assert len(asyncio.run(dos_llamadas())) == 2
+    assert len(asyncio.run(dos_llamadas())) == 2
+    assert len(fake_ollama.peticiones) == 4
+
+
+def test_utilidades_usan_el_host_configurado(fake_ollama, crear_cliente, monkeypatch):
+    import utils
+
+    # OLLAMA_HOST apunta a otro sitio: las utilidades deben usar el cliente indicado
+    monkeypatch.setenv("OLLAMA_HOST", f"127.0.0.1:{puerto_libre()}")
+    cliente = crear_cliente(fake_ollama.host, reintentos=0)
+
+    assert utils.ollama_en_ejecucion(cliente)
+    utils.descargar_modelo_ollama("storyteller", cliente)
+
+    assert fake_ollama.peticiones == [
+        {"model": "storyteller", "prompt": "", "keep_alive": 0, "stream": False}
+    ]
+
+
+def test_listar_modelos_sin_servidor(crear_cliente):
+    cliente = crear_cliente(f"http://127.0.0.1:{puerto_libre()}", reintentos=3)
+
+    with pytest.raises(httpx.ConnectError):
+        cliente.listar_modelos_sync()
+    # La comprobación de disponibilidad no reintenta
+    assert cliente.reintentos_hechos == 0
@@ -0,0 +1,156 @@
+import os
+import types
+
+import pytest
+
+pytest.importorskip("nltk")
+
+from generators import prompt_index  # noqa: E402
+from generators.prompt_index import PromptIndex  # noqa: E402
+
+STOPWORDS = ["a", "an", "the", "of", "at", "in", "on", "with", "and", "under"]
+VARIANTE = "1080x1920@50"
+
+
+@pytest.fixture
+def indice(tmp_path, monkeypatch):
+    # El corpus de stopwords de NLTK se descarga aparte; basta con unas pocas
+    monkeypatch.setattr(
+        prompt_index, "stopwords", types.SimpleNamespace(words=lambda idioma: STOPWORDS)
+    )
+
+    def crear(**ajustes):
+        ajustes.setdefault("umbral_reuso", 0.9)
+        ajustes.setdefault("umbral_img2img", 0.7)
+        return PromptIndex(
+            str(tmp_path / "indice.json"), str(tmp_path / "imagenes"), **ajustes
+        )
+
+    return crear
+
+
+def firma_parecida(firma, iguales, desplazamiento=1):
+    """
+    Firma con exactamente `iguales` componentes en común con `firma`. Dos firmas
+    con distinto desplazamiento solo comparten los componentes de `firma`.
+    """
+    return firma[:iguales] + [valor + desplazamiento for valor in firma[iguales:]]
+
+
+def imagen(tmp_path, nombre="origen.jpg"):
+    ruta = tmp_path / nombre
+    ruta.write_bytes(b"jpeg")
+    return str(ruta)
+
+
+def test_normalizacion_y_prompts_casi_iguales(indice):
+    idx = indice()
+
+    assert idx.normalizar("The Lighthouses at DUSK") == ["lighthous", "dusk"]
+    a = idx.firma("A lighthouse at dusk, cinematic lighting")
+    b = idx.firma("Lighthouses at dusk with cinematic lighting")
+    assert idx.similitud(a, b) == 1.0
+
+
+def test_prompts_distintos(indice):
+    idx = indice()
+
+    a = idx.firma("A lighthouse at dusk, cinematic lighting")
+    b = idx.firma("Ancient bronze gears inside a desert temple")
+    assert idx.similitud(a, b) < 0.2
+    # Un prompt vacío no se parece a nada
+    assert idx.similitud(idx.firma(""), a) == 0.0
+
+
+def test_buscar_solo_en_la_misma_variante(indice, tmp_path):
+    idx = indice()
+    idx.agregar("A lighthouse at dusk", imagen(tmp_path), 11, VARIANTE)
+    firma = idx.firma("A lighthouse at dusk")
+
+    entrada, similitud = idx.buscar(firma, VARIANTE)
+    assert similitud == 1.0
+    assert entrada["seed"] == 11
+    assert os.path.exists(entrada["ruta"])
+    assert idx.buscar(firma, "512x512@8") is None
+    assert idx.buscar(idx.firma("Ancient bronze gears"), VARIANTE) is None
+
+
+def test_limites_de_los_umbrales(indice, tmp_path):
+    n = PromptIndex.NUM_PERMUTACIONES
+    idx = indice(umbral_reuso=48 / n, umbral_img2img=32 / n)
+    idx.agregar("A lighthouse at dusk", imagen(tmp_path), 11, VARIANTE)
+    firma = idx.entradas[0]["firma"]
+
+    # Los umbrales son inclusivos
+    assert idx.buscar(firma_parecida(firma, 48), VARIANTE)[1] == 48 / n
+    assert idx.buscar(firma_parecida(firma, 32), VARIANTE)[1] == 32 / n
+    assert idx.buscar(firma_parecida(firma, 31), VARIANTE) is None
+
+    # Sin img2img solo cuenta el umbral de reutilización
+    idx.umbral_img2img = None
+    assert idx.buscar(firma_parecida(firma, 47), VARIANTE) is None
+
+
+def test_guardar_fusiona_y_descarta_las_mas_antiguas(indice, tmp_path):
+    uno, otro = indice(max_entradas=2), indice(max_entradas=2)
+    uno.agregar("first prompt", imagen(tmp_path, "1.jpg"), 1)
+    otro.agregar("second prompt", imagen(tmp_path, "2.jpg"), 2)
+    uno.agregar("third prompt", imagen(tmp_path, "3.jpg"), 3)
+    antigua = uno.entradas[0]["ruta"]
+
+    otro.guardar()
+    uno.guardar()
+
+    assert [e["seed"] for e in uno.entradas] == [2, 3]
+    assert not os.path.exists(antigua)
+    assert [e["seed"] for e in indice().entradas] == [2, 3]
+
+
+class _Generador:
+    """Lo mínimo de ImageGenerator que usa planificar_reutilizacion."""
+
+    variante = VARIANTE
+
+    def __init__(self, indice):
+        self.prompt_index = indice
+
+
+def planificar(generador, prompts):
+    torch = pytest.importorskip("torch")  # noqa: F841
+    from generators.image_generator import ImageGenerator
+
+    tareas = [(i, prompt, 100 + i) for i, prompt in enumerate(prompts)]
+    return ImageGenerator.planificar_reutilizacion(generador, tareas)
+
+
+def test_plan_copia_dentro_del_trabajo(indice):
+    plan = planificar(
+        _Generador(indice()),
+        [
+            "A lighthouse at dusk, cinematic lighting",
+            "Ancient bronze gears inside a desert temple",
+            "Lighthouses at dusk with cinematic lighting",
+        ],
+    )
+
+    assert plan == {0: ("render", None), 1: ("render", None), 2: ("copiar", 0)}
+
+
+def test_plan_reusa_o_parte_de_trabajos_anteriores(indice, tmp_path):
+    n = PromptIndex.NUM_PERMUTACIONES
+    idx = indice(umbral_reuso=48 / n, umbral_img2img=32 / n)
+    idx.agregar("A lighthouse at dusk", imagen(tmp_path), 11, VARIANTE)
+    firma = idx.entradas[0]["firma"]
+    parecidos = {"reuso": (48, 1), "img2img": (40, 2), "nuevo": (20, 3)}
+    idx.firma = lambda prompt: firma_parecida(firma, *parecidos[prompt])
+
+    plan = planificar(_Generador(idx), ["reuso", "img2img", "nuevo"])
+
+    assert plan[0] == ("reusar", idx.entradas[0])
+    assert plan[1] == ("img2img", idx.entradas[0]["ruta"])
+    assert plan[2] == ("render", None)
+
+
+def test_plan_sin_indice_renderiza_todo():
+    plan = planificar(_Generador(None), ["a", "a"])
+    assert plan == {0: ("render", None), 1: ("render", None)}
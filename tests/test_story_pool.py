@@ -0,0 +1,155 @@
+import json
+import multiprocessing
+
+import pytest
+
+import story_pool
+from story_pool import StoryPool, StoryPrefetcher, enumerar_combinaciones
+
+CONFIG = {
+    "nichos": [
+        {"name": "Ancient_Technology", "eras": ["Bronze Age", "Roman"], "locations": ["Egypt"],
+         "tones": ["mysterious", "epic"]},
+        {"name": "Space", "eras": [], "locations": [], "tones": []},
+    ]
+}
+ROMANO = ("Ancient_Technology", "Roman", "Egypt", "epic")
+BRONCE = ("Ancient_Technology", "Bronze Age", "Egypt", "mysterious")
+ESPACIO = ("Space", "", "", "engaging")
+
+
+@pytest.fixture
+def crear_pool(tmp_path):
+    def crear(**ajustes):
+        return StoryPool(str(tmp_path / "pool" / "historias.json"), **ajustes)
+
+    return crear
+
+
+def test_enumerar_combinaciones():
+    combinaciones = enumerar_combinaciones(CONFIG)
+
+    assert len(combinaciones) == 5
+    assert ROMANO in combinaciones and BRONCE in combinaciones
+    # Las listas vacías usan los valores por defecto de ConfigManager
+    assert combinaciones[-1] == ESPACIO
+    assert enumerar_combinaciones({}) == []
+
+
+def test_desde_config():
+    assert StoryPool.desde_config({}) is None
+    assert StoryPool.desde_config({"pool_historias": {"activo": False}}) is None
+
+
+def test_profundidad_por_combinacion(crear_pool):
+    pool = crear_pool(profundidad=2)
+
+    assert pool.agregar(ROMANO, "uno")
+    assert pool.agregar(ROMANO, "dos")
+    assert not pool.agregar(ROMANO, "tres")
+    assert pool.faltantes([ROMANO, BRONCE]) == [BRONCE]
+    assert pool.tamano() == 2
+
+
+def test_limite_global(crear_pool):
+    pool = crear_pool(profundidad=3, max_historias=4)
+    for i in range(3):
+        assert pool.agregar(ROMANO, f"romano {i}")
+    assert pool.agregar(BRONCE, "bronce 0")
+
+    # La reserva llena no admite más historias ni tiene combinaciones pendientes
+    assert not pool.agregar(BRONCE, "bronce 1")
+    assert pool.faltantes([ROMANO, BRONCE, ESPACIO]) == []
+    assert pool.tamano() == 4
+
+
+def test_descarta_duplicados_en_reserva_y_entregados(crear_pool):
+    pool = crear_pool(profundidad=2)
+
+    assert pool.agregar(ROMANO, "A  Roman aqueduct")
+    assert not pool.agregar(BRONCE, "a roman AQUEDUCT")
+    assert pool.tomar_cualquiera() == (ROMANO, "A  Roman aqueduct")
+    # Una historia ya entregada tampoco vuelve a la reserva
+    assert not pool.agregar(ROMANO, "a roman aqueduct")
+    assert pool.tomar_cualquiera() is None
+
+
+def test_tomar_cualquiera_filtra_por_nicho(crear_pool):
+    pool = crear_pool()
+    pool.agregar(ROMANO, "romano")
+    pool.agregar(ESPACIO, "espacio")
+
+    assert pool.tomar_cualquiera("Space") == (ESPACIO, "espacio")
+    assert pool.tomar_cualquiera("Space") is None
+    assert pool.tomar_cualquiera() == (ROMANO, "romano")
+
+
+def test_purga_historias_antiguas(crear_pool, monkeypatch):
+    pool = crear_pool(max_edad_horas=1)
+    pool.agregar(ROMANO, "vieja")
+
+    ahora = story_pool.time.time()
+    monkeypatch.setattr(story_pool.time, "time", lambda: ahora + 3601)
+
+    assert pool.tamano() == 0
+    assert pool.tomar_cualquiera() is None
+
+
+def test_rellenar_respeta_lote_y_hueco(crear_pool):
+    pool = crear_pool(max_historias=3)
+    pedidas = []
+
+    def generar_lote(combinaciones):
+        pedidas.append(list(combinaciones))
+        # La segunda combinación falla: no se añade
+        return [f"idea {len(pedidas)}-{i}" if i != 1 else None for i in range(len(combinaciones))]
+
+    prefetcher = StoryPrefetcher(pool, generar_lote, enumerar_combinaciones(CONFIG), lote=4)
+
+    # Se piden tantas como caben en la reserva, no las `lote` configuradas
+    assert prefetcher.rellenar() == 2
+    assert len(pedidas[0]) == 3
+    assert len({tuple(c) for c in pedidas[0]}) == 3
+    # Solo queda hueco para una historia más
+    assert prefetcher.rellenar() == 1
+    assert len(pedidas[1]) == 1
+    assert prefetcher.rellenar() == 0
+    assert len(pedidas) == 2
+    assert pool.tamano() == 3
+
+
+def _tomar_todas(path, salida):
+    pool = StoryPool(path)
+    entregadas = []
+    while True:
+        resultado = pool.tomar_cualquiera()
+        if resultado is None:
+            break
+        entregadas.append(resultado[1])
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(entregadas, f)
+
+
+def test_dos_procesos_no_reciben_la_misma_historia(crear_pool, tmp_path):
+    pool = crear_pool(profundidad=30, max_historias=60)
+    ideas = [f"historia {i}" for i in range(60)]
+    for i, idea in enumerate(ideas):
+        assert pool.agregar((ROMANO, BRONCE)[i % 2], idea)
+
+    contexto = multiprocessing.get_context("spawn")
+    salidas = [str(tmp_path / f"entregadas_{i}.json") for i in range(2)]
+    procesos = [
+        contexto.Process(target=_tomar_todas, args=(pool.path, salida)) for salida in salidas
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(60)
+        assert proceso.exitcode == 0
+
+    entregadas = []
+    for salida in salidas:
+        with open(salida, encoding="utf-8") as f:
+            entregadas += json.load(f)
+    assert sorted(entregadas) == sorted(ideas)
+    assert pool.tamano() == 0
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from job_context import JobContext
+from llm_cache import LLMCache
+from ollama_client import OllamaClient
+from generators import text_generator, prompt_generator, story_prompt_generator
+from generators.text_generator import TextGenerator
+from generators.prompt_generator import PromptGenerator
+from generators.story_prompt_generator import StoryPromptGenerator
+
+HISTORIA = "A lighthouse keeper finds a map.\nIt leads to the sea."
+PROMPTS = ["A lighthouse at dusk", "An old map on a table", "Waves under moonlight"]
+
+
+@pytest.fixture
+def generador(fake_ollama, directorio_trabajo, monkeypatch):
+    # Ollama ya "está" en marcha: no se arranca ni se detiene ningún proceso
+    for modulo in (text_generator, prompt_generator, story_prompt_generator):
+        monkeypatch.setattr(modulo, "start_ollama", lambda cliente=None: None)
+        monkeypatch.setattr(modulo, "stop_ollama", lambda: None)
+
+    cache = LLMCache(activo=False, cliente=OllamaClient(fake_ollama.host, reintentos=0))
+    text = TextGenerator(detener_ollama=False, cache=cache)
+    prompts = PromptGenerator(detener_ollama=False, cache=cache)
+    generador = StoryPromptGenerator(text, prompts, detener_ollama=False, cache=cache)
+    yield generador
+    cache.cliente.cerrar()
+
+
+def contexto() -> JobContext:
+    return JobContext(nicho="Ancient_Technology", seed=7, persistir_csv=False)
+
+
+def json_combinado(historia=HISTORIA, prompts=PROMPTS) -> dict:
+    return {"response": json.dumps({"story": historia, "prompts": prompts}), "done": True}
+
+
+def test_validar_respuesta_extrae_el_json():
+    contenido = (
+        "<think>pensando...</think>Here it is: "
+        + json.dumps({"story": "Una   historia\n corta", "prompts": [" a ", "b", "", "c", "d"]})
+    )
+    historia, prompts = StoryPromptGenerator().validar_respuesta(contenido, 3)
+    assert historia == "Una historia corta"
+    assert prompts == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize(
+    "contenido, mensaje",
+    [
+        ("sin json", "no contiene un objeto JSON"),
+        ('{"prompts": ["a", "b"]}', '"story"'),
+        ('{"story": "  ", "prompts": ["a", "b"]}', '"story"'),
+        ('{"story": "x", "prompts": "a, b"}', '"prompts"'),
+        ('{"story": "x", "prompts": ["a", 2]}', '"prompts"'),
+        ('{"story": "x", "prompts": ["a"]}', "se esperaban 2"),
+    ],
+)
+def test_validar_respuesta_rechaza_esquema_incorrecto(contenido, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        StoryPromptGenerator().validar_respuesta(contenido, 2)
+
+
+def test_validar_respuesta_rechaza_json_mal_formado():
+    with pytest.raises(ValueError):
+        StoryPromptGenerator().validar_respuesta('{"story": "x", "prompts": [}', 1)
+
+
+def test_una_sola_llamada_con_esquema(generador, fake_ollama):
+    fake_ollama.responder = lambda cuerpo: json_combinado()
+    ctx = contexto()
+
+    assert generador.generate(ctx, num_prompts=3)
+
+    assert ctx.texto == "A lighthouse keeper finds a map. It leads to the sea."
+    assert ctx.prompts == PROMPTS
+    assert len(fake_ollama.peticiones) == 1
+    peticion = fake_ollama.peticiones[0]
+    assert peticion["model"] == StoryPromptGenerator.MODELO
+    assert peticion["format"]["properties"]["prompts"]["minItems"] == 3
+    assert peticion["options"] == {"seed": 7}
+    assert peticion["stream"] is False
+
+
+def test_reparacion_tras_respuesta_invalida(generador, fake_ollama):
+    respuestas = [json_combinado(prompts=PROMPTS[:1]), json_combinado()]
+    fake_ollama.responder = lambda cuerpo: respuestas.pop(0)
+    ctx = contexto()
+
+    assert generador.generate(ctx, num_prompts=3)
+
+    assert ctx.prompts == PROMPTS
+    assert len(fake_ollama.peticiones) == 2
+    reparacion = fake_ollama.peticiones[1]
+    # La reparación es barata y determinista: solo corrige el formato
+    assert reparacion["options"] == {"temperature": 0}
+    assert "se esperaban 3" in reparacion["prompt"]
+    assert HISTORIA.split("\n")[0] in reparacion["prompt"]
+
+
+def test_respaldo_en_modo_separado(generador, fake_ollama):
+    def responder(cuerpo):
+        if "format" in cuerpo:
+            return {"response": "not json at all", "done": True}
+        if cuerpo["model"] == TextGenerator.MODELO:
+            return {"response": "<think>...</think>A story told\nthe old way.", "done": True}
+        return {"response": "1. First scene\n2. Second scene", "done": True}
+
+    fake_ollama.responder = responder
+    ctx = contexto()
+
+    assert generador.generate(ctx, num_prompts=3)
+
+    # Llamada combinada + reparaciones y después la historia en modo separado
+    combinadas = [p for p in fake_ollama.peticiones if "format" in p]
+    assert len(combinadas) == 1 + StoryPromptGenerator.MAX_REINTENTOS
+    assert fake_ollama.peticiones[-1]["model"] == TextGenerator.MODELO
+    assert ctx.texto == "A story told the old way."
+    # Los prompts los completa la etapa de prompts del modo separado
+    assert ctx.prompts == []
+
+    ctx.duracion_estimada = 8.0
+    generador.prompt_generator.generate(ctx)
+    assert ctx.prompts == ["First scene", "Second scene"]
+    assert fake_ollama.peticiones[-1]["model"] == PromptGenerator.MODELO
+    assert "Generate 2 image prompts" in fake_ollama.peticiones[-1]["prompt"]
+
+
+def test_sin_respaldo_devuelve_false(generador, fake_ollama):
+    fake_ollama.responder = lambda cuerpo: {"response": "{}", "done": True}
+    ctx = contexto()
+
+    assert not generador.generate(ctx, num_prompts=3, respaldo=False)
+    assert ctx.texto is None
+    assert all("format" in p for p in fake_ollama.peticiones)
@@ -0,0 +1,31 @@
+import pytest
+
+from generators.video_generator import VideoGenerator
+
+
+def normalizar(versiones):
+    return VideoGenerator().normalizar_versiones(versiones, "out/video.mp4", 1080, 1920, "fast", 23)
+
+
+def test_sin_versiones_una_sola_salida():
+    (version,) = normalizar(None)
+    assert version["nombre"] == "principal"
+    assert version["ruta"] == "out/video.mp4"
+    assert (version["ancho"], version["alto"]) == (1080, 1920)
+
+
+def test_versiones_sin_nombre_reciben_uno_por_posicion():
+    versiones = normalizar([{"ancho": 720, "alto": 1280}, {"nombre": "", "crf": 30}])
+
+    assert [v["nombre"] for v in versiones] == ["v0", "v1"]
+    assert [v["ruta"] for v in versiones] == ["out/video_v0.mp4", "out/video_v1.mp4"]
+    assert versiones[0]["ancho"] == 720
+    assert versiones[1]["crf"] == 30
+
+
+def test_rechaza_nombres_duplicados():
+    with pytest.raises(ValueError, match="duplicado: movil"):
+        normalizar([{"nombre": "movil"}, {"nombre": "movil", "crf": 30}])
+    # El nombre por defecto también cuenta
+    with pytest.raises(ValueError, match="duplicado: v1"):
+        normalizar([{"nombre": "v1"}, {}])
@@ -3,10 +3,38 @@ import time
 import logging
 import os
 import shutil
+from contextlib import contextmanager
+from typing import Optional
 
+from ollama_client import OllamaClient
 
-def start_ollama():
+_cliente_por_defecto: Optional[OllamaClient] = None
+
+
+def _cliente_ollama(cliente: Optional[OllamaClient]) -> OllamaClient:
+    """El cliente indicado (con el host de `llm.cliente`) o uno compartido con OLLAMA_HOST."""
+    global _cliente_por_defecto
+    if cliente is not None:
+        return cliente
+    if _cliente_por_defecto is None:
+        _cliente_por_defecto = OllamaClient()
+    return _cliente_por_defecto
+
+
+def ollama_en_ejecucion(cliente: Optional[OllamaClient] = None) -> bool:
+    """Comprueba si el servidor de Ollama responde"""
+    try:
+        _cliente_ollama(cliente).listar_modelos_sync()
+        return True
+    except Exception:
+        return False
+
+
+def start_ollama(cliente: Optional[OllamaClient] = None):
     """Inicia el servicio de Ollama si no está en ejecución"""
+    if ollama_en_ejecucion(cliente):
+        return
+
     try:
         # Verificar si Ollama ya está en ejecución
         subprocess.run(
@@ -54,6 +82,47 @@ def stop_ollama(force=True):
         logging.error(f"Error al detener Ollama: {str(e)}")
 
 
+def descargar_modelo_ollama(modelo: str, cliente: Optional[OllamaClient] = None):
+    """Libera un modelo de la memoria de Ollama sin detener el servidor"""
+    try:
+        _cliente_ollama(cliente).generate_sync(model=modelo, prompt="", keep_alive=0)
+    except Exception as e:
+        logging.error(f"Error al descargar el modelo {modelo} de Ollama: {str(e)}")
+
+
+@contextmanager
+def bloqueo_archivo(lock_path: str, timeout: float = 30.0):
+    """
+    Bloqueo entre procesos mediante un archivo de lock creado de forma atómica.
+
+    Un lock más antiguo que `timeout` se considera huérfano (su proceso murió)
+    y se elimina.
+    """
+    inicio = time.time()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.time() - inicio > timeout:
+                raise TimeoutError(f"No se pudo bloquear {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
 def borrar_recursos_generados():
     """
     Borra todos los archivos generados en las carpetas de recursos.
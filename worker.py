@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import socket
+import logging
+import argparse
+import multiprocessing
+from typing import Dict, Any, Optional
+
+from job_queue import JobQueue
+
+
+def ejecutar_automatizacion(
+    parametros: Dict[str, Any], result_queue: multiprocessing.Queue, config_path: str
+):
+    """Se ejecuta en un proceso aparte: genera el video y publica el resultado."""
+    try:
+        from automation import VideoAutomation
+
+        automation = VideoAutomation(config_path)
+        if parametros.get("borrador_id"):
+            result = automation.aprobar_borrador(
+                parametros["borrador_id"], perfilar=parametros.get("perfilar")
+            )
+        else:
+            result = automation.generate_video(
+                nicho=parametros.get("nicho"),
+                perfil=parametros.get("perfil", "produccion"),
+                perfilar=parametros.get("perfilar"),
+                seed=parametros.get("seed"),
+                reserva=parametros.get("reserva", True),
+            )
+        result_queue.put(result)
+    except Exception as e:
+        result_queue.put({"error": str(e), "video_path": None})
+
+
+class RenderWorker:
+    """
+    Nodo de render: reclama trabajos de la cola, los ejecuta y publica el resultado.
+
+    Cada trabajo corre en un proceso hijo mientras el proceso principal renueva
+    el lease con latidos. Si el lease se pierde (trabajo cancelado o reasignado)
+    el hijo se termina.
+    """
+
+    def __init__(
+        self,
+        cola: JobQueue,
+        nombre: Optional[str] = None,
+        config_path: str = "config.json",
+        intervalo_latido: float = 30.0,
+        intervalo_sondeo: float = 5.0,
+    ):
+        """
+        Args:
+            cola: Cola de trabajos compartida
+            nombre: Identificador del nodo (por defecto, host y PID)
+            config_path: Configuración que usa VideoAutomation en este nodo
+            intervalo_latido: Segundos entre renovaciones del lease
+            intervalo_sondeo: Segundos de espera cuando no hay trabajos
+        """
+        self.cola = cola
+        self.nombre = nombre or f"{socket.gethostname()}-{os.getpid()}"
+        self.config_path = config_path
+        self.intervalo_latido = min(intervalo_latido, cola.duracion_lease / 3)
+        self.intervalo_sondeo = intervalo_sondeo
+        self.detenido = False
+
+    def ejecutar(self, trabajo: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Ejecuta un trabajo reclamado.
+
+        Returns:
+            Dict con el resultado, o None si se abandonó por pérdida del lease
+        """
+        parametros = dict(trabajo["parametros"])
+        if not parametros.get("borrador_id"):
+            # La semilla se fija en el primer intento y los reintentos la reutilizan,
+            # así repiten la misma combinación y aprovechan la caché del LLM
+            if parametros.get("seed") is None:
+                parametros["seed"] = random.randint(1, 1000000)
+                self.cola.actualizar_parametros(trabajo["id"], self.nombre, parametros)
+            # La historia de la reserva que tomó el primer intento ya no está
+            parametros["reserva"] = trabajo["intentos"] <= 1
+
+        result_queue = multiprocessing.Queue()
+        proceso = multiprocessing.Process(
+            target=ejecutar_automatizacion,
+            args=(parametros, result_queue, self.config_path),
+        )
+        # No es daemon: la etapa de imágenes puede lanzar sus propios procesos trabajadores
+        proceso.daemon = False
+        proceso.start()
+
+        resultado = None
+        while resultado is None:
+            try:
+                resultado = result_queue.get(timeout=self.intervalo_latido)
+            except queue.Empty:
+                if not proceso.is_alive():
+                    resultado = {
+                        "error": f"El proceso terminó con código {proceso.exitcode}",
+                        "video_path": None,
+                    }
+                    break
+            if resultado is None and not self.cola.latido(trabajo["id"], self.nombre):
+                logging.warning(f"Trabajo {trabajo['id']} perdido o cancelado: se abandona")
+                proceso.terminate()
+                proceso.join()
+                return None
+
+        proceso.join()
+        return resultado
+
+    def bucle(self):
+        logging.info(f"Nodo de render {self.nombre} esperando trabajos en {self.cola.path}")
+        while not self.detenido:
+            trabajo = self.cola.reclamar(self.nombre)
+            if trabajo is None:
+                time.sleep(self.intervalo_sondeo)
+                continue
+
+            logging.info(
+                f"Trabajo {trabajo['id']} ({trabajo['tipo']}) reclamado, intento {trabajo['intentos']}"
+            )
+            resultado = self.ejecutar(trabajo)
+            if resultado is not None:
+                if not self.cola.completar(trabajo["id"], self.nombre, resultado):
+                    logging.warning(
+                        f"Trabajo {trabajo['id']} terminado, pero ya no pertenecía a este nodo"
+                    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nodo de render de la cola de trabajos")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--nombre", default=None, help="Identificador del nodo")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    cola = JobQueue.desde_config(config)
+    if not cola:
+        logging.error("La cola de trabajos está desactivada (sección `cola` de config.json)")
+        sys.exit(1)
+
+    ajustes = config.get("cola", {})
+    worker = RenderWorker(
+        cola,
+        nombre=args.nombre,
+        config_path=args.config,
+        intervalo_latido=ajustes.get("intervalo_latido", 30.0),
+        intervalo_sondeo=ajustes.get("intervalo_sondeo", 5.0),
+    )
+    try:
+        worker.bucle()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()